@@ -0,0 +1,161 @@
+"""
+Measures the memory and the time of reading every contact with full ORM Contact instances,
+all at once and streamed with yield_per, and with the ContactRow batches of scan_contacts.
+
+    python benchmarks/contact_scan_memory.py
+    python benchmarks/contact_scan_memory.py --contacts 200000 --batch-size 5000
+
+The contacts are stored in a temporary SQLite file. Every path runs in its own process, once for the time and
+the resident memory (Linux), sampled at the end of every batch, and once under tracemalloc for the peak of
+the Python allocations. Both are reported above the memory of the same process once the connection is open.
+"""
+import argparse
+import asyncio
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.entity.models import Base, Contact, User  # noqa: E402
+from src.repository.scans import scan_contacts  # noqa: E402
+
+PATHS = ("orm_all", "orm_yield_per", "contact_rows")
+
+
+def seed(path: str, contacts: int, users: int = 100):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i + 1, "username": f"user_{i}", "email": f"user_{i}@example.com",
+                                     "password": "password"} for i in range(users)])
+        for start in range(0, contacts, 50000):
+            conn.execute(insert(Contact), [
+                {"name": f"name_{i}", "surname": f"surname_{i}", "email": f"contact_{i}@example.com",
+                 "phone": "+380671111111", "birthday": date(1985, 1, 1 + i % 28), "user_id": i % users + 1,
+                 "seq": i + 1} for i in range(start, min(start + 50000, contacts))])
+    engine.dispose()
+
+
+def current_mb() -> float:
+    # Linux only, the resident memory now and not the peak of the process, which the imports may have set
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+
+
+class MemoryProbe:
+    """
+    Follows the memory of a scan above a baseline taken when the connection is open: the resident memory
+    sampled at every call of sample, or the exact peak of the Python allocations under tracemalloc.
+    """
+
+    def __init__(self, traced: bool):
+        self.traced = traced
+        self.baseline = self.peak = 0.0
+
+    def start(self):
+        if self.traced:
+            tracemalloc.reset_peak()
+            self.baseline = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        else:
+            self.baseline = self.peak = current_mb()
+
+    def sample(self):
+        if not self.traced:
+            self.peak = max(self.peak, current_mb())
+
+    def growth(self) -> float:
+        if self.traced:
+            self.peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        return self.peak - self.baseline
+
+
+async def scan(path: str, name: str, batch_size: int, probe: MemoryProbe) -> tuple[int, int]:
+    """
+    The scan function reads every live contact with one of the paths and touches its email, as a job would.
+
+    :param path: str: The SQLite file
+    :param name: str: One of PATHS
+    :param batch_size: int: Rows per batch of the streaming paths
+    :param probe: MemoryProbe: Started once the connection is open and sampled after every batch
+    :return: The number of contacts read and the total length of their emails
+    :doc-author: Trelent
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    count, total = 0, 0
+    async with async_sessionmaker(engine)() as session:
+        statement = select(Contact).where(Contact.deleted_at.is_(None)).order_by(Contact.id)
+        # The engine, the connection and the SQLite page cache are not part of the scan
+        await session.execute(select(1))
+        probe.start()
+        if name == "orm_all":
+            contacts = (await session.execute(statement)).scalars().all()
+            probe.sample()
+            for contact in contacts:
+                count, total = count + 1, total + len(contact.email)
+        elif name == "orm_yield_per":
+            result = await session.stream(statement.execution_options(yield_per=batch_size))
+            async for partition in result.scalars().partitions():
+                for contact in partition:
+                    count, total = count + 1, total + len(contact.email)
+                probe.sample()
+        else:
+            async for rows in scan_contacts(session, batch_size=batch_size):
+                for row in rows:
+                    count, total = count + 1, total + len(row.email)
+                probe.sample()
+        probe.sample()
+    await engine.dispose()
+    return count, total
+
+
+def run_path(path: str, name: str, batch_size: int, traced: bool):
+    probe = MemoryProbe(traced)
+    if traced:
+        # Slower, but counts the Python objects of a batch, which are below the resolution of the resident memory
+        tracemalloc.start()
+    started = time.perf_counter()
+    count, _ = asyncio.run(scan(path, name, batch_size, probe))
+    print(f"{count} {time.perf_counter() - started:.2f} {probe.growth():.1f}")
+
+
+def measure(path: str, name: str, batch_size: int, traced: bool) -> tuple[int, float, float]:
+    command = [sys.executable, __file__, "--path", path, "--run", name, "--batch-size", str(batch_size)]
+    output = subprocess.run(command + (["--traced"] if traced else []),
+                            capture_output=True, text=True, check=True).stdout.split()
+    return int(output[0]), float(output[1]), float(output[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of contact scans")
+    parser.add_argument("--contacts", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--run", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--traced", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_path(args.path, args.run, args.batch_size, args.traced)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "contacts.db")
+        seed(path, args.contacts)
+        print(f"{args.contacts} contacts, batch size {args.batch_size}")
+        print(f"{'path':<16}{'rows':>10}{'seconds':>10}{'RSS MB':>10}{'traced MB':>11}")
+        for name in PATHS:
+            count, seconds, resident = measure(path, name, args.batch_size, traced=False)
+            traced = measure(path, name, args.batch_size, traced=True)[2]
+            print(f"{name:<16}{count:>10}{seconds:>10.2f}{resident:>10.1f}{traced:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
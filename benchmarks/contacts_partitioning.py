@@ -0,0 +1,158 @@
+"""
+Compares the latency of the per-user contact queries on a plain contacts table and on the same data
+hash partitioned by user_id, as created by the b7e2f0c4d915 migration.
+
+    python benchmarks/contacts_partitioning.py --rows 10000000 --users 20000 --partitions 16
+
+Both tables are built in their own schemas of the DB_URL database and dropped at the end unless --keep is given.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.conf.config import config  # noqa: E402
+
+QUERIES = {
+    "list page": "SELECT * FROM contacts WHERE user_id = :user_id AND deleted_at IS NULL "
+                 "ORDER BY id LIMIT 10 OFFSET 20",
+    "by phone": "SELECT id, name, surname FROM contacts WHERE user_id = :user_id AND phone_e164 = :phone "
+                "AND deleted_at IS NULL",
+    "changes": "SELECT * FROM contacts WHERE user_id = :user_id AND seq > :since ORDER BY seq LIMIT 101",
+    "birthdays": "SELECT * FROM contacts WHERE user_id = :user_id AND deleted_at IS NULL "
+                 "AND to_char(birthday, 'MM-DD') BETWEEN '06-01' AND '06-07'",
+    "prefix": "SELECT id, name, surname FROM contacts WHERE user_id = :user_id AND lower(surname) LIKE :prefix "
+              "AND deleted_at IS NULL LIMIT 10",
+}
+
+
+# The indexes of contacts at the head revision, both tables get all of them
+INDEXES = (
+    "CREATE UNIQUE INDEX ON contacts (user_id, seq)",
+    "CREATE INDEX ON contacts (user_id, phone_e164) INCLUDE (id, name, surname, deleted_at)",
+    "CREATE INDEX ON contacts (user_id, id) WHERE deleted_at IS NULL",
+    "CREATE INDEX ON contacts (deleted_at) WHERE deleted_at IS NOT NULL",
+    "CREATE INDEX ON contacts (user_id, lower(name) text_pattern_ops)",
+    "CREATE INDEX ON contacts (user_id, lower(surname) text_pattern_ops)",
+    "CREATE INDEX ON contacts (user_id, lower(email) text_pattern_ops)",
+    "CREATE INDEX ON contacts (user_id, replace(replace(phone, 'tel:', ''), '-', '') text_pattern_ops)",
+    "CREATE INDEX ON contacts USING gin (search_vector)",
+)
+# Needs the pg_trgm extension, it is left out on a server where the extension is not available
+TRIGRAM_INDEX = "CREATE INDEX ON contacts USING gin (lower(name || ' ' || surname || ' ' || email) gin_trgm_ops)"
+
+
+async def build(conn: AsyncConnection, schema: str, rows: int, users: int, partitions: int):
+    """
+    The build function creates the contacts table in the given schema and fills it with rows contacts
+    spread evenly over users, with the indexes of the application at the head revision.
+
+    :param conn: AsyncConnection: The connection to the benchmark database
+    :param schema: str: The schema of the table
+    :param rows: int: Number of contacts
+    :param users: int: Number of users owning the contacts
+    :param partitions: int: Number of hash partitions, 0 for a plain table
+    :return: None
+    :doc-author: Trelent
+    """
+    await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    await conn.execute(text(f"SET search_path TO {schema}, public"))
+    await conn.execute(text(f"""
+        CREATE TABLE contacts (
+            id bigint NOT NULL, name varchar(50), surname varchar(50), email varchar(50), phone varchar(20),
+            phone_e164 varchar(16), birthday date, user_id integer NOT NULL, seq integer NOT NULL,
+            deleted_at timestamp,
+            search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('simple', name || ' ' || surname || ' ' || email)) STORED
+        ){" PARTITION BY HASH (user_id)" if partitions else ""}
+    """))
+    for remainder in range(partitions):
+        await conn.execute(text(f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts "
+                                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    await conn.execute(text("""
+        INSERT INTO contacts (id, name, surname, email, phone, phone_e164, birthday, user_id, seq, deleted_at)
+        SELECT n, 'name' || n, 'surname' || n, 'contact' || n || '@example.com', '050' || n,
+               '+38050' || lpad((n % 10000000)::text, 7, '0'), date '1970-01-01' + (n % 18000),
+               n % :users + 1, n / :users + 1, CASE WHEN n % 50 = 0 THEN now() END
+        FROM generate_series(1, :rows) AS n
+    """), {"rows": rows, "users": users})
+    await conn.execute(text(f"ALTER TABLE contacts ADD PRIMARY KEY ({'id, user_id' if partitions else 'id'})"))
+    trigram = await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')"))
+    if trigram:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public"))
+    else:
+        print("pg_trgm is not available, the trigram index is left out")
+    for statement in INDEXES + ((TRIGRAM_INDEX,) if trigram else ()):
+        await conn.execute(text(statement))
+    await conn.execute(text("VACUUM ANALYZE contacts"))
+
+
+async def measure(conn: AsyncConnection, schema: str, rows: int, users: int, iterations: int) -> dict:
+    await conn.execute(text(f"SET search_path TO {schema}, public"))
+    sizes = await conn.execute(text("""
+        SELECT pg_size_pretty(sum(pg_table_size(relid))), pg_size_pretty(sum(pg_indexes_size(relid)))
+        FROM (SELECT relid FROM pg_partition_tree('contacts') UNION SELECT 'contacts'::regclass) AS tables
+    """))
+    results = {"sizes": sizes.one()}
+    rng = random.Random(0)
+    for name, sql in QUERIES.items():
+        statement = text(sql)
+        timings = []
+        for _ in range(iterations):
+            user_id = rng.randint(1, users)
+            n = rng.randint(0, rows // users) * users + user_id - 1
+            params = {"user_id": user_id, "phone": f"+38050{n % 10000000:07d}", "since": rng.randint(0, rows // users),
+                      "prefix": f"surname{n}%"}
+            started = time.perf_counter()
+            await conn.execute(statement, {key: value for key, value in params.items() if f":{key}" in sql})
+            timings.append((time.perf_counter() - started) * 1000)
+        percentiles = statistics.quantiles(timings, n=100)
+        results[name] = (percentiles[49], percentiles[94], percentiles[98])
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark hash partitioning of contacts by user_id")
+    parser.add_argument("--url", default=config.DB_URL)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark schemas")
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.url, isolation_level="AUTOCOMMIT")
+    schemas = {"plain": ("bench_contacts_plain", 0), "partitioned": ("bench_contacts_partitioned", args.partitions)}
+    try:
+        async with engine.connect() as conn:
+            for label, (schema, partitions) in schemas.items():
+                started = time.perf_counter()
+                await build(conn, schema, args.rows, args.users, partitions)
+                print(f"{label}: built {args.rows} rows in {time.perf_counter() - started:.1f}s")
+            report = {label: await measure(conn, schema, args.rows, args.users, args.iterations)
+                      for label, (schema, _) in schemas.items()}
+            if not args.keep:
+                for schema, _ in schemas.values():
+                    await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    finally:
+        await engine.dispose()
+
+    for label, results in report.items():
+        table_size, index_size = results.pop("sizes")
+        print(f"\n{label}: table {table_size}, indexes {index_size}")
+        print(f"{'query':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, (p50, p95, p99) in results.items():
+            print(f"{name:<12}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Measures how many emails per second are rendered the way FastMail renders them, with a new Environment
+compiling the template for every message as send_email did before, and with the shared environment
+of src.services.mail_templates, one message at a time and in batches. It also measures the startup
+of a new process compiling the templates with an empty and with a filled bytecode cache.
+
+    python benchmarks/email_rendering.py
+    python benchmarks/email_rendering.py --messages 5000 --birthdays 10
+"""
+import argparse
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.services.email import conf  # noqa: E402
+from src.services.mail_templates import create_environment, precompile, render, render_many  # noqa: E402
+
+
+def best_rate(call, count: int, rounds: int = 3) -> float:
+    """
+    The best_rate function runs call rounds times and returns the best rate in items per second.
+
+    :param call: Renders count items
+    :param count: int: Number of items rendered by one call
+    :param rounds: int: Number of rounds
+    :return: Items per second of the fastest round
+    :doc-author: Trelent
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email template rendering")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--birthdays", type=int, default=5)
+    args = parser.parse_args()
+
+    verify = [{"host": "http://localhost:8000/", "username": f"user_{i}", "token": f"token_{i}" * 8}
+              for i in range(args.messages)]
+    birthdays = [{"name": f"name_{i}", "surname": f"surname_{i}", "birthday": date(1985, 1, 1 + i).isoformat(),
+                  "days": i} for i in range(args.birthdays)]
+    digests = [{"username": f"user_{i}", "birthdays": birthdays} for i in range(args.messages)]
+
+    print(f"{'template':<24}{'per message env':>18}{'shared env':>14}{'batch':>12}  emails/s")
+    for name, contexts in (("verify_email.html", verify), ("birthday_digest.html", digests)):
+        fastmail = best_rate(lambda: [conf.template_engine().get_template(name).render(**context)
+                                      for context in contexts], len(contexts))
+        shared = best_rate(lambda: [render(name, **context) for context in contexts], len(contexts))
+        batch = best_rate(lambda: render_many(name, contexts), len(contexts))
+        print(f"{name:<24}{fastmail:>18.0f}{shared:>14.0f}{batch:>12.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cold = best_rate(lambda: precompile(create_environment(tempfile.mkdtemp(dir=directory))), 1)
+        precompile(create_environment(directory))
+        warm = best_rate(lambda: precompile(create_environment(directory)), 1)
+    print(f"\nstartup, compile all templates: {1000 / cold:.2f} ms without bytecode cache, "
+          f"{1000 / warm:.2f} ms with it")
+
+
+if __name__ == "__main__":
+    main()
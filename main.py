@@ -3,22 +3,35 @@ from ipaddress import ip_address
 from typing import Callable
 from pathlib import Path
 
-import redis.asyncio as redis
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi_limiter import FastAPILimiter
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
-from src.routes import contacts, auth, users
+from src.routes import contacts, auth, users, avatars
 from src.conf.config import config
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.idempotency import IdempotencyMiddleware
+from src.middleware.in_flight import InFlightMiddleware
+from src.middleware.query_profiler import QueryProfilerMiddleware
+from src.services.lifespan import lifespan, lifecycle
+from src.services.health import health_monitor
+from src.database.profiler import query_profiler
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Innermost, so the stored responses are neither compressed nor carry the CORS headers of the first request
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths={"/api/contacts/", "/api/contacts/merge"},
+    ttl=config.IDEMPOTENCY_TTL,
+    lock_ttl=config.IDEMPOTENCY_LOCK_TTL,
+    wait_timeout=config.IDEMPOTENCY_WAIT_TIMEOUT,
+)
+
+app.add_middleware(QueryProfilerMiddleware, profiler=query_profiler)
 
 origins = ["*"]
 
@@ -30,6 +43,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+)
+
+app.add_middleware(InFlightMiddleware, lifecycle=lifecycle)
+
 user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
 
 
@@ -51,17 +73,7 @@ async def user_agent_ban_middleware(request: Request, call_next: Callable):
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(contacts.router, prefix="/api")
-
-
-@app.on_event("startup")
-async def startup():
-    r = await redis.Redis(
-        host=config.REDIS_DOMAIN,
-        port=config.REDIS_PORT,
-        db=0,
-        password=config.REDIS_PASSWORD,
-    )
-    await FastAPILimiter.init(r)
+app.include_router(avatars.router, prefix="/api")
 
 
 @app.get("/")
@@ -70,14 +82,40 @@ def index():
 
 
 @app.get("/api/healthchecker")
-async def healthchecker(db: AsyncSession = Depends(get_db)):
-    try:
-        # Make request
-        result = await db.execute(text("SELECT 1"))
-        result = result.fetchone()
-        if result is None:
-            raise HTTPException(status_code=500, detail="Database is not configured correctly")
-        return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail="Error connecting to the database")
\ No newline at end of file
+async def healthchecker():
+    """
+    The healthchecker function reports whether the database is reachable.
+    It reads the result of the last background check instead of querying the database.
+
+    :return: A welcome message
+    :doc-author: Trelent
+    """
+    if not health_monitor.is_healthy("database"):
+        raise HTTPException(status_code=500, detail="Error connecting to the database")
+    return {"message": "Welcome to FastAPI!"}
+
+
+@app.get("/livez")
+async def livez():
+    """
+    The livez function is the liveness probe. It only tells that the process serves requests.
+
+    :return: The status of the process
+    :doc-author: Trelent
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    The readyz function is the readiness probe.
+    It answers from the cached results of the background dependency checks and the pool counters,
+    with 503 while warming up, draining, when a critical dependency is down or the pool is saturated.
+
+    :return: The readiness report
+    :doc-author: Trelent
+    """
+    ready, report = health_monitor.readiness(lifecycle.ready)
+    return JSONResponse(status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+                        content=report)
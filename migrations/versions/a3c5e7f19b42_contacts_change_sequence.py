@@ -0,0 +1,42 @@
+"""contacts change sequence
+
+Revision ID: a3c5e7f19b42
+Revises: 657b399cf112
+Create Date: 2024-02-10 18:42:11.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e7f19b42'
+down_revision: Union[str, None] = '657b399cf112'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('contacts_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    # Number the existing contacts of every user, so the first sync returns all of them
+    op.execute("""
+        UPDATE contacts SET seq = numbered.rn
+        FROM (SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY id) AS rn FROM contacts) AS numbered
+        WHERE contacts.id = numbered.id
+    """)
+    op.execute("""
+        UPDATE users SET contacts_seq = COALESCE((SELECT max(seq) FROM contacts WHERE contacts.user_id = users.id), 0)
+    """)
+    op.create_index('ix_contacts_user_id_seq', 'contacts', ['user_id', 'seq'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_seq', table_name='contacts')
+    op.execute("DELETE FROM contacts WHERE deleted_at IS NOT NULL")
+    op.drop_column('contacts', 'deleted_at')
+    op.drop_column('contacts', 'seq')
+    op.drop_column('users', 'contacts_seq')
@@ -0,0 +1,110 @@
+"""contacts hash partitioning
+
+Optional: without the contacts_partitions argument this revision does nothing.
+    alembic -x contacts_partitions=16 upgrade head
+converts contacts to a table hash partitioned by user_id with 16 partitions; each index
+is created on every partition. The table is rewritten in one transaction, plan a maintenance window.
+To opt in after the revision was applied as a no-op:
+    alembic stamp f6c3d94a0b58
+    alembic -x contacts_partitions=16 upgrade b7e2f0c4d915
+    alembic stamp head
+
+A partitioned table requires the partition key in its primary key, so the primary key becomes
+(id, user_id) and user_id NOT NULL, and foreign keys to contacts reference (id, user_id).
+Ids still come from the same sequence, the ORM model keeps id as its identity.
+
+Revision ID: b7e2f0c4d915
+Revises: f6c3d94a0b58
+Create Date: 2024-03-02 10:14:37.520316
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f0c4d915'
+down_revision: Union[str, None] = 'f6c3d94a0b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _partitioned() -> bool:
+    return op.get_bind().execute(sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'contacts'::regclass")).scalar()
+
+
+def _rebuild_contacts(partitions: int) -> None:
+    """
+    The _rebuild_contacts function copies contacts into a new table, hash partitioned when partitions > 0,
+    and moves the indexes, the constraints and the sequence of the old table to it.
+
+    :param partitions: int: Number of hash partitions, 0 for a plain table
+    :return: None
+    :doc-author: Trelent
+    """
+    bind = op.get_bind()
+    indexes = bind.execute(sa.text("""
+        SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = 'contacts'::regclass AND NOT i.indisprimary
+    """)).scalars().all()
+    outgoing = bind.execute(sa.text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = 'contacts'::regclass AND contype = 'f'
+    """)).all()
+    incoming = bind.execute(sa.text("""
+        SELECT conname, conrelid::regclass::text, a.attname, c.confdeltype FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.confrelid = 'contacts'::regclass AND c.contype = 'f'
+    """)).all()
+    columns = bind.execute(sa.text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'contacts' AND table_schema = current_schema() AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """)).scalars().all()
+    column_list = ", ".join(columns)
+    on_delete = {"c": "CASCADE", "n": "SET NULL", "r": "RESTRICT", "a": "NO ACTION", "d": "SET DEFAULT"}
+
+    if partitions and bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM contacts WHERE user_id IS NULL)")).scalar():
+        raise RuntimeError("contacts without user_id cannot be partitioned, delete or assign them first")
+
+    partition_clause = " PARTITION BY HASH (user_id)" if partitions else ""
+    op.execute(f"CREATE TABLE contacts_new (LIKE contacts INCLUDING DEFAULTS INCLUDING GENERATED){partition_clause}")
+    for remainder in range(partitions):
+        op.execute(f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts_new "
+                   f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})")
+    op.execute(f"INSERT INTO contacts_new ({column_list}) SELECT {column_list} FROM contacts")
+
+    for name, table, _, _ in incoming:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY NONE")
+    op.execute("DROP TABLE contacts")
+    op.execute("ALTER TABLE contacts_new RENAME TO contacts")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+
+    primary_key = "id, user_id" if partitions else "id"
+    op.execute(f"ALTER TABLE contacts ADD CONSTRAINT contacts_pkey PRIMARY KEY ({primary_key})")
+    for name, definition in outgoing:
+        op.execute(f"ALTER TABLE contacts ADD CONSTRAINT {name} {definition}")
+    for definition in indexes:
+        # CREATE INDEX on a partitioned table creates the same index on every partition
+        op.execute(definition.replace(" ON ONLY ", " ON "))
+    for name, table, column, delete_type in incoming:
+        referencing = f"({column}, user_id)" if partitions else f"({column})"
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY {referencing} "
+                   f"REFERENCES contacts ({primary_key}) ON DELETE {on_delete[delete_type]}")
+    op.execute("ANALYZE contacts")
+
+
+def upgrade() -> None:
+    partitions = int(context.get_x_argument(as_dictionary=True).get("contacts_partitions", 0))
+    if partitions < 2 or op.get_bind().dialect.name != "postgresql" or _partitioned():
+        return
+    _rebuild_contacts(partitions)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql" or not _partitioned():
+        return
+    _rebuild_contacts(0)
@@ -0,0 +1,37 @@
+"""contacts prefix indexes
+
+Revision ID: c41f08d2e6a7
+Revises: a3c5e7f19b42
+Create Date: 2024-02-14 20:05:37.118930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f08d2e6a7'
+down_revision: Union[str, None] = 'a3c5e7f19b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# text_pattern_ops lets LIKE 'prefix%' use the B-tree whatever the database collation is
+PREFIX_INDEXES = {
+    'ix_contacts_user_id_name_prefix': 'lower(name) text_pattern_ops',
+    'ix_contacts_user_id_surname_prefix': 'lower(surname) text_pattern_ops',
+    'ix_contacts_user_id_email_prefix': 'lower(email) text_pattern_ops',
+    'ix_contacts_user_id_phone_prefix': "replace(replace(phone, 'tel:', ''), '-', '') text_pattern_ops",
+}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, expression in PREFIX_INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON contacts (user_id, {expression})")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in PREFIX_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,47 @@
+"""contact stats
+
+Revision ID: c9d4e8a1f273
+Revises: b7e2f0c4d915
+Create Date: 2024-03-05 09:41:18.203655
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d4e8a1f273'
+down_revision: Union[str, None] = 'b7e2f0c4d915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('contact_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'kind', 'key')
+    )
+    # Same keys as src.services.stats.stat_keys, the reconcile_contact_stats job repairs any difference
+    op.execute("""
+        INSERT INTO contact_stats (user_id, kind, key, count)
+        SELECT user_id, kind, key, count(*) FROM (
+            SELECT user_id, 'total' AS kind, '' AS key FROM contacts WHERE deleted_at IS NULL AND user_id IS NOT NULL
+            UNION ALL
+            SELECT user_id, 'month', to_char(birthday, 'MM') FROM contacts
+            WHERE deleted_at IS NULL AND user_id IS NOT NULL
+            UNION ALL
+            SELECT user_id, 'domain', lower(split_part(email, '@', 2)) FROM contacts
+            WHERE deleted_at IS NULL AND user_id IS NOT NULL
+        ) AS keys
+        GROUP BY user_id, kind, key
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('contact_stats')
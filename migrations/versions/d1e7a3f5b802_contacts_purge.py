@@ -0,0 +1,64 @@
+"""contacts purge
+
+Revision ID: d1e7a3f5b802
+Revises: c9d4e8a1f273
+Create Date: 2024-03-12 18:22:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e7a3f5b802'
+down_revision: Union[str, None] = 'c9d4e8a1f273'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTIAL_INDEXES = {
+    'ix_contacts_user_id_id_live': '(user_id, id) WHERE deleted_at IS NULL',
+    'ix_contacts_deleted_at': '(deleted_at) WHERE deleted_at IS NOT NULL',
+}
+
+
+def _partitions() -> list[str] | None:
+    """
+    The _partitions function returns the partitions of contacts, or None when the table is not partitioned.
+
+    :return: The names of the partitions
+    :doc-author: Trelent
+    """
+    bind = op.get_bind()
+    if not bind.execute(sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'contacts'::regclass")).scalar():
+        return None
+    return bind.execute(sa.text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'contacts'::regclass ORDER BY 1"
+    )).scalars().all()
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('contacts_purged_seq', sa.Integer(), server_default='0', nullable=False))
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        for name, definition in PARTIAL_INDEXES.items():
+            if partitions is None:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON contacts {definition}")
+                continue
+            # CONCURRENTLY is not supported on a partitioned table: the parent index is created invalid
+            # and empty, each partition is indexed concurrently and attached, which makes the parent valid
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY contacts {definition}")
+            for partition in partitions:
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_{name[3:]} "
+                           f"ON {partition} {definition}")
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition}_{name[3:]}")
+
+
+def downgrade() -> None:
+    partitioned = _partitions() is not None
+    with op.get_context().autocommit_block():
+        for name in PARTIAL_INDEXES:
+            # Dropping the parent index drops the attached partition indexes with it
+            op.execute(f"DROP INDEX IF EXISTS {name}" if partitioned else f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.drop_column('users', 'contacts_purged_seq')
@@ -0,0 +1,38 @@
+"""contacts full text search
+
+Revision ID: d82b5a3c9e10
+Revises: c41f08d2e6a7
+Create Date: 2024-02-17 12:31:48.402771
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82b5a3c9e10'
+down_revision: Union[str, None] = 'c41f08d2e6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("""
+        ALTER TABLE contacts ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', name || ' ' || surname || ' ' || email)) STORED
+    """)
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_contacts_search_vector "
+                   "ON contacts USING gin (search_vector)")
+        # Must match the expression built by repository.contacts.search_contacts
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_contacts_search_text_trgm "
+                   "ON contacts USING gin (lower(name || ' ' || surname || ' ' || email) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_contacts_search_text_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_contacts_search_vector")
+    op.drop_column('contacts', 'search_vector')
@@ -0,0 +1,38 @@
+"""contact blocking keys
+
+Revision ID: e5a19c7b3f26
+Revises: d82b5a3c9e10
+Create Date: 2024-02-21 19:47:02.655103
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a19c7b3f26'
+down_revision: Union[str, None] = 'd82b5a3c9e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The keys of the existing contacts are filled by src.repository.duplicates.rebuild_blocking_keys
+    op.create_table('contact_blocking_keys',
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('key', sa.String(length=150), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contact_id', 'kind')
+    )
+    op.create_index('ix_contact_blocking_keys_user_id_kind_key', 'contact_blocking_keys',
+                    ['user_id', 'kind', 'key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_blocking_keys_user_id_kind_key', table_name='contact_blocking_keys')
+    op.drop_table('contact_blocking_keys')
@@ -0,0 +1,26 @@
+"""users deleted_at
+
+Revision ID: e8b2c6d0a417
+Revises: d1e7a3f5b802
+Create Date: 2024-03-14 10:41:09.218304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2c6d0a417'
+down_revision: Union[str, None] = 'd1e7a3f5b802'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,31 @@
+"""contacts phone e164
+
+Revision ID: f6c3d94a0b58
+Revises: e5a19c7b3f26
+Create Date: 2024-02-24 11:09:26.870413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c3d94a0b58'
+down_revision: Union[str, None] = 'e5a19c7b3f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows are filled by src.repository.contacts.backfill_phone_e164
+    op.add_column('contacts', sa.Column('phone_e164', sa.String(length=16), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_phone_e164', 'contacts', ['user_id', 'phone_e164'], unique=False,
+                        postgresql_include=['id', 'name', 'surname', 'deleted_at'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_phone_e164', table_name='contacts')
+    op.drop_column('contacts', 'phone_e164')
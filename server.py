@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import importlib.util
+import logging
+import math
+import multiprocessing
+import os
+import random
+import signal
+import threading
+import time
+
+import uvicorn
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.conf.config import config
+
+logger = logging.getLogger("server")
+
+
+def worker_count() -> int:
+    """
+    The worker_count function returns the number of CPUs this process may run on,
+    which inside a container can be less than the CPUs of the host.
+
+    :return: The number of usable CPUs
+    :doc-author: Trelent
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def split_pool(budget: int, workers: int) -> tuple[int, int]:
+    """
+    The split_pool function divides the database connection budget between the worker processes.
+    Every worker keeps half of its share open in the pool and may overflow up to the other half,
+    so workers * (pool_size + max_overflow) never exceeds the budget.
+    The health checks and the warm-up of a worker take their connections from its pool, they fit in its share.
+
+    :param budget: int: Maximum number of connections of all workers together
+    :param workers: int: Number of worker processes
+    :return: The pool_size and max_overflow of one worker
+    :doc-author: Trelent
+    """
+    share = budget // workers
+    if share < 1:
+        raise ValueError(f"{workers} workers do not fit into a budget of {budget} database connections")
+    pool_size = math.ceil(share / 2)
+    return pool_size, share - pool_size
+
+
+async def database_max_connections(url: str) -> int | None:
+    """
+    The database_max_connections function reads how many connections Postgres accepts from
+    ordinary users, max_connections minus superuser_reserved_connections.
+
+    :param url: str: The database url
+    :return: The number of connections, or None if the database cannot be asked
+    :doc-author: Trelent
+    """
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as connection:
+            max_connections = int((await connection.execute(text("SHOW max_connections"))).scalar())
+            reserved = int((await connection.execute(text("SHOW superuser_reserved_connections"))).scalar())
+        return max_connections - reserved
+    except Exception as err:
+        logger.warning("Cannot read max_connections: %r", err)
+        return None
+    finally:
+        await engine.dispose()
+
+
+def event_loop_and_http() -> tuple[str, str]:
+    """
+    The event_loop_and_http function picks uvloop and httptools when they are installed.
+
+    :return: The uvicorn loop and http implementations
+    :doc-author: Trelent
+    """
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    A uvicorn server that marks the application as draining as soon as it receives SIGTERM or SIGINT,
+    so the readiness probe fails and new requests get 503 while uvicorn waits for the in-flight requests.
+    """
+
+    def handle_exit(self, sig, frame):
+        from src.services.lifespan import lifecycle
+
+        lifecycle.start_draining()
+        super().handle_exit(sig, frame)
+
+
+def _serve(server_config: uvicorn.Config, sockets: list):
+    DrainingServer(server_config).run(sockets=sockets)
+
+
+class Supervisor:
+    """
+    The Supervisor runs the uvicorn workers on a shared socket and replaces every worker that exits,
+    whether it was recycled after max_requests or crashed.
+    The uvicorn supervisor of the pinned version does not restart workers, so it cannot recycle them.
+    """
+
+    def __init__(self, app: str, host: str, port: int, workers: int, max_requests: int, max_requests_jitter: int):
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.loop, self.http = event_loop_and_http()
+        self.base_config = uvicorn.Config(app, host=host, port=port, loop=self.loop, http=self.http,
+                                          lifespan="on", proxy_headers=True,
+                                          timeout_graceful_shutdown=math.ceil(config.SHUTDOWN_DRAIN_TIMEOUT))
+        self.processes: list[multiprocessing.Process] = []
+        self.should_exit = threading.Event()
+        self._context = multiprocessing.get_context("spawn")
+
+    def _worker_config(self) -> uvicorn.Config:
+        # The jitter spreads the recycling, so the workers do not all restart at the same moment
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else None
+        return uvicorn.Config(self.base_config.app, host=self.base_config.host, port=self.base_config.port,
+                              loop=self.loop, http=self.http, lifespan="on", proxy_headers=True,
+                              limit_max_requests=limit,
+                              timeout_graceful_shutdown=self.base_config.timeout_graceful_shutdown)
+
+    def _start_worker(self, sockets: list) -> multiprocessing.Process:
+        process = self._context.Process(target=_serve, args=(self._worker_config(), sockets))
+        process.start()
+        return process
+
+    def run(self):
+        """
+        The run function starts the workers and restarts the ones that exit until SIGTERM or SIGINT,
+        then stops the workers with SIGTERM, so each one drains its in-flight requests.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        sockets = [self.base_config.bind_socket()]
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.should_exit.set())
+        logger.info("Starting %s workers with %s and %s", self.workers, self.loop, self.http)
+        self.processes = [self._start_worker(sockets) for _ in range(self.workers)]
+        while not self.should_exit.wait(0.5):
+            for index, process in enumerate(self.processes):
+                if process.is_alive() or self.should_exit.is_set():
+                    continue
+                process.join()
+                logger.info("Worker %s exited with code %s, starting a new one", process.pid, process.exitcode)
+                if process.exitcode:
+                    time.sleep(1)  # do not spin on a worker failing at startup
+                self.processes[index] = self._start_worker(sockets)
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(config.SHUTDOWN_DRAIN_TIMEOUT + 5)
+        for sock in sockets:
+            sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contacts API server")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_CONCURRENCY or worker_count())
+    parser.add_argument("--max-requests", type=int, default=config.SERVER_MAX_REQUESTS)
+    parser.add_argument("--max-requests-jitter", type=int, default=config.SERVER_MAX_REQUESTS_JITTER)
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    budget = config.DB_CONNECTION_BUDGET
+    available = asyncio.run(database_max_connections(config.DB_URL))
+    if available is not None and available < budget:
+        logger.warning("DB_CONNECTION_BUDGET %s is above the %s connections Postgres accepts", budget, available)
+        budget = available
+    # The job workers (worker.py) size their own pools from this reserve, the web workers share the rest
+    reserved = config.DB_JOB_WORKER_PROCESSES * config.DB_JOB_WORKER_CONNECTIONS
+    pool_size, max_overflow = split_pool(budget - reserved, arguments.workers)
+    logger.info("Database pool per worker: %s + %s overflow, %s connections reserved for %s job workers",
+                pool_size, max_overflow, reserved, config.DB_JOB_WORKER_PROCESSES)
+    # The workers are spawned, they read the settings from the environment when they import the app
+    os.environ["DB_POOL_SIZE"], os.environ["DB_MAX_OVERFLOW"] = str(pool_size), str(max_overflow)
+
+    Supervisor("main:app", arguments.host, arguments.port, arguments.workers,
+               arguments.max_requests, arguments.max_requests_jitter).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,60 @@ class Settings(BaseSettings):
     MAIL_FROM: str = "postgres"
     MAIL_PORT: int = 567234
     MAIL_SERVER: str = "postgres"
+    MAIL_TEMPLATE_CACHE_DIR: str | None = None
     REDIS_DOMAIN: str = 'localhost'
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str | None = None
     CLD_NAME: str = 'name_example'
     CLD_API_KEY: int = 172373788344122
     CLD_API_SECRET: str = "secret"
+    COMPRESSION_MINIMUM_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    DB_POOL_WARMUP: int = 2
+    REDIS_POOL_WARMUP: int = 2
+    SHUTDOWN_DRAIN_TIMEOUT: float = 10
+    HEALTH_CHECK_INTERVAL: float = 5
+    HEALTH_CHECK_TIMEOUT: float = 2
+    HEALTH_CHECK_SMTP_INTERVAL: float = 300
+    READINESS_POOL_SATURATION: float = 0.9
+    JOBS_BACKEND: str = "redis"
+    JOBS_CONCURRENCY: int = 10
+    JOBS_RESULT_TTL: int = 86400
+    JOBS_VISIBILITY_TIMEOUT: int = 300
+    BIRTHDAY_DIGEST_SCHEDULE: str = "0 7 * * *"
+    BIRTHDAY_DIGEST_DAYS: int = 7
+    BIRTHDAY_DIGEST_BATCH_SIZE: int = 200
+    CONTACT_STATS_RECONCILE_SCHEDULE: str = "15 4 * * *"
+    CONTACTS_PURGE_SCHEDULE: str = "45 4 * * *"
+    CONTACTS_PURGE_RETENTION_DAYS: int = 30
+    CONTACTS_PURGE_BATCH_SIZE: int = 1000
+    CONTACTS_DELETE_BATCH_SIZE: int = 500
+    ACCOUNT_DELETE_BATCH_SIZE: int = 500
+    EXPORTS_DIR: str = "exports"
+    EXPORTS_BATCH_SIZE: int = 1000
+    EXPORTS_TTL_HOURS: int = 24
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    DB_CONNECTION_BUDGET: int = 80
+    DB_JOB_WORKER_PROCESSES: int = 1
+    DB_JOB_WORKER_CONNECTIONS: int = 10
+    WEB_CONCURRENCY: int | None = None
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_MAX_REQUESTS: int = 10000
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    IDEMPOTENCY_TTL: int = 86400
+    IDEMPOTENCY_LOCK_TTL: int = 60
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10
+    DB_SLOW_QUERY_MS: float = 200
+    DB_N_PLUS_ONE_THRESHOLD: int = 10
+    AVATAR_BACKEND: str = "cloudinary"
+    AVATAR_DIR: str = "avatars"
+    AVATAR_SIZES: str = "64,128,250"
+    AVATAR_CACHE_QUOTA_MB: int = 512
+    AVATAR_MAX_UPLOAD_BYTES: int = 5 * 1024 * 1024
 
     @field_validator("ALGORITHM")
     @classmethod
@@ -1,15 +1,43 @@
+import asyncio
 import contextlib
 
+from sqlalchemy import text, make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from src.conf.config import config
+from src.database.profiler import query_profiler
 
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
-        self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
-                                                                     bind=self._engine)
+    def __init__(self, url: str, pool_size: int = 5, max_overflow: int = 10, prepared_statement_cache_size: int = 500):
+        self._url = url
+        self._prepared_statement_cache_size = prepared_statement_cache_size
+        self._engine: AsyncEngine | None = None
+        self._session_maker: async_sessionmaker | None = None
+        self.resize(pool_size, max_overflow)
+
+    def resize(self, pool_size: int, max_overflow: int):
+        """
+        The resize function creates the engine with a pool of the given size.
+        It is called before the first connection is opened, by the processes that do not
+        use the DB_POOL_SIZE and DB_MAX_OVERFLOW of the web workers.
+
+        :param self: Represent the instance of the class
+        :param pool_size: int: Number of connections kept open
+        :param max_overflow: int: Number of connections opened on top of them under load
+        :return: None
+        :doc-author: Trelent
+        """
+        # asyncpg keeps an LRU of prepared statements per connection, every IN list length is a statement of its own.
+        # Behind pgbouncer in transaction mode the cache must be disabled with 0
+        connect_args = {}
+        if make_url(self._url).get_driver_name() == "asyncpg":
+            connect_args["prepared_statement_cache_size"] = self._prepared_statement_cache_size
+        self._max_overflow = max_overflow
+        self._engine = create_async_engine(self._url, pool_size=pool_size, max_overflow=max_overflow,
+                                           connect_args=connect_args)
+        query_profiler.instrument(self._engine)
+        self._session_maker = async_sessionmaker(autoflush=False, autocommit=False, bind=self._engine)
 
     @contextlib.asynccontextmanager
     async def session(self):
@@ -21,11 +49,81 @@ class DatabaseSessionManager:
         except Exception as err:
             print(err)
             await session.rollback()
+            raise
         finally:
             await session.close()
 
+    async def warm_up(self, connections: int):
+        """
+        The warm_up function opens the given number of pool connections up front, so the first
+        requests after a deploy do not pay for connection setup. It never opens more connections
+        than the pool keeps, otherwise the extra ones would be discarded right away.
+
+        :param self: Represent the instance of the class
+        :param connections: int: Number of connections to open
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._engine is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+        pool_size = getattr(self._engine.pool, "size", lambda: connections)()
+        connections = min(connections, pool_size)
+        opened = await asyncio.gather(*(self._engine.connect() for _ in range(connections)))
+        try:
+            for connection in opened:
+                await connection.execute(text("SELECT 1"))
+        finally:
+            for connection in opened:
+                await connection.close()
+
+    async def ping(self):
+        """
+        The ping function checks that the database answers a trivial query.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._engine is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+        async with self._engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    def pool_status(self) -> dict:
+        """
+        The pool_status function reports how many pool connections are in use.
+        It only reads the pool counters and does not touch the database. The pool does not expose
+        its overflow limit, the capacity is computed from the max_overflow the engine was created with.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the pool capacity, checked out and overflow connections and saturation
+        :doc-author: Trelent
+        """
+        pool = self._engine.pool if self._engine is not None else None
+        if pool is None or not hasattr(pool, "checkedout"):
+            return {"size": 0, "checked_out": 0, "overflow": 0, "saturation": 0.0}
+        capacity = pool.size() + max(self._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return {"size": capacity, "checked_out": checked_out, "overflow": max(pool.overflow(), 0),
+                "saturation": round(checked_out / capacity, 3) if capacity else 0.0}
+
+    async def close(self):
+        """
+        The close function disposes the engine and closes all pooled connections.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._engine is None:
+            return
+        await self._engine.dispose()
+        self._engine = None
+        self._session_maker = None
+
 
-sessionmanager = DatabaseSessionManager(config.DB_URL)
+sessionmanager = DatabaseSessionManager(config.DB_URL, config.DB_POOL_SIZE, config.DB_MAX_OVERFLOW,
+                                        config.DB_PREPARED_STATEMENT_CACHE_SIZE)
 
 
 async def get_db():
@@ -0,0 +1,201 @@
+import contextlib
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from greenlet import getcurrent
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+|\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*(?:\?|__\[POSTCOMPILE_\w+\])(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize(statement: str) -> str:
+    """
+    The normalize function reduces an SQL statement to its shape: literals and parameters become ?,
+    IN lists become (...) and whitespace is collapsed, so the same query with other values compares equal.
+
+    :param statement: str: The SQL statement
+    :return: The normalized statement
+    :doc-author: Trelent
+    """
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def caller() -> str:
+    """
+    The caller function names the application function that issued the statement being executed.
+    The async engine runs the driver in a greenlet, the awaiting coroutines are found in the frames of its parent.
+
+    :return: The module and the name of the first function of the application outside src.database
+    :doc-author: Trelent
+    """
+    frames = [sys._getframe(1)]
+    parent = getcurrent().parent
+    if parent is not None and parent.gr_frame is not None:
+        frames.append(parent.gr_frame)
+    for frame in frames:
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if module.startswith("src.") and not module.startswith("src.database"):
+                return f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+    return "unknown"
+
+
+class QueryStats:
+    """
+    The QueryStats counts the statements executed in one request or one assert_max_queries block,
+    grouped by their normalized shape.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter[str] = Counter()
+        self.callers: dict[str, str] = {}
+
+    def record(self, statement: str, duration: float, source: str | None):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+        if source is not None:
+            self.callers.setdefault(statement, source)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int, str]]:
+        """
+        The repeated function lists the statements executed more than threshold times, the N+1 pattern
+        of loading related rows one by one in a loop.
+
+        :param self: Represent the instance of the class
+        :param threshold: int: Number of executions of the same statement that is still fine
+        :return: A list of the statement, the number of executions and the calling function
+        :doc-author: Trelent
+        """
+        return [(statement, count, self.callers.get(statement, "unknown"))
+                for statement, count in self.statements.most_common() if count > threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        lines += [f"  {count} x {statement} ({self.callers.get(statement, 'unknown')})"
+                  for statement, count in self.statements.most_common()]
+        return "\n".join(lines)
+
+
+class QueryProfiler:
+    """
+    The QueryProfiler listens to the cursor events of the engines it instruments.
+    Statements slower than slow_query_ms are logged with their normalized SQL and the calling function.
+    Inside request() the statements are counted per request and a statement repeated more than
+    n_plus_one_threshold times is logged as a likely N+1. assert_max_queries() is the test mode.
+    """
+
+    def __init__(self, slow_query_ms: float = 200, n_plus_one_threshold: int = 10):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._request: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+        self._recorders: list[QueryStats] = []
+
+    def instrument(self, engine: AsyncEngine | Engine):
+        """
+        The instrument function attaches the profiler to the cursor events of an engine.
+
+        :param self: Represent the instance of the class
+        :param engine: AsyncEngine | Engine: The engine to profile
+        :return: None
+        :doc-author: Trelent
+        """
+        sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        if not event.contains(sync_engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+            event.listen(sync_engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _handle_error(self, context):
+        # A failed statement has no after_cursor_execute, its start time would stay on the pooled connection
+        # and be taken as the start of the next statement
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        stats = self._request.get()
+        if stats is None and not self._recorders:
+            if duration * 1000 < self.slow_query_ms:
+                return
+        normalized = normalize(statement)
+        source = None
+        if duration * 1000 >= self.slow_query_ms:
+            source = caller()
+            logger.warning("Slow query %.1f ms in %s: %s", duration * 1000, source, normalized)
+        for recorder in [stats, *self._recorders]:
+            if recorder is None:
+                continue
+            if source is None and normalized not in recorder.callers:
+                source = caller()
+            recorder.record(normalized, duration, source)
+
+    @contextlib.contextmanager
+    def request(self, label: str):
+        """
+        The request function counts the statements executed in the current context, i.e. one request,
+        and logs the statements repeated more than n_plus_one_threshold times when it ends.
+
+        :param self: Represent the instance of the class
+        :param label: str: Name of the request in the log, e.g. the method and the path
+        :return: The QueryStats of the request
+        :doc-author: Trelent
+        """
+        stats = QueryStats()
+        token = self._request.set(stats)
+        try:
+            yield stats
+        finally:
+            self._request.reset(token)
+            for statement, count, source in stats.repeated(self.n_plus_one_threshold):
+                logger.warning("Possible N+1 in %s: %s executed %s times by %s", label, statement, count, source)
+
+    @contextlib.contextmanager
+    def assert_max_queries(self, limit: int):
+        """
+        The assert_max_queries function is the test mode of the profiler: it fails when the code in the block
+        executes more than limit statements on the instrumented engines, in any thread.
+
+            with query_profiler.assert_max_queries(3):
+                client.get("/api/contacts/")
+
+        :param self: Represent the instance of the class
+        :param limit: int: Maximum number of statements
+        :return: The QueryStats of the block
+        :doc-author: Trelent
+        """
+        stats = QueryStats()
+        self._recorders.append(stats)
+        try:
+            yield stats
+        finally:
+            self._recorders.remove(stats)
+        if stats.count > limit:
+            raise AssertionError(f"Expected at most {limit} queries, executed {stats.report()}")
+
+
+query_profiler = QueryProfiler(config.DB_SLOW_QUERY_MS, config.DB_N_PLUS_ONE_THRESHOLD)
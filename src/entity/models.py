@@ -1,7 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Boolean
+from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Boolean, Index, text
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -16,9 +16,44 @@ class Contact(Base):
     surname: Mapped[str] = mapped_column(String(50))
     email: Mapped[str] = mapped_column(String(50))
     phone: Mapped[str] = mapped_column(String(20))
+    phone_e164: Mapped[str] = mapped_column(String(16), nullable=True)
     birthday: Mapped[date] = mapped_column(Date())
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
     user: Mapped["User"] = relationship("User", backref="contacts", lazy="joined")
+    seq: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_contacts_user_id_seq', 'user_id', 'seq', unique=True),
+        Index('ix_contacts_user_id_phone_e164', 'user_id', 'phone_e164',
+              postgresql_include=['id', 'name', 'surname', 'deleted_at']),
+        # Live contacts of a user, the tombstones left for the sync stay out of the index
+        Index('ix_contacts_user_id_id_live', 'user_id', 'id',
+              postgresql_where=text('deleted_at IS NULL'), sqlite_where=text('deleted_at IS NULL')),
+        # Tombstones in deletion order for the purge job
+        Index('ix_contacts_deleted_at', 'deleted_at',
+              postgresql_where=text('deleted_at IS NOT NULL'), sqlite_where=text('deleted_at IS NOT NULL')),
+    )
+
+
+class ContactBlockingKey(Base):
+    __tablename__ = 'contact_blocking_keys'
+    contact_id: Mapped[int] = mapped_column(Integer, ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(10), primary_key=True)
+    key: Mapped[str] = mapped_column(String(150))
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+
+    __table_args__ = (
+        Index('ix_contact_blocking_keys_user_id_kind_key', 'user_id', 'kind', 'key'),
+    )
+
+
+class ContactStat(Base):
+    __tablename__ = 'contact_stats'
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(10), primary_key=True)
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
 
 
 class User(Base):
@@ -32,3 +67,6 @@ class User(Base):
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now())
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
+    contacts_seq: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    contacts_purged_seq: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6))
+
+
+def _parse_field(expression: str, low: int, high: int) -> set[int]:
+    values = set()
+    for part in expression.split(","):
+        value_range, _, step = part.partition("/")
+        if value_range == "*":
+            start, end = low, high
+        elif "-" in value_range:
+            start, end = (int(value) for value in value_range.split("-", 1))
+        else:
+            start = end = int(value_range)
+            if step:
+                end = high
+        if not low <= start <= end <= high:
+            raise ValueError(f"Cron value {part} is out of range {low}-{high}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+class CronSchedule:
+    """
+    The CronSchedule is a five fields cron expression: minute, hour, day of month, month and
+    day of week (0 is Sunday). Fields accept *, numbers, lists, ranges and steps, e.g. */15 or 1-5.
+    Like in cron, when both day fields are restricted a day matching either of them fires.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} must have 5 fields")
+        self.expression = expression
+        parsed = {name: _parse_field(field, low, high) for field, (name, low, high) in zip(fields, _FIELDS)}
+        self.minutes, self.hours = parsed["minute"], parsed["hour"]
+        self.days, self.months, self.weekdays = parsed["day"], parsed["month"], parsed["weekday"]
+        self._any_day, self._any_weekday = fields[2] == "*", fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        The next_after function returns the first time after moment matching the schedule.
+        Whole days and hours not matching are skipped, so rare schedules do not walk every minute.
+
+        :param self: Represent the instance of the class
+        :param moment: datetime: The time to start from
+        :return: The next matching time, with seconds set to 0
+        :doc-author: Trelent
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
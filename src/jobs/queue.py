@@ -0,0 +1,302 @@
+import asyncio
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Any
+
+import redis.asyncio as redis
+
+from src.conf.config import config
+
+QUEUED, RUNNING, RETRYING, SUCCEEDED, FAILED = "queued", "running", "retrying", "succeeded", "failed"
+
+
+@dataclass
+class Job:
+    name: str
+    args: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    attempts: int = 0
+    run_at: float = field(default_factory=time.time)
+    enqueued_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    progress: dict = field(default_factory=dict)
+    result: Any = None
+    error: str | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> "Job":
+        return cls(**json.loads(data))
+
+
+class JobQueue(ABC):
+    """
+    The JobQueue is the interface of the job backends.
+    A dequeued job stays invisible for visibility_timeout seconds, if it is not acknowledged
+    by then (the worker died) requeue_expired makes it available again.
+    """
+
+    visibility_timeout: float = 300
+
+    @abstractmethod
+    async def enqueue(self, job: Job) -> Job:
+        ...
+
+    @abstractmethod
+    async def dequeue(self, timeout: float) -> Job | None:
+        ...
+
+    @abstractmethod
+    async def ack(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def touch(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def save(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Job | None:
+        ...
+
+    @abstractmethod
+    async def requeue_expired(self) -> int:
+        ...
+
+    @abstractmethod
+    async def acquire_schedule(self, name: str, slot: int, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+
+class InMemoryJobQueue(JobQueue):
+    """
+    The InMemoryJobQueue keeps the jobs in the process, for the tests and for running without Redis.
+    """
+
+    def __init__(self, visibility_timeout: float = 300):
+        self.visibility_timeout = visibility_timeout
+        self.jobs: dict[str, Job] = {}
+        self._ready: deque[str] = deque()
+        self._delayed: dict[str, float] = {}
+        self._processing: dict[str, float] = {}
+        self._schedules: dict[tuple[str, int], float] = {}
+        self._available = asyncio.Event()
+
+    async def enqueue(self, job: Job) -> Job:
+        self.jobs[job.id] = job
+        if job.run_at > time.time():
+            self._delayed[job.id] = job.run_at
+        else:
+            self._ready.appendleft(job.id)
+            self._available.set()
+        return job
+
+    def _promote_delayed(self):
+        now = time.time()
+        for job_id, run_at in list(self._delayed.items()):
+            if run_at <= now:
+                del self._delayed[job_id]
+                self._ready.appendleft(job_id)
+
+    async def dequeue(self, timeout: float) -> Job | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._promote_delayed()
+            if self._ready:
+                job_id = self._ready.pop()
+                self._processing[job_id] = time.time() + self.visibility_timeout
+                return self.jobs[job_id]
+            self._available.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._available.wait(), min(remaining, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: Job):
+        self._processing.pop(job.id, None)
+
+    async def touch(self, job: Job):
+        if job.id in self._processing:
+            self._processing[job.id] = time.time() + self.visibility_timeout
+
+    async def save(self, job: Job):
+        self.jobs[job.id] = job
+
+    async def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    async def requeue_expired(self) -> int:
+        now = time.time()
+        expired = [job_id for job_id, deadline in self._processing.items() if deadline <= now]
+        for job_id in expired:
+            del self._processing[job_id]
+            self._ready.appendleft(job_id)
+        if expired:
+            self._available.set()
+        return len(expired)
+
+    async def acquire_schedule(self, name: str, slot: int, ttl: float) -> bool:
+        now = time.time()
+        if self._schedules.get((name, slot), 0) > now:
+            return False
+        self._schedules[(name, slot)] = now + ttl
+        return True
+
+    async def stats(self) -> dict:
+        return {"ready": len(self._ready), "delayed": len(self._delayed), "processing": len(self._processing)}
+
+
+# Takes the oldest ready id and registers it as processing until ARGV[1] in one step,
+# a worker dying in between cannot lose the job
+CLAIM_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if job_id then
+    redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+end
+return job_id
+"""
+
+# Moves an id from the sorted set KEYS[1] to the ready list KEYS[2] if it is still in the set
+REQUEUE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    The RedisJobQueue shares the jobs between the web and worker processes.
+    Keys: jobs:ready (list of ids), jobs:delayed and jobs:processing (sorted sets scored by time)
+    and jobs:job:<id> with the serialized job, expiring result_ttl seconds after the job finished.
+    """
+
+    READY, DELAYED, PROCESSING = "jobs:ready", "jobs:delayed", "jobs:processing"
+
+    def __init__(self, client: redis.Redis, visibility_timeout: float = 300, result_ttl: int = 86400):
+        self.client = client
+        self.visibility_timeout = visibility_timeout
+        self.result_ttl = result_ttl
+        self._claim = client.register_script(CLAIM_SCRIPT)
+        self._requeue = client.register_script(REQUEUE_SCRIPT)
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"jobs:job:{job_id}"
+
+    async def enqueue(self, job: Job) -> Job:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(job.id), job.to_json())
+            if job.run_at > time.time():
+                pipe.zadd(self.DELAYED, {job.id: job.run_at})
+            else:
+                pipe.lpush(self.READY, job.id)
+            await pipe.execute()
+        return job
+
+    async def _promote_delayed(self):
+        due = await self.client.zrangebyscore(self.DELAYED, 0, time.time(), start=0, num=100)
+        for job_id in due:
+            # Only the process that removed the id moves it, so a job is never queued twice
+            await self._requeue(keys=[self.DELAYED, self.READY], args=[job_id])
+
+    async def dequeue(self, timeout: float) -> Job | None:
+        await self._promote_delayed()
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = await self._claim(keys=[self.READY, self.PROCESSING],
+                                       args=[time.time() + self.visibility_timeout])
+            if job_id is not None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Wait for a job without taking it: BLMOVE puts the last id back where it was,
+            # the job is then claimed by the script, so it is never out of both the list and the set
+            if await self.client.blmove(self.READY, self.READY, remaining, "RIGHT", "RIGHT") is None:
+                return None
+        data = await self.client.get(self._key(job_id))
+        if data is None:
+            await self.client.zrem(self.PROCESSING, job_id)
+            return None
+        return Job.from_json(data)
+
+    async def ack(self, job: Job):
+        await self.client.zrem(self.PROCESSING, job.id)
+
+    async def touch(self, job: Job):
+        await self.client.zadd(self.PROCESSING, {job.id: time.time() + self.visibility_timeout}, xx=True)
+
+    async def save(self, job: Job):
+        ttl = self.result_ttl if job.status in (SUCCEEDED, FAILED) else None
+        await self.client.set(self._key(job.id), job.to_json(), ex=ttl)
+
+    async def get(self, job_id: str) -> Job | None:
+        data = await self.client.get(self._key(job_id))
+        return Job.from_json(data) if data is not None else None
+
+    async def requeue_expired(self) -> int:
+        expired = await self.client.zrangebyscore(self.PROCESSING, 0, time.time(), start=0, num=100)
+        requeued = 0
+        for job_id in expired:
+            requeued += await self._requeue(keys=[self.PROCESSING, self.READY], args=[job_id])
+        return requeued
+
+    async def acquire_schedule(self, name: str, slot: int, ttl: float) -> bool:
+        return bool(await self.client.set(f"jobs:schedule:{name}:{slot}", 1, nx=True, ex=max(1, int(ttl))))
+
+    async def stats(self) -> dict:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.llen(self.READY)
+            pipe.zcard(self.DELAYED)
+            pipe.zcard(self.PROCESSING)
+            ready, delayed, processing = await pipe.execute()
+        return {"ready": ready, "delayed": delayed, "processing": processing}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_job_queue(backend: str) -> JobQueue:
+    """
+    The create_job_queue function creates the job queue for the configured backend.
+
+    :param backend: str: redis or memory
+    :return: A job queue
+    :doc-author: Trelent
+    """
+    if backend == "memory":
+        return InMemoryJobQueue(visibility_timeout=config.JOBS_VISIBILITY_TIMEOUT)
+    if backend == "redis":
+        client = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0,
+                             password=config.REDIS_PASSWORD, decode_responses=True)
+        return RedisJobQueue(client, visibility_timeout=config.JOBS_VISIBILITY_TIMEOUT,
+                             result_ttl=config.JOBS_RESULT_TTL)
+    raise ValueError(f"Unknown jobs backend {backend}")
+
+
+job_queue = create_job_queue(config.JOBS_BACKEND)
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.jobs.worker import job, enqueue, report_progress, current_job
+from src.repository import contacts as repositories_contacts
+from src.repository import duplicates as repositories_duplicates
+from src.repository import stats as repositories_stats
+from src.repository import users as repositories_users
+from src.services import email as email_service
+from src.services.exports import export_path, write_export, remove_expired_exports
+
+
+@job("send_email", retries=5, backoff=30, timeout=60, concurrency=5)
+async def send_email(email: str, username: str, host: str):
+    """
+    The send_email job sends the email verification message, an SMTP failure is retried with backoff.
+
+    :param email: str: The user's email address
+    :param username: str: The username used in the greeting
+    :param host: str: The base url of the application
+    :return: None
+    :doc-author: Trelent
+    """
+    await email_service.send_email(email, username, host)
+
+
+@job("rebuild_blocking_keys", retries=1, concurrency=1, schedule="30 3 * * *")
+async def rebuild_blocking_keys() -> int:
+    """
+    The rebuild_blocking_keys job recomputes the duplicate detection keys of all contacts every night.
+
+    :return: The number of contacts processed
+    :doc-author: Trelent
+    """
+    async with sessionmanager.session() as db:
+        processed = await repositories_duplicates.rebuild_blocking_keys(db)
+    await report_progress(done=processed)
+    return processed
+
+
+@job("backfill_phone_e164", retries=1, concurrency=1)
+async def backfill_phone_e164() -> int:
+    """
+    The backfill_phone_e164 job fills the normalized phone of the contacts stored before the column existed.
+
+    :return: The number of contacts updated
+    :doc-author: Trelent
+    """
+    async with sessionmanager.session() as db:
+        updated = await repositories_contacts.backfill_phone_e164(db)
+    await report_progress(done=updated)
+    return updated
+
+
+@job("reconcile_contact_stats", retries=1, concurrency=1, schedule=config.CONTACT_STATS_RECONCILE_SCHEDULE)
+async def reconcile_contact_stats() -> int:
+    """
+    The reconcile_contact_stats job recounts the contact counters of all users and repairs the drifted ones.
+
+    :return: The number of users whose counters were repaired
+    :doc-author: Trelent
+    """
+    async with sessionmanager.session() as db:
+        repaired = await repositories_stats.reconcile_stats(db)
+    await report_progress(repaired=repaired)
+    return repaired
+
+
+@job("delete_all_contacts", retries=3, concurrency=2)
+async def delete_all_contacts(user_id: int, up_to_id: int) -> int:
+    """
+    The delete_all_contacts job deletes the contacts of a user in batches, a retry continues with the remaining ones.
+
+    :param user_id: int: Owner of the contacts
+    :param up_to_id: int: The highest id of the contacts to delete
+    :return: The number of contacts deleted
+    :doc-author: Trelent
+    """
+    async with sessionmanager.session() as db:
+        deleted = await repositories_contacts.delete_all_contacts(user_id, up_to_id, db,
+                                                                  config.CONTACTS_DELETE_BATCH_SIZE)
+    await report_progress(done=deleted)
+    return deleted
+
+
+@job("purge_deleted_contacts", retries=1, concurrency=1, schedule=config.CONTACTS_PURGE_SCHEDULE)
+async def purge_deleted_contacts() -> int:
+    """
+    The purge_deleted_contacts job removes the tombstones older than CONTACTS_PURGE_RETENTION_DAYS.
+    Syncing clients have that long to learn about a deletion before they need a full sync.
+
+    :return: The number of contacts purged
+    :doc-author: Trelent
+    """
+    older_than = datetime.utcnow() - timedelta(days=config.CONTACTS_PURGE_RETENTION_DAYS)
+    async with sessionmanager.session() as db:
+        purged = await repositories_contacts.purge_contacts(older_than, db, config.CONTACTS_PURGE_BATCH_SIZE)
+    await report_progress(done=purged)
+    return purged
+
+
+@job("delete_account", retries=5, backoff=30, concurrency=2)
+async def delete_account(user_id: int) -> int:
+    """
+    The delete_account job deletes a user with all their contacts in batches, a retry continues with the remaining ones.
+
+    :param user_id: int: The id of the user
+    :return: The number of contacts deleted
+    :doc-author: Trelent
+    """
+    async def on_deleted(deleted: int):
+        await report_progress(done=deleted)
+
+    async with sessionmanager.session() as db:
+        deleted = await repositories_users.delete_user(user_id, db, config.ACCOUNT_DELETE_BATCH_SIZE, on_deleted)
+    await report_progress(done=deleted)
+    return deleted
+
+
+@job("export_account", retries=3, backoff=30, concurrency=2)
+async def export_account(user_id: int) -> dict:
+    """
+    The export_account job writes the user's account and contacts to a ZIP archive, see write_export.
+    The archive is downloaded from /api/users/me/export/{job_id} and removed after EXPORTS_TTL_HOURS.
+
+    :param user_id: int: The id of the user
+    :return: The number of contacts exported and the size of the archive
+    :doc-author: Trelent
+    """
+    running = current_job.get()
+    path = export_path(running.job.id)
+
+    async def on_written(written: int):
+        await report_progress(done=written)
+
+    async with sessionmanager.session() as db:
+        user = await repositories_users.get_user_by_id(user_id, db)
+        if user is None:
+            return {"contacts": 0, "size": 0}
+        account = {"username": user.username, "email": user.email, "avatar": user.avatar,
+                   "confirmed": user.confirmed, "created_at": user.created_at}
+        stats = await repositories_stats.get_stats(db, user, datetime.today().date())
+        await report_progress(done=0, total=stats["total"])
+        batches = repositories_contacts.iter_contact_batches(user_id, db, config.EXPORTS_BATCH_SIZE)
+        written = await write_export(path, account, batches, on_written)
+    return {"contacts": written, "size": path.stat().st_size}
+
+
+@job("remove_expired_exports", retries=0, concurrency=1, schedule="0 * * * *")
+async def remove_expired_exports_job() -> int:
+    """
+    The remove_expired_exports job removes the export archives older than EXPORTS_TTL_HOURS every hour.
+
+    :return: The number of archives removed
+    :doc-author: Trelent
+    """
+    return await asyncio.to_thread(remove_expired_exports, config.EXPORTS_TTL_HOURS * 3600, time.time())
+
+
+@job("birthday_digest", retries=0, concurrency=1, schedule=config.BIRTHDAY_DIGEST_SCHEDULE)
+async def birthday_digest() -> int:
+    """
+    The birthday_digest job collects the upcoming birthdays of all users in one streamed query
+    and enqueues the digests in batches of BIRTHDAY_DIGEST_BATCH_SIZE users.
+    It is not retried, a second run would send the digests of the enqueued batches twice.
+
+    :return: The number of users getting a digest
+    :doc-author: Trelent
+    """
+    today = datetime.today().date().isoformat()
+    batch, users = [], 0
+    async with sessionmanager.session() as db:
+        async for digest in repositories_contacts.stream_upcoming_birthdays(config.BIRTHDAY_DIGEST_DAYS, db):
+            batch.append(digest)
+            if len(batch) == config.BIRTHDAY_DIGEST_BATCH_SIZE:
+                await enqueue("send_birthday_digests", batch, today)
+                users, batch = users + len(batch), []
+                await report_progress(users=users)
+    if batch:
+        await enqueue("send_birthday_digests", batch, today)
+        users += len(batch)
+    return users
+
+
+@job("send_birthday_digests", retries=5, backoff=60, timeout=600)
+async def send_birthday_digests(digests: list[dict], today: str) -> int:
+    """
+    The send_birthday_digests job renders and sends a batch of digests over one SMTP connection.
+    The number of digests handled is kept in the job progress, a retry continues after them.
+
+    :param digests: list[dict]: Digests from stream_upcoming_birthdays
+    :param today: str: The ISO day the digests were collected
+    :return: The number of emails sent
+    :doc-author: Trelent
+    """
+    running = current_job.get()
+    done = running.job.progress.get("done", 0) if running else 0
+    day = datetime.fromisoformat(today).date()
+    messages = email_service.birthday_digest_messages(digests[done:], day)
+
+    async def on_sent(handled: int):
+        await report_progress(done=done + handled, total=len(digests))
+
+    return await email_service.send_messages(messages, on_sent)
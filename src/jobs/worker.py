@@ -0,0 +1,211 @@
+import asyncio
+import contextvars
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from src.jobs.cron import CronSchedule
+from src.jobs.queue import Job, JobQueue, job_queue, RUNNING, RETRYING, SUCCEEDED, FAILED
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: Callable
+    retries: int = 3
+    backoff: float = 5
+    timeout: float | None = None
+    concurrency: int | None = None
+    schedule: CronSchedule | None = None
+
+
+@dataclass
+class _RunningJob:
+    job: Job
+    queue: JobQueue
+
+
+registry: dict[str, JobSpec] = {}
+current_job: contextvars.ContextVar[_RunningJob | None] = contextvars.ContextVar("current_job", default=None)
+
+
+def job(name: str, retries: int = 3, backoff: float = 5, timeout: float | None = None,
+        concurrency: int | None = None, schedule: str | None = None):
+    """
+    The job decorator registers a coroutine function as a job.
+
+    :param name: str: The name the job is enqueued with
+    :param retries: int: How many times a failed job is retried
+    :param backoff: float: Delay before the first retry in seconds, doubled on every retry
+    :param timeout: float | None: Maximum duration of one attempt in seconds
+    :param concurrency: int | None: Maximum number of attempts of this job running at once in a worker
+    :param schedule: str | None: Cron expression (UTC) to run the job periodically
+    :return: The decorator
+    :doc-author: Trelent
+    """
+    def decorator(func: Callable):
+        registry[name] = JobSpec(name, func, retries, backoff, timeout, concurrency,
+                                 CronSchedule(schedule) if schedule else None)
+        return func
+
+    return decorator
+
+
+async def enqueue(name: str, *args, queue: JobQueue | None = None, delay: float = 0, **kwargs) -> Job:
+    """
+    The enqueue function adds a job to the queue.
+
+    :param name: str: The name of a job registered in the worker process
+    :param args: Positional arguments of the job, must be JSON serializable
+    :param queue: JobQueue | None: The queue, the configured one by default
+    :param delay: float: Run the job no sooner than delay seconds from now
+    :param kwargs: Keyword arguments of the job, must be JSON serializable
+    :return: The queued job
+    :doc-author: Trelent
+    """
+    new_job = Job(name=name, args=list(args), kwargs=kwargs, run_at=time.time() + delay)
+    return await (queue or job_queue).enqueue(new_job)
+
+
+async def report_progress(**progress: Any):
+    """
+    The report_progress function stores the progress of the running job, so it can be polled.
+
+    :param progress: Any: Progress values, e.g. done=100, total=1000
+    :return: None
+    :doc-author: Trelent
+    """
+    running = current_job.get()
+    if running is None:
+        return
+    running.job.progress.update(progress)
+    await running.queue.save(running.job)
+
+
+class Worker:
+    def __init__(self, queue: JobQueue | None = None, concurrency: int = 10, poll_timeout: float = 1):
+        self.queue = queue or job_queue
+        self.concurrency = concurrency
+        self.poll_timeout = poll_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._job_slots = {spec.name: asyncio.Semaphore(spec.concurrency)
+                           for spec in registry.values() if spec.concurrency}
+        self._running: set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """
+        The run function fetches and runs jobs until stop is called.
+        It also fires the scheduled jobs and requeues the jobs of dead workers.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        background = [asyncio.create_task(self._schedule()), asyncio.create_task(self._recover())]
+        logger.info("Worker started with %s slots, jobs: %s", self.concurrency, ", ".join(sorted(registry)))
+        try:
+            while not self._stopping.is_set():
+                await self._slots.acquire()
+                try:
+                    queued = await self.queue.dequeue(self.poll_timeout)
+                except Exception as err:
+                    self._slots.release()
+                    logger.warning("Cannot fetch jobs: %r", err)
+                    await asyncio.sleep(self.poll_timeout)
+                    continue
+                if queued is None:
+                    self._slots.release()
+                    continue
+                task = asyncio.create_task(self._execute(queued))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        finally:
+            for task in background:
+                task.cancel()
+            if self._running:
+                await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _execute(self, queued: Job):
+        heartbeat = asyncio.create_task(self._heartbeat(queued))
+        try:
+            spec = registry.get(queued.name)
+            if spec is None:
+                queued.status, queued.error, queued.finished_at = FAILED, "Unknown job", time.time()
+                await self.queue.save(queued)
+                return
+            job_slot = self._job_slots.get(spec.name)
+            if job_slot is not None:
+                async with job_slot:
+                    await self._attempt(spec, queued)
+            else:
+                await self._attempt(spec, queued)
+        finally:
+            heartbeat.cancel()
+            await self.queue.ack(queued)
+            self._slots.release()
+
+    async def _heartbeat(self, queued: Job):
+        # Keeps a long running job invisible to requeue_expired while this worker is alive
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.touch(queued)
+            except Exception as err:
+                logger.warning("Cannot extend job %s: %r", queued.id, err)
+
+    async def _attempt(self, spec: JobSpec, queued: Job):
+        queued.status, queued.attempts, queued.started_at = RUNNING, queued.attempts + 1, time.time()
+        await self.queue.save(queued)
+        token = current_job.set(_RunningJob(queued, self.queue))
+        try:
+            result = await asyncio.wait_for(spec.func(*queued.args, **queued.kwargs), spec.timeout)
+        except Exception as err:
+            queued.error = repr(err)
+            if queued.attempts <= spec.retries:
+                queued.status = RETRYING
+                queued.run_at = time.time() + spec.backoff * 2 ** (queued.attempts - 1)
+                logger.warning("Job %s %s failed, retry %s: %r", queued.name, queued.id, queued.attempts, err)
+                await self.queue.enqueue(queued)
+            else:
+                queued.status, queued.finished_at = FAILED, time.time()
+                logger.error("Job %s %s failed: %r", queued.name, queued.id, err)
+                await self.queue.save(queued)
+            return
+        finally:
+            current_job.reset(token)
+        queued.status, queued.result, queued.error, queued.finished_at = SUCCEEDED, result, None, time.time()
+        await self.queue.save(queued)
+
+    async def _schedule(self):
+        scheduled = [spec for spec in registry.values() if spec.schedule]
+        now = datetime.now(timezone.utc)
+        next_runs = {spec.name: spec.schedule.next_after(now) for spec in scheduled}
+        while scheduled:
+            now = datetime.now(timezone.utc)
+            for spec in scheduled:
+                slot = next_runs[spec.name]
+                if slot > now:
+                    continue
+                next_runs[spec.name] = spec.schedule.next_after(now)
+                # Every worker runs the scheduler, only the first one to claim the slot enqueues
+                if await self.queue.acquire_schedule(spec.name, int(slot.timestamp()), ttl=3600):
+                    await enqueue(spec.name, queue=self.queue)
+            await asyncio.sleep(max(0.5, min((run - now).total_seconds() for run in next_runs.values())))
+
+    async def _recover(self):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 2)
+            try:
+                requeued = await self.queue.requeue_expired()
+                if requeued:
+                    logger.warning("Requeued %s jobs of dead workers", requeued)
+            except Exception as err:
+                logger.warning("Cannot requeue expired jobs: %r", err)
@@ -0,0 +1,141 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+UNCOMPRESSIBLE_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "application/x-gzip")
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    The negotiate_encoding function picks the response encoding from the Accept-Encoding header.
+    The encoding with the highest q-value wins, brotli before gzip when they are equal,
+    and brotli is only considered when the brotli package is installed.
+    Encodings with q=0 are refused, and nothing is compressed when the client ranks identity higher.
+
+    :param accept_encoding: str: The value of the Accept-Encoding request header
+    :return: br, gzip or None when the body has to be sent as is
+    :doc-author: Trelent
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    candidates = ("br", "gzip") if brotli is not None else ("gzip",)
+    # max keeps the first of equal values, so brotli wins a tie
+    encoding = max(candidates, key=lambda name: accepted.get(name, accepted.get("*", 0.0)))
+    quality = accepted.get(encoding, accepted.get("*", 0.0))
+    if quality <= 0 or quality < accepted.get("identity", 0.0):
+        return None
+    return encoding
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        # Flush after every chunk so streamed rows reach the client without waiting for the next one
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    The CompressionMiddleware compresses response bodies with brotli or gzip.
+    Complete bodies smaller than minimum_size are sent as is, streaming responses are
+    compressed chunk by chunk. Vary: Accept-Encoding is added to every compressible response.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str | None, middleware: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.middleware = middleware
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if "content-encoding" in headers or content_type.startswith(UNCOMPRESSIBLE_TYPES):
+                self.passthrough = True
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            await self._start(body, more_body)
+            return
+        if self.compressor is None:
+            await self._send(message)
+        elif more_body:
+            await self._send({"type": "http.response.body", "body": self.compressor.chunk(body), "more_body": True})
+        else:
+            await self._send({"type": "http.response.body", "body": self.compressor.finish(body)})
+
+    async def _start(self, body: bytes, more_body: bool) -> None:
+        start_message, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if self.encoding is None or (not more_body and len(body) < self.middleware.minimum_size):
+            await self._send(start_message)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        headers["Content-Encoding"] = self.encoding
+        if more_body:
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            body = self.compressor.chunk(body)
+        else:
+            body = self.compressor.finish(body)
+            headers["Content-Length"] = str(len(body))
+        await self._send(start_message)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
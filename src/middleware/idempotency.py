@@ -0,0 +1,162 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.auth import auth_service
+
+IN_FLIGHT, COMPLETED = "in_flight", "completed"
+
+
+def _subject(headers: Headers) -> str | None:
+    """
+    The _subject function reads the user from the access token without touching the database.
+    The route still authenticates the request, this only scopes the idempotency key to the user.
+
+    :param headers: Headers: The request headers
+    :return: The email of the user or None if the token is missing or invalid
+    :doc-author: Trelent
+    """
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub") if payload.get("scope") == "access_token" else None
+
+
+class IdempotencyMiddleware:
+    """
+    The IdempotencyMiddleware makes the listed POST routes safe to retry with an Idempotency-Key header.
+    The first response is stored in Redis under the user and the key for ttl seconds and replayed for
+    retries without running the route. A retry arriving while the first request is still running waits
+    for its response. Reusing a key with a different body is rejected with 422.
+    Server errors and rate limited responses are not stored, the client may retry them.
+    Without Redis (app.state.redis is not set) requests pass through.
+    """
+
+    def __init__(self, app: ASGIApp, paths: set[str], ttl: int = 86400, lock_ttl: int = 60,
+                 wait_timeout: float = 10, poll_interval: float = 0.05):
+        self.app = app
+        self.paths = {path.rstrip("/") for path in paths}
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"].rstrip("/") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        redis_client = getattr(scope["app"].state, "redis", None) if "app" in scope else None
+        subject = _subject(headers) if idempotency_key else None
+        if subject is None or redis_client is None:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > 255:
+            await JSONResponse(status_code=400, content={"detail": "Idempotency-Key is too long"})(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        body_sent = False
+
+        async def receive_body() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        fingerprint = hashlib.sha256(scope["path"].encode() + b"\0" + body).hexdigest()
+        key = f"idempotency:{subject}:{idempotency_key}"
+        try:
+            record = await self._acquire_or_wait(redis_client, key, fingerprint)
+        except Exception as err:
+            print(f"Idempotency store is not available: {err!r}")
+            await self.app(scope, receive_body, send)
+            return
+        if record is not None:
+            await self._replay(record, fingerprint)(scope, receive, send)
+            return
+
+        stored = {"status": COMPLETED, "fingerprint": fingerprint, "code": None, "content_type": None}
+        chunks = []
+
+        async def send_and_capture(message: Message):
+            if message["type"] == "http.response.start":
+                stored["code"] = message["status"]
+                stored["content_type"] = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        finally:
+            await self._store(redis_client, key, stored, b"".join(chunks))
+
+    async def _store(self, redis_client, key: str, stored: dict, body: bytes):
+        try:
+            if stored["code"] is not None and stored["code"] < 500 and stored["code"] != 429:
+                stored["body"] = base64.b64encode(body).decode()
+                await redis_client.set(key, json.dumps(stored), ex=self.ttl)
+            else:
+                await redis_client.delete(key)
+        except Exception as err:
+            print(f"Cannot store the idempotent response: {err!r}")
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                return body
+
+    async def _acquire_or_wait(self, redis_client, key: str, fingerprint: str) -> dict | None:
+        """
+        The _acquire_or_wait function either marks the key as in flight for this request and returns None,
+        or returns the record of the request that used the key first, waiting until it is completed.
+
+        :param self: Represent the instance of the class
+        :param redis_client: The Redis client
+        :param key: str: The Redis key of the user and the idempotency key
+        :param fingerprint: str: Hash of the path and the body of this request
+        :return: The stored record, or None if this request has to be executed
+        :doc-author: Trelent
+        """
+        in_flight = json.dumps({"status": IN_FLIGHT, "fingerprint": fingerprint})
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            if await redis_client.set(key, in_flight, nx=True, ex=self.lock_ttl):
+                return None
+            data = await redis_client.get(key)
+            if data is not None:
+                record = json.loads(data)
+                if record["status"] == COMPLETED or record["fingerprint"] != fingerprint:
+                    return record
+            if time.monotonic() >= deadline:
+                return {"status": IN_FLIGHT, "fingerprint": fingerprint}
+            await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    def _replay(record: dict, fingerprint: str) -> Response:
+        if record["fingerprint"] != fingerprint:
+            return JSONResponse(status_code=422,
+                                content={"detail": "Idempotency-Key was already used with a different request"})
+        if record["status"] != COMPLETED:
+            return JSONResponse(status_code=409,
+                                content={"detail": "A request with this Idempotency-Key is in progress"})
+        return Response(content=base64.b64decode(record["body"]), status_code=record["code"],
+                        media_type=record["content_type"], headers={"Idempotent-Replayed": "true"})
@@ -0,0 +1,26 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.services.lifespan import Lifecycle
+
+
+class InFlightMiddleware:
+    """
+    The InFlightMiddleware refuses new requests with 503 once the worker is draining.
+    The requests already being served are left to finish, uvicorn's graceful shutdown waits for them.
+    """
+
+    def __init__(self, app: ASGIApp, lifecycle: Lifecycle):
+        self.app = app
+        self.lifecycle = lifecycle
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.lifecycle.draining:
+            response = JSONResponse(status_code=503, content={"detail": "Server is shutting down"},
+                                    headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,21 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.database.profiler import QueryProfiler
+
+
+class QueryProfilerMiddleware:
+    """
+    The QueryProfilerMiddleware counts the database statements of every request,
+    so statements repeated in a loop are reported with the endpoint that runs them.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with self.profiler.request(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
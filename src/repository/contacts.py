@@ -1,14 +1,88 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import AsyncIterator
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete, or_, literal, literal_column, bindparam, Select, any_, ARRAY, \
+    Integer, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, noload
 
-from src.entity.models import Contact, User
+from src.entity.models import Contact, ContactBlockingKey, User
+from src.repository.duplicates import refresh_blocking_keys
+from src.repository.scans import ContactRow, scan_contacts
+from src.repository.stats import adjust_stats
 from src.schemas.contact import ContactSchema
+from src.services.cache import local_cache, invalidation_bus, ALL
+from src.services.phones import normalize_phone
+from src.services.search import rank_contacts, SIMILARITY_THRESHOLD
+from src.services.stats import stat_keys
+from src.services.singleflight import single_flight
 
+CONTACT_BY_ID = select(Contact).where(Contact.id == bindparam("contact_id"), Contact.user_id == bindparam("user_id"),
+                                      Contact.deleted_at.is_(None))
+# id = ANY(array) is one prepared statement for any number of ids, an IN list is a new one for every length
+CONTACTS_BY_IDS = {
+    "postgresql": select(Contact).where(Contact.user_id == bindparam("user_id"), Contact.deleted_at.is_(None),
+                                        Contact.id == any_(bindparam("contact_ids", type_=ARRAY(Integer)))),
+    None: select(Contact).where(Contact.user_id == bindparam("user_id"), Contact.deleted_at.is_(None),
+                                Contact.id.in_(bindparam("contact_ids", expanding=True))),
+}
 
+
+@lru_cache(maxsize=None)
+def contact_loader_options(fields: frozenset[str]) -> tuple:
+    """
+    The contact_loader_options function narrows the loading of contacts to the fields of a sparse fieldset.
+    The other columns are not selected and the user is not joined unless it was asked for.
+
+    :param fields: frozenset[str]: The fields of ContactResponse selected with fields=
+    :return: The loader options for the statement
+    :doc-author: Trelent
+    """
+    options = [load_only(*(getattr(Contact, field) for field in sorted(fields - {"user"})))]
+    if "user" not in fields:
+        options.append(noload(Contact.user))
+    return tuple(options)
+
+
+def with_fields(statement: Select, fields: frozenset[str] | None) -> Select:
+    """
+    The with_fields function applies the contact_loader_options of a sparse fieldset to a statement of contacts.
+
+    :param statement: Select: A statement selecting Contact
+    :param fields: frozenset[str] | None: The selected fields, None keeps the statement as is
+    :return: The narrowed statement
+    :doc-author: Trelent
+    """
+    return statement if fields is None else statement.options(*contact_loader_options(fields))
+
+
+@lru_cache(maxsize=None)
+def contacts_statement(name: bool, surname: bool, email: bool) -> Select:
+    """
+    The contacts_statement function builds the statement of get_contacts once for every combination of filters.
+    The values are bound when it is executed, so SQLAlchemy neither rebuilds it nor computes its cache key again.
+
+    :param name: bool: Filter the contacts by the name pattern
+    :param surname: bool: Filter the contacts by the surname pattern
+    :param email: bool: Filter the contacts by the email pattern
+    :return: The statement with user_id, limit, offset and the patterns as bind parameters
+    :doc-author: Trelent
+    """
+    statement = (select(Contact).where(Contact.user_id == bindparam("user_id"), Contact.deleted_at.is_(None))
+                 .offset(bindparam("offset")).limit(bindparam("limit")))
+    if name:
+        statement = statement.filter(Contact.name.like(bindparam("name")))
+    if surname:
+        statement = statement.filter(Contact.surname.like(bindparam("surname")))
+    if email:
+        statement = statement.filter(Contact.email.like(bindparam("email")))
+    return statement
+
+
+@single_flight
 async def get_contacts(name: str | None, surname: str | None, email: str | None, limit: int, offset: int,
-                       db: AsyncSession, user: User):
+                       db: AsyncSession, user: User, fields: frozenset[str] | None = None):
     """
     The get_contacts function returns a list of contacts that match the given parameters.
 
@@ -19,21 +93,25 @@ async def get_contacts(name: str | None, surname: str | None, email: str | None,
     :param offset: int: Specify the number of records to skip
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Filter the contacts by user
+    :param fields: frozenset[str] | None: Load only these fields, None loads all of them
     :return: A list of contacts
     :doc-author: Trelent
     """
-    statement = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    statement = with_fields(contacts_statement(bool(name), bool(surname), bool(email)), fields)
+    params = {"user_id": user.id, "limit": limit, "offset": offset}
     if name:
-        statement = statement.filter(Contact.name.like(f'%{name}%'))
+        params["name"] = f'%{name}%'
     if surname:
-        statement = statement.filter(Contact.surname.like(f'%{surname}%'))
+        params["surname"] = f'%{surname}%'
     if email:
-        statement = statement.filter(Contact.email.like(f'%{email}%'))
-    contacts = await db.execute(statement)
+        params["email"] = f'%{email}%'
+    contacts = await db.execute(statement, params)
     return contacts.scalars().all()
 
 
-async def get_upcoming_birthdays(days_range: int, db: AsyncSession, user: User):
+@single_flight
+async def get_upcoming_birthdays(days_range: int, db: AsyncSession, user: User,
+                                 fields: frozenset[str] | None = None):
     """
     The get_upcoming_birthdays function returns a list of contacts whose birthdays are within the specified range.
     The function takes two arguments: days_range and db. The days_range argument is an integer that specifies how many
@@ -43,32 +121,143 @@ async def get_upcoming_birthdays(days_range: int, db: AsyncSession, user: User):
     :param days_range: int: Specify the range of days to search for birthdays
     :param db: AsyncSession: Pass a database session to the function
     :param user: User: Filter the contacts by user
+    :param fields: frozenset[str] | None: Load only these fields, None loads all of them
     :return: A list of contacts whose birthday is in the next days_range days
     :doc-author: Trelent
     """
     today = datetime.today().date()
-    start_period = today.strftime('%m-%d')
-    end_period = (today + timedelta(days_range)).strftime('%m-%d')
-    statement = select(Contact).filter_by(user=user).filter(func.to_char(Contact.birthday, 'MM-DD').between(start_period, end_period))
+    statement = select(Contact).filter_by(user=user, deleted_at=None).filter(birthday_window(days_range, today))
+    statement = with_fields(statement, fields)
     contacts = await db.execute(statement)
     return contacts.scalars().all()
 
 
-async def get_contact(contact_id: int, db: AsyncSession, user: User):
+def birthday_window(days_range: int, today: date):
+    """
+    The birthday_window function builds the filter of the birthdays falling in the next days_range days.
+    Birthdays are compared by month and day, a window crossing the new year is split in two.
+
+    :param days_range: int: Specify the range of days to search for birthdays
+    :param today: date: The first day of the window
+    :return: A SQL expression
+    :doc-author: Trelent
+    """
+    start_period = today.strftime('%m-%d')
+    end_period = (today + timedelta(days_range)).strftime('%m-%d')
+    month_day = func.to_char(Contact.birthday, 'MM-DD')
+    if start_period <= end_period:
+        return month_day.between(start_period, end_period)
+    return or_(month_day >= start_period, month_day <= end_period)
+
+
+async def stream_upcoming_birthdays(days_range: int, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[dict]:
+    """
+    The stream_upcoming_birthdays function finds the upcoming birthdays of all confirmed users in one query.
+    Rows are ordered by user and fetched batch_size at a time from a server-side cursor,
+    consecutive rows of a user are folded into one digest, so memory does not grow with the number of users.
+
+    :param days_range: int: Specify the range of days to search for birthdays
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of rows fetched at a time
+    :return: An async iterator of dicts with user_id, email, username and the list of birthdays
+    :doc-author: Trelent
+    """
+    statement = (select(User.id, User.email, User.username, Contact.name, Contact.surname, Contact.birthday)
+                 .join(Contact, Contact.user_id == User.id)
+                 .filter(User.confirmed.is_(True), Contact.deleted_at.is_(None),
+                         birthday_window(days_range, datetime.today().date()))
+                 .order_by(User.id)
+                 .execution_options(yield_per=batch_size))
+    digest = None
+    async for row in await db.stream(statement):
+        if digest is None or digest["user_id"] != row.id:
+            if digest is not None:
+                yield digest
+            digest = {"user_id": row.id, "email": row.email, "username": row.username, "birthdays": []}
+        digest["birthdays"].append({"name": row.name, "surname": row.surname, "birthday": row.birthday.isoformat()})
+    if digest is not None:
+        yield digest
+
+
+def iter_contact_batches(user_id: int, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[list[ContactRow]]:
+    """
+    The iter_contact_batches function reads the live contacts of a user in id order, batch_size rows at a time,
+    with scan_contacts. Every batch is a keyset query on the partial index of the live contacts in its own
+    short transaction, so reading a large address book holds no transaction open between batches.
+
+    :param user_id: int: Owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :return: An async iterator of lists of ContactRow
+    :doc-author: Trelent
+    """
+    return scan_contacts(db, Contact.user_id == user_id, batch_size=batch_size)
+
+
+@single_flight
+async def get_contact(contact_id: int, db: AsyncSession, user: User, fields: frozenset[str] | None = None):
     """
     The get_contact function returns a contact from the database.
 
     :param contact_id: int: Specify the contact's id
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Get the user from the database
+    :param fields: frozenset[str] | None: Load only these fields, None loads all of them
     :return: A contact object
     :doc-author: Trelent
     """
-    statement = select(Contact).filter_by(id=contact_id, user=user)
-    contact = await db.execute(statement)
+    statement = with_fields(CONTACT_BY_ID, fields)
+    contact = await db.execute(statement, {"contact_id": contact_id, "user_id": user.id})
     return contact.scalar_one_or_none()
 
 
+async def get_contacts_by_ids(contact_ids: list[int], db: AsyncSession, user: User,
+                              fields: frozenset[str] | None = None):
+    """
+    The get_contacts_by_ids function returns the user's contacts with the given ids in one query.
+
+    :param contact_ids: list[int]: The ids of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :param fields: frozenset[str] | None: Load only these fields, None loads all of them
+    :return: A list of the contacts found, in no particular order
+    :doc-author: Trelent
+    """
+    dialect = db.get_bind().dialect.name
+    statement = with_fields(CONTACTS_BY_IDS.get(dialect, CONTACTS_BY_IDS[None]), fields)
+    contacts = await db.execute(statement, {"user_id": user.id, "contact_ids": list(contact_ids)})
+    return contacts.scalars().all()
+
+
+async def get_contacts_by_phone(phone_e164: str, db: AsyncSession, user: User):
+    """
+    The get_contacts_by_phone function returns the user's contacts with the given phone number.
+    Only columns stored in the (user_id, phone_e164) index are read, so PostgreSQL answers
+    with an index-only scan.
+
+    The rows are cached per user in the worker's local cache, every contact write of the user evicts them.
+
+    :param phone_e164: str: The phone number in the E.164 format
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A list of rows with id, name and surname
+    :doc-author: Trelent
+    """
+    lookups = local_cache.get("contacts", user.id) if invalidation_bus.connected else None
+    if lookups is not None and phone_e164 in lookups:
+        return lookups[phone_e164]
+    generation = local_cache.generation
+    statement = (select(Contact.id, Contact.name, Contact.surname)
+                 .filter(Contact.user_id == user.id, Contact.phone_e164 == phone_e164, Contact.deleted_at.is_(None))
+                 .order_by(Contact.id))
+    contacts = (await db.execute(statement)).all()
+    if invalidation_bus.connected:
+        lookups = dict(list((lookups or {}).items())[-99:])
+        lookups[phone_e164] = contacts
+        local_cache.set("contacts", user.id, lookups, generation)
+    return contacts
+
+
 async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
     """
     The create_contact function creates a new contact in the database.
@@ -79,9 +268,16 @@ async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = Contact(**body.model_dump(exclude_unset=True), user=user)
+    seq = await next_change_seq(db, user)
+    contact = Contact(**body.model_dump(exclude_unset=True), user=user, seq=seq,
+                      phone_e164=normalize_phone(body.phone))
     db.add(contact)
+    await db.flush()
+    await refresh_blocking_keys(contact, db)
+    user_id = user.id
+    await adjust_stats(db, user_id, [], stat_keys(contact))
     await db.commit()
+    await invalidation_bus.publish("contacts", user_id)
     await db.refresh(contact)
     return contact
 
@@ -104,16 +300,23 @@ async def update_contact(contact_id: int, body: ContactSchema, db: AsyncSession,
     :return: The updated contact
     :doc-author: Trelent
     """
-    statement = select(Contact).filter_by(id=contact_id, user=user)
+    statement = select(Contact).filter_by(id=contact_id, user=user, deleted_at=None)
     result = await db.execute(statement)
     contact = result.scalar_one_or_none()
     if contact:
+        before = stat_keys(contact)
         contact.name = body.name
         contact.surname = body.surname
         contact.email = body.email
         contact.phone = body.phone
+        contact.phone_e164 = normalize_phone(body.phone)
         contact.birthday = body.birthday
+        contact.seq = await next_change_seq(db, user)
+        await refresh_blocking_keys(contact, db)
+        user_id = user.id
+        await adjust_stats(db, user_id, before, stat_keys(contact))
         await db.commit()
+        await invalidation_bus.publish("contacts", user_id)
         await db.refresh(contact)
     return contact
 
@@ -121,6 +324,8 @@ async def update_contact(contact_id: int, body: ContactSchema, db: AsyncSession,
 async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     """
     The delete_contact function deletes a contact from the database.
+    The row is kept as a tombstone (deleted_at is set and the change sequence is bumped),
+    so that clients syncing with get_changes learn about the deletion.
 
     :param contact_id: int: Specify the contact to delete
     :param db: AsyncSession: Pass in the database session
@@ -128,10 +333,299 @@ async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     :return: The contact that was deleted
     :doc-author: Trelent
     """
-    statement = select(Contact).filter_by(id=contact_id, user=user)
+    statement = select(Contact).filter_by(id=contact_id, user=user, deleted_at=None)
     result = await db.execute(statement)
     contact = result.scalar_one_or_none()
     if contact:
-        await db.delete(contact)
+        contact.deleted_at = datetime.utcnow()
+        contact.seq = await next_change_seq(db, user)
+        await refresh_blocking_keys(contact, db)
+        user_id = user.id
+        await adjust_stats(db, user_id, stat_keys(contact), [])
+        await db.commit()
+        await invalidation_bus.publish("contacts", user_id)
+        await db.refresh(contact)
+    return contact
+
+
+async def merge_contacts(primary_id: int, duplicate_ids: list[int], db: AsyncSession, user: User):
+    """
+    The merge_contacts function keeps the primary contact and deletes its duplicates.
+    No field is carried over: every field of a contact is required, so the primary is kept exactly as it is,
+    and a client that wants a value of a duplicate updates the primary before merging.
+    The duplicates become tombstones like with delete_contact, so syncing clients drop them.
+
+    :param primary_id: int: The id of the contact to keep
+    :param duplicate_ids: list[int]: The ids of the contacts merged into it
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Ensure that the user is only merging their own contacts
+    :return: The primary contact or None if one of the contacts was not found
+    :doc-author: Trelent
+    """
+    ids = {primary_id, *duplicate_ids}
+    statement = select(Contact).filter_by(user=user, deleted_at=None).filter(Contact.id.in_(ids))
+    result = await db.execute(statement)
+    contacts = {contact.id: contact for contact in result.scalars().all()}
+    if set(contacts) != ids:
+        return None
+    removed = []
+    for contact_id in sorted(ids - {primary_id}):
+        duplicate = contacts[contact_id]
+        duplicate.deleted_at = datetime.utcnow()
+        duplicate.seq = await next_change_seq(db, user)
+        await refresh_blocking_keys(duplicate, db)
+        removed += stat_keys(duplicate)
+    user_id = user.id
+    await adjust_stats(db, user_id, removed, [])
+    await db.commit()
+    await invalidation_bus.publish("contacts", user_id)
+    primary = contacts[primary_id]
+    await db.refresh(primary)
+    return primary
+
+
+async def last_contact_id(db: AsyncSession, user: User) -> int:
+    """
+    The last_contact_id function returns the highest id of the user's live contacts,
+    it is answered from the partial index of the live contacts.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Owner of the contacts
+    :return: The id or 0 if the user has no contacts
+    :doc-author: Trelent
+    """
+    statement = select(func.max(Contact.id)).where(Contact.user_id == user.id, Contact.deleted_at.is_(None))
+    return (await db.execute(statement)).scalar() or 0
+
+
+async def delete_all_contacts(user_id: int, up_to_id: int, db: AsyncSession, batch_size: int = 500) -> int:
+    """
+    The delete_all_contacts function deletes the user's contacts up to the given id, the ones created later are kept.
+    Contacts become tombstones like with delete_contact, batch by batch, each batch committed on its own,
+    so the users row is locked only for one batch at a time and the other requests of the user keep going.
+
+    :param user_id: int: Owner of the contacts
+    :param up_to_id: int: The last_contact_id when the deletion was requested
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :return: The number of contacts deleted
+    :doc-author: Trelent
+    """
+    deleted = 0
+    while True:
+        # Lock the users row first, as next_change_seq does, so no writer changes the batch meanwhile
+        await db.execute(select(User.id).where(User.id == user_id).with_for_update())
+        statement = (select(Contact).options(noload(Contact.user))
+                     .where(Contact.user_id == user_id, Contact.deleted_at.is_(None), Contact.id <= up_to_id)
+                     .order_by(Contact.id).limit(batch_size))
+        contacts = (await db.execute(statement)).scalars().all()
+        if not contacts:
+            await db.commit()
+            return deleted
+        statement = (update(User).where(User.id == user_id).values(contacts_seq=User.contacts_seq + len(contacts))
+                     .returning(User.contacts_seq))
+        last_seq = (await db.execute(statement)).scalar_one()
+        deleted_at, removed = datetime.utcnow(), []
+        for seq, contact in enumerate(contacts, start=last_seq - len(contacts) + 1):
+            contact.deleted_at, contact.seq = deleted_at, seq
+            removed += stat_keys(contact)
+        await db.execute(delete(ContactBlockingKey)
+                         .where(ContactBlockingKey.contact_id.in_([contact.id for contact in contacts])))
+        await adjust_stats(db, user_id, removed, [])
+        await db.commit()
+        await invalidation_bus.publish("contacts", user_id)
+        deleted += len(contacts)
+
+
+async def purge_contacts(older_than: datetime, db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    The purge_contacts function removes the tombstones of the contacts deleted before older_than.
+    Rows are removed in batches of batch_size in deletion order, each batch committed on its own,
+    so no long lock is held. The highest purged change sequence of every user is kept in
+    contacts_purged_seq, a sync cursor below it has missed deletions and must start over.
+
+    :param older_than: datetime: Purge the contacts deleted before this time
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :return: The number of contacts purged
+    :doc-author: Trelent
+    """
+    seq = bindparam("purged_seq")
+    watermark = (update(User.__table__).where(User.id == bindparam("owner_id"))
+                 .values(contacts_purged_seq=case((User.contacts_purged_seq < seq, seq),
+                                                  else_=User.contacts_purged_seq)))
+    purged = 0
+    while True:
+        statement = (select(Contact.id, Contact.user_id, Contact.seq).where(Contact.deleted_at < older_than)
+                     .order_by(Contact.deleted_at).limit(batch_size))
+        rows = (await db.execute(statement)).all()
+        if not rows:
+            return purged
+        purged_seqs = {}
+        for row in rows:
+            if row.user_id is not None:
+                purged_seqs[row.user_id] = max(purged_seqs.get(row.user_id, 0), row.seq)
+        if purged_seqs:
+            # Users in id order, so concurrent purges lock their rows in the same order
+            await db.execute(watermark, [{"owner_id": user_id, "purged_seq": purged_seq}
+                                         for user_id, purged_seq in sorted(purged_seqs.items())])
+        await db.execute(delete(Contact).where(Contact.id.in_([row.id for row in rows])))
+        await db.commit()
+        purged += len(rows)
+
+
+async def get_purged_seq(db: AsyncSession, user: User) -> int:
+    """
+    The get_purged_seq function reads the user's contacts_purged_seq from the database,
+    the cached user of the request may be older than the last purge.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Owner of the contacts
+    :return: The highest change sequence of the purged contacts
+    :doc-author: Trelent
+    """
+    statement = select(User.contacts_purged_seq).where(User.id == user.id)
+    return (await db.execute(statement)).scalar() or 0
+
+
+async def backfill_phone_e164(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    The backfill_phone_e164 function fills phone_e164 for the contacts stored before the column existed.
+    Contacts are processed in id order, batch by batch, each batch is one bulk UPDATE by primary key
+    committed on its own, so no long lock is held.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :return: The number of contacts updated
+    :doc-author: Trelent
+    """
+    last_id, updated = 0, 0
+    while True:
+        statement = (select(Contact.id, Contact.phone).filter(Contact.id > last_id, Contact.phone_e164.is_(None))
+                     .order_by(Contact.id).limit(batch_size))
+        rows = (await db.execute(statement)).all()
+        if not rows:
+            return updated
+        values = [{"id": row.id, "phone_e164": normalize_phone(row.phone)} for row in rows]
+        values = [value for value in values if value["phone_e164"] is not None]
+        if values:
+            await db.execute(update(Contact), values)
         await db.commit()
-    return contact
\ No newline at end of file
+        await invalidation_bus.publish("contacts", ALL)
+        last_id, updated = rows[-1].id, updated + len(values)
+
+
+async def next_change_seq(db: AsyncSession, user: User) -> int:
+    """
+    The next_change_seq function reserves the next value of the user's contact change sequence.
+    The counter lives on the users row and is incremented with a single UPDATE ... RETURNING,
+    so the row lock serializes concurrent writers of the same user until they commit.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Owner of the sequence
+    :return: The reserved sequence number
+    :doc-author: Trelent
+    """
+    statement = (update(User).where(User.id == user.id).values(contacts_seq=User.contacts_seq + 1)
+                 .returning(User.contacts_seq))
+    result = await db.execute(statement)
+    return result.scalar_one()
+
+
+async def get_changes(since: int, limit: int, db: AsyncSession, user: User):
+    """
+    The get_changes function returns the contacts created, updated or deleted after the given cursor.
+    Rows are read in change sequence order through the (user_id, seq) index, so the cost depends
+    on the number of changes and not on the size of the address book.
+
+    :param since: int: Sequence number the client has already seen
+    :param limit: int: Maximum number of changes in one page
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A tuple of the changed contacts (deleted ones included) and a flag telling if more pages exist
+    :doc-author: Trelent
+    """
+    statement = (select(Contact).filter_by(user=user).filter(Contact.seq > since)
+                 .order_by(Contact.seq).limit(limit + 1))
+    result = await db.execute(statement)
+    contacts = result.scalars().all()
+    return contacts[:limit], len(contacts) > limit
+
+
+def phone_digits(column):
+    """
+    The phone_digits function strips the RFC3966 decoration from a stored phone number,
+    tel:+380-67-111-1111 becomes +380671111111. The same expression is indexed by the migration.
+
+    :param column: The phone column
+    :return: A SQL expression
+    :doc-author: Trelent
+    """
+    return func.replace(func.replace(column, 'tel:', ''), '-', '')
+
+
+async def suggest_contacts(q: str, limit: int, db: AsyncSession, user: User):
+    """
+    The suggest_contacts function returns the first contacts whose name, surname, email or phone starts with q.
+    Only prefix matches are used, so every branch of the condition can be answered
+    by a text_pattern_ops index of the user's contacts instead of a scan.
+
+    :param q: str: The prefix typed by the user
+    :param limit: int: Maximum number of suggestions
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A list of rows with id, name, surname, email and phone
+    :doc-author: Trelent
+    """
+    escaped = q.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    prefix = f'{escaped}%'
+    conditions = [func.lower(Contact.name).like(prefix, escape='\\'),
+                  func.lower(Contact.surname).like(prefix, escape='\\'),
+                  func.lower(Contact.email).like(prefix, escape='\\')]
+    phone = q.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+    if phone.lstrip('+').isdigit():
+        conditions.append(phone_digits(Contact.phone).like(f'{phone}%'))
+    statement = (select(Contact.id, Contact.name, Contact.surname, Contact.email, Contact.phone)
+                 .filter(Contact.user_id == user.id, Contact.deleted_at.is_(None), or_(*conditions))
+                 .order_by(Contact.name, Contact.surname, Contact.id).limit(limit))
+    result = await db.execute(statement)
+    return result.all()
+
+
+async def search_contacts(q: str, limit: int, offset: int, db: AsyncSession, user: User):
+    """
+    The search_contacts function returns the contacts matching the query, the most relevant first.
+    On PostgreSQL a contact matches when the search_vector column (a generated tsvector of name,
+    surname and email with a GIN index) matches the query words, or when a query word is similar
+    enough to a word of the contact (pg_trgm, GIN trigram index), so typos are tolerated.
+    The score is the best of ts_rank and the trigram word similarity.
+    Other databases use the in-memory ranking of src.services.search.
+    It is a function of its own rather than a mode of get_contacts: its results are ordered by score
+    and carry it, while get_contacts pages its filtered contacts in a stable order with a field selection.
+
+    :param q: str: The search query
+    :param limit: int: Limit the number of results
+    :param offset: int: Specify the number of results to skip
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A list of (contact, score) tuples
+    :doc-author: Trelent
+    """
+    if db.get_bind().dialect.name != 'postgresql':
+        statement = select(Contact).filter_by(user=user, deleted_at=None)
+        result = await db.execute(statement)
+        return rank_contacts(q, result.scalars().all(), limit, offset)
+
+    # search_vector is maintained by PostgreSQL (GENERATED ALWAYS ... STORED) and is not mapped on the model
+    search_vector = literal_column('contacts.search_vector')
+    search_text = func.lower(Contact.name + literal_column("' '") + Contact.surname + literal_column("' '")
+                             + Contact.email)
+    ts_query = func.plainto_tsquery('simple', q)
+    score = func.greatest(func.ts_rank(search_vector, ts_query), func.word_similarity(q.lower(), search_text))
+    statement = (select(Contact, score.label('score'))
+                 .filter(Contact.user_id == user.id, Contact.deleted_at.is_(None),
+                         or_(search_vector.op('@@')(ts_query), literal(q.lower()).op('<%')(search_text)))
+                 .order_by(score.desc(), Contact.id).offset(offset).limit(limit))
+    await db.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(SIMILARITY_THRESHOLD), True)))
+    result = await db.execute(statement)
+    return [(contact, round(score, 4)) for contact, score in result.all()]
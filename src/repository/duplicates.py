@@ -0,0 +1,71 @@
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import Contact, ContactBlockingKey, User
+from src.repository.scans import scan_contacts
+from src.services.duplicates import blocking_keys, group_duplicates
+
+
+async def refresh_blocking_keys(contact: Contact, db: AsyncSession):
+    """
+    The refresh_blocking_keys function replaces the blocking keys of a contact.
+    It is called by the create and update paths, the caller commits.
+    Deleted contacts lose their keys.
+
+    :param contact: Contact: A flushed contact
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    await db.execute(delete(ContactBlockingKey).where(ContactBlockingKey.contact_id == contact.id))
+    if contact.deleted_at is not None:
+        return
+    for kind, key in blocking_keys(contact).items():
+        db.add(ContactBlockingKey(contact_id=contact.id, kind=kind, key=key, user_id=contact.user_id))
+
+
+async def get_duplicates(db: AsyncSession, user: User):
+    """
+    The get_duplicates function returns the groups of the user's contacts that look like duplicates.
+    Only the keys occurring more than once are read, the (user_id, kind, key) index answers
+    the grouping, so the cost does not grow with the square of the address book.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Filter the contacts by user
+    :return: A list of groups of contact ids with the kinds of keys they share
+    :doc-author: Trelent
+    """
+    shared = (select(ContactBlockingKey.kind, ContactBlockingKey.key)
+              .filter(ContactBlockingKey.user_id == user.id)
+              .group_by(ContactBlockingKey.kind, ContactBlockingKey.key)
+              .having(func.count() > 1).subquery())
+    statement = (select(ContactBlockingKey.contact_id, ContactBlockingKey.kind, ContactBlockingKey.key)
+                 .join(shared, (ContactBlockingKey.kind == shared.c.kind) & (ContactBlockingKey.key == shared.c.key))
+                 .filter(ContactBlockingKey.user_id == user.id))
+    result = await db.execute(statement)
+    return group_duplicates(result.all())
+
+
+async def rebuild_blocking_keys(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    The rebuild_blocking_keys function recomputes the blocking keys of all contacts of all users.
+    Contacts are read with scan_contacts, batch by batch, the keys of a batch are inserted with one
+    executemany and committed on their own, so the job never holds a long transaction nor builds ORM objects.
+    It backfills the keys of existing contacts and repairs them if the key rules change.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :return: The number of contacts processed
+    :doc-author: Trelent
+    """
+    processed = 0
+    async for rows in scan_contacts(db, batch_size=batch_size):
+        ids = [row.id for row in rows]
+        await db.execute(delete(ContactBlockingKey).where(ContactBlockingKey.contact_id.in_(ids)))
+        keys = [{"contact_id": row.id, "kind": kind, "key": key, "user_id": row.user_id}
+                for row in rows for kind, key in blocking_keys(row).items()]
+        if keys:
+            await db.execute(insert(ContactBlockingKey), keys)
+        await db.commit()
+        processed += len(rows)
+    return processed
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import AsyncIterator, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import Contact
+
+
+class ContactRow(NamedTuple):
+    """
+    A read-only contact of the bulk scans. It is a plain tuple, without the instance state,
+    the attribute dictionary and the identity map entry of an ORM Contact.
+    """
+    id: int
+    user_id: int | None
+    name: str
+    surname: str
+    email: str
+    phone: str
+    birthday: date
+
+
+CONTACT_ROW_STATEMENT = (select(*(getattr(Contact, field) for field in ContactRow._fields))
+                         .where(Contact.deleted_at.is_(None)).order_by(Contact.id))
+
+
+async def scan_contacts(db: AsyncSession, *criteria, batch_size: int = 1000) -> AsyncIterator[list[ContactRow]]:
+    """
+    The scan_contacts function reads the live contacts matching the criteria in id order, as lists of
+    at most batch_size ContactRow. The rows are fetched on the session's connection, they never become
+    ORM objects, so the memory of a scan is one batch whatever the number of contacts.
+    Every batch is a keyset query in its own short transaction, the caller may write and commit between batches.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param criteria: Additional filters, e.g. Contact.user_id == user_id
+    :param batch_size: int: Number of contacts per batch
+    :return: An async iterator of batches of contacts
+    :doc-author: Trelent
+    """
+    statement = CONTACT_ROW_STATEMENT.where(*criteria).limit(batch_size)
+    last_id = 0
+    while True:
+        connection = await db.connection()
+        result = await connection.execute(statement.where(Contact.id > last_id))
+        rows = [ContactRow._make(row) for row in result]
+        await db.commit()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
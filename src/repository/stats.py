@@ -0,0 +1,93 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import Contact, ContactStat, User
+from src.services.stats import stat_keys, TOTAL, MONTH, DOMAIN
+
+
+async def adjust_stats(db: AsyncSession, user_id: int, removed: list[tuple[str, str]], added: list[tuple[str, str]]):
+    """
+    The adjust_stats function applies a contact change to the user's counter rows with one upsert.
+    It is called by the write paths after next_change_seq, whose lock on the users row serializes
+    the writers of the user, the caller commits.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user_id: int: Owner of the counters
+    :param removed: list[tuple[str, str]]: The stat_keys of the contacts before the change
+    :param added: list[tuple[str, str]]: The stat_keys of the contacts after the change
+    :return: None
+    :doc-author: Trelent
+    """
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    values = [{"user_id": user_id, "kind": kind, "key": key, "count": delta}
+              for (kind, key), delta in deltas.items() if delta]
+    if not values:
+        return
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = insert(ContactStat).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ContactStat.user_id, ContactStat.kind, ContactStat.key],
+        set_={"count": ContactStat.count + statement.excluded.count})
+    await db.execute(statement)
+
+
+async def get_stats(db: AsyncSession, user: User, today: date, domains: int = 10) -> dict:
+    """
+    The get_stats function reads the user's counter rows, one primary key range scan
+    whose cost does not depend on the number of contacts.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: User: Owner of the counters
+    :param today: date: The day the month of birthdays is taken from
+    :param domains: int: Number of the most common email domains returned
+    :return: A dictionary with the total, the birthdays this month and the contacts by email domain
+    :doc-author: Trelent
+    """
+    statement = (select(ContactStat.kind, ContactStat.key, ContactStat.count)
+                 .filter(ContactStat.user_id == user.id, ContactStat.count > 0)
+                 .order_by(ContactStat.count.desc(), ContactStat.key))
+    rows = (await db.execute(statement)).all()
+    counts = {(row.kind, row.key): row.count for row in rows}
+    return {"total": counts.get((TOTAL, ""), 0),
+            "birthdays_this_month": counts.get((MONTH, f"{today.month:02d}"), 0),
+            "domains": dict([(row.key, row.count) for row in rows if row.kind == DOMAIN][:domains])}
+
+
+async def reconcile_stats(db: AsyncSession, batch_size: int = 100) -> int:
+    """
+    The reconcile_stats function recounts the counters of all users from their contacts and repairs
+    the ones that drifted. Users are processed in id order, batch by batch; the users rows of a batch
+    are locked like next_change_seq does, so no contact of theirs changes while they are recounted.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of users per batch
+    :return: The number of users whose counters were repaired
+    :doc-author: Trelent
+    """
+    last_id, repaired = 0, 0
+    while True:
+        statement = select(User.id).filter(User.id > last_id).order_by(User.id).limit(batch_size).with_for_update()
+        user_ids = (await db.execute(statement)).scalars().all()
+        if not user_ids:
+            return repaired
+        actual, stored = defaultdict(Counter), defaultdict(dict)
+        rows = await db.execute(select(Contact.user_id, Contact.email, Contact.birthday)
+                                .filter(Contact.user_id.in_(user_ids), Contact.deleted_at.is_(None)))
+        for row in rows:
+            actual[row.user_id].update(stat_keys(row))
+        rows = await db.execute(select(ContactStat).filter(ContactStat.user_id.in_(user_ids), ContactStat.count != 0))
+        for stat in rows.scalars():
+            stored[stat.user_id][(stat.kind, stat.key)] = stat.count
+        stale = [user_id for user_id in user_ids if stored[user_id] != dict(actual[user_id])]
+        await db.execute(delete(ContactStat).where(ContactStat.user_id.in_(user_ids), ContactStat.count == 0))
+        if stale:
+            await db.execute(delete(ContactStat).where(ContactStat.user_id.in_(stale)))
+            db.add_all(ContactStat(user_id=user_id, kind=kind, key=key, count=count)
+                       for user_id in stale for (kind, key), count in actual[user_id].items())
+        await db.commit()
+        last_id, repaired = user_ids[-1], repaired + len(stale)
@@ -1,13 +1,23 @@
+from datetime import datetime
+from typing import Awaitable, Callable
+
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import select, inspect, bindparam, delete
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from libgravatar import Gravatar
 
 from src.database.db import get_db
-from src.entity.models import User
+from src.entity.models import Contact, ContactBlockingKey, ContactStat, User
 from src.schemas.user import UserSchema
+from src.services.cache import local_cache, invalidation_bus
+from src.services.singleflight import single_flight
+
+# Prebuilt with a bind parameter, executing it skips building the statement and computing its cache key
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
 
 
+@single_flight
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     """
     The get_user_by_email function takes an email address and returns the user associated with that email.
@@ -18,12 +28,38 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     :return: A single user object or none
     :doc-author: Trelent
     """
-    statement = select(User).filter_by(email=email)
-    user = await db.execute(statement)
+    user = await db.execute(USER_BY_EMAIL, {"email": email})
     user = user.scalar_one_or_none()
     return user
 
 
+async def get_cached_user_by_email(email: str, db: AsyncSession):
+    """
+    The get_cached_user_by_email function is get_user_by_email for the authentication of every request.
+    The user's columns are kept in the worker's local cache and merged into the session without a query,
+    the writes below evict them through the invalidation bus.
+    The cache is only used while the worker is subscribed to the bus.
+
+    :param email: str: Specify the email address of the user to retrieve
+    :param db: AsyncSession: Pass in the database session
+    :return: A single user object or none
+    :doc-author: Trelent
+    """
+    if not invalidation_bus.connected:
+        return await get_user_by_email(email, db)
+    values = local_cache.get("user", email)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.sync_session.merge(user, load=False)
+    generation = local_cache.generation
+    user = await get_user_by_email(email, db)
+    if user is not None:
+        values = {column.key: getattr(user, column.key) for column in inspect(User).column_attrs}
+        local_cache.set("user", email, values, generation)
+    return user
+
+
 async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
     """
     The create_user function creates a new user in the database.
@@ -58,7 +94,27 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     :doc-author: Trelent
     """
     user.refresh_token = token
+    email = user.email
     await db.commit()
+    await invalidation_bus.publish("user", email)
+
+
+async def mark_user_deleted(user: User, db: AsyncSession) -> None:
+    """
+    The mark_user_deleted function disables an account whose deletion has been accepted.
+    The refresh token is revoked and the account is marked as deleted, so the authentication refuses it
+    on every worker at once, the rows are removed later by delete_user.
+
+    :param user: User: The user to delete
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    user.refresh_token = None
+    user.deleted_at = datetime.utcnow()
+    email = user.email
+    await db.commit()
+    await invalidation_bus.publish("user", email)
 
 
 async def confirmed_email(email: str, db: AsyncSession) -> None:
@@ -75,6 +131,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
     await db.commit()
+    await invalidation_bus.publish("user", email)
 
 
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
@@ -90,5 +147,58 @@ async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> Us
     user = await get_user_by_email(email, db)
     user.avatar = url
     await db.commit()
+    await invalidation_bus.publish("user", email)
     await db.refresh(user)
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_user_by_id(user_id: int, db: AsyncSession) -> User | None:
+    """
+    The get_user_by_id function returns the user with the given id, the jobs only know the id of the user.
+
+    :param user_id: int: The id of the user
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A user object or None
+    :doc-author: Trelent
+    """
+    return await db.get(User, user_id)
+
+
+async def delete_user(user_id: int, db: AsyncSession, batch_size: int = 500,
+                      on_deleted: Callable[[int], Awaitable] | None = None) -> int:
+    """
+    The delete_user function deletes a user with all their contacts.
+    Contacts are removed batch by batch, each batch committed on its own. Every batch first locks
+    the users row, as next_change_seq does, so the last batch, which also removes the user,
+    cannot miss a contact created meanwhile. Calling it again for a deleted user does nothing.
+
+    :param user_id: int: The id of the user
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of contacts per batch
+    :param on_deleted: Callable[[int], Awaitable] | None: Called with the number of contacts deleted so far
+    :return: The number of contacts deleted
+    :doc-author: Trelent
+    """
+    deleted = 0
+    while True:
+        email = (await db.execute(select(User.email).where(User.id == user_id).with_for_update())).scalar()
+        if email is None:
+            await db.commit()
+            return deleted
+        statement = select(Contact.id).where(Contact.user_id == user_id).limit(batch_size)
+        ids = (await db.execute(statement)).scalars().all()
+        if ids:
+            await db.execute(delete(ContactBlockingKey).where(ContactBlockingKey.contact_id.in_(ids)))
+            await db.execute(delete(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids)))
+        last = len(ids) < batch_size
+        if last:
+            await db.execute(delete(ContactStat).where(ContactStat.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+        deleted += len(ids)
+        await invalidation_bus.publish("contacts", user_id)
+        if last:
+            await invalidation_bus.publish("user", email)
+            return deleted
+        if on_deleted is not None:
+            await on_deleted(deleted)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Security, BackgroundTasks, Request, Response
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Security, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,22 +7,20 @@ from src.database.db import get_db
 from src.repository import users as repositories_users
 from src.schemas.user import UserSchema, TokenSchema, UserResponse, RequestEmail
 from src.services.auth import auth_service
-from src.services.email import send_email
+from src.jobs.worker import enqueue
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 get_refresh_token = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserSchema, background_tasks: BackgroundTasks, request: Request,
-                 db: AsyncSession = Depends(get_db)):
+async def signup(body: UserSchema, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserSchema object as input, and returns the newly created user.
         If an account with that email already exists, it raises an HTTPException.
 
     :param body: UserSchema: Validate the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background queue
     :param request: Request: Get the base url of the request
     :param db: AsyncSession: Get the database session
     :return: A user object
@@ -33,7 +31,7 @@ async def signup(body: UserSchema, background_tasks: BackgroundTasks, request: R
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     body.password = auth_service.get_password_hash(body.password)
     new_user = await repositories_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    await enqueue("send_email", new_user.email, new_user.username, str(request.base_url))
     return new_user
 
 
@@ -50,7 +48,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     :doc-author: Trelent
     """
     user = await repositories_users.get_user_by_email(body.username, db)
-    if user is None:
+    if user is None or user.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
@@ -118,8 +116,7 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: AsyncSession = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that will allow them
     to confirm their email address. The function takes in a RequestEmail object, which contains the
@@ -128,7 +125,6 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     an email containing a confirmation link.
 
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the request
     :param db: AsyncSession: Get the database session
     :return: A message if the user is already confirmed or not
@@ -139,5 +135,5 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        await enqueue("send_email", user.email, user.username, str(request.base_url))
     return {"message": "Check your email for confirmation."}
\ No newline at end of file
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Path, Request, Response, status
+from fastapi.responses import FileResponse
+
+from src.services.avatars import avatar_store
+
+router = APIRouter(prefix="/avatars", tags=["avatars"])
+
+# The URL contains the hash of the content, so a response never changes and can be cached for a year
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{digest}/{size}", response_class=FileResponse)
+async def get_avatar(
+    request: Request,
+    digest: str = Path(pattern="^[0-9a-f]{64}$"),
+    size: int = Path(),
+):
+    """
+    The get_avatar function serves a thumbnail of an avatar stored with AVATAR_BACKEND=local.
+    It has no rate limit, as static files, and a client that already has the image gets 304 Not Modified.
+
+    :param request: Request: Read the If-None-Match header
+    :param digest: str: The SHA-256 of the uploaded image
+    :param size: int: One of the AVATAR_SIZES
+    :return: The image file
+    :doc-author: Trelent
+    """
+    etag = f'"{digest}-{size}"'
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+    # The content of a URL never changes, a client holding the ETag is answered without touching the disk
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    thumbnail = await avatar_store.thumbnail(digest, size)
+    if thumbnail is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    path, media_type = thumbnail
+    return FileResponse(path, media_type=media_type, headers=headers)
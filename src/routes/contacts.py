@@ -1,15 +1,28 @@
+from datetime import date
+
 from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
+from fastapi.responses import JSONResponse
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
+from src.jobs.worker import enqueue
 from src.entity.models import User
 from src.repository import contacts as repositories_contacts
-from src.schemas.contact import ContactSchema, ContactResponse
+from src.repository import duplicates as repositories_duplicates
+from src.repository import stats as repositories_stats
+from src.schemas.contact import ContactSchema, ContactResponse, ContactChangesResponse, ContactSuggestion, \
+    ContactSearchResult, ContactMergeSchema, DuplicateGroupResponse, ContactBriefResponse, ContactStatsResponse, \
+    ContactBatchGetSchema, ContactBatchGetResponse
+from src.schemas.job import JobResponse
 from src.services.auth import auth_service
+from src.services.fields import parse_fields, sparse_response, sparse_dump
+from src.services.phones import normalize_phone
 
 router = APIRouter(prefix='/contacts', tags=['Contacts'])
 
+FIELDS_DESCRIPTION = "Comma separated fields of the response to return, e.g. id,name,surname"
+
 
 @router.get("/", response_model=list[ContactResponse],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
@@ -18,6 +31,7 @@ async def get_contacts(name: str = Query(None, min_length=1, max_length=50),
                         email: str = Query(None, min_length=1, max_length=50),
                         limit: int = Query(10, ge=10, le=500),
                         offset: int = Query(0, ge=0),
+                        fields: str = Query(None, max_length=200, description=FIELDS_DESCRIPTION),
                         db: AsyncSession = Depends(get_db),
                         user: User = Depends(auth_service.get_current_user)):
     """
@@ -37,18 +51,22 @@ async def get_contacts(name: str = Query(None, min_length=1, max_length=50),
     :param le: Limit the number of contacts that can be returned
     :param offset: int: Specify the number of records to skip
     :param ge: Specify the minimum value for a parameter, and le is used to specify the maximum value
+    :param fields: str: Return only these fields of the contacts
     :param db: AsyncSession: Get the database connection
     :param user: User: Get the current user from the database
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repositories_contacts.get_contacts(name, surname, email, limit, offset, db, user)
-    return contacts
+    selected = parse_fields(fields, ContactResponse)
+    contacts = await repositories_contacts.get_contacts(name, surname, email, limit, offset, db, user, selected)
+    return sparse_response(contacts, ContactResponse, selected)
 
 
 @router.get("/birthdays", response_model=list[ContactResponse],
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def get_upcoming_birthdays(days_range: int = 7, db: AsyncSession = Depends(get_db),
+async def get_upcoming_birthdays(days_range: int = 7,
+                                 fields: str = Query(None, max_length=200, description=FIELDS_DESCRIPTION),
+                                 db: AsyncSession = Depends(get_db),
                                  user: User = Depends(auth_service.get_current_user)):
     """
     The get_upcoming_birthdays function returns a list of contacts with upcoming birthdays.
@@ -57,33 +75,222 @@ async def get_upcoming_birthdays(days_range: int = 7, db: AsyncSession = Depends
     the next week.
 
     :param days_range: int: Specify how many days in the future to look for birthdays
+    :param fields: str: Return only these fields of the contacts
     :param db: AsyncSession: Get the database session
     :param user: User: Get the current user, and the db: asyncsession parameter is used to get a database session
     :return: A list of contacts with upcoming birthdays
     :doc-author: Trelent
     """
-    contacts = await repositories_contacts.get_upcoming_birthdays(days_range, db, user)
+    selected = parse_fields(fields, ContactResponse)
+    contacts = await repositories_contacts.get_upcoming_birthdays(days_range, db, user, selected)
+    return sparse_response(contacts, ContactResponse, selected)
+
+
+@router.get("/changes", response_model=ContactChangesResponse,
+            dependencies=[Depends(RateLimiter(times=10, seconds=20))])
+async def get_changes(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                      db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_changes function returns the contacts changed since the given cursor.
+    Created and updated contacts are returned in full, deleted ones only by id.
+    The returned cursor should be passed as since on the next call, while has_more is true
+    the client should keep paging.
+
+    A cursor older than the purged tombstones gets 410 Gone, the client missed deletions and must sync from 0.
+
+    :param since: int: The cursor returned by the previous call, 0 for a full sync
+    :param limit: int: Limit the number of changes returned
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: A page of changes and the next cursor
+    :doc-author: Trelent
+    """
+    if since and since < await repositories_contacts.get_purged_seq(db, user):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired, sync again from 0")
+    contacts, has_more = await repositories_contacts.get_changes(since, limit, db, user)
+    return {
+        "upserted": [contact for contact in contacts if contact.deleted_at is None],
+        "deleted": [contact.id for contact in contacts if contact.deleted_at is not None],
+        "cursor": contacts[-1].seq if contacts else since,
+        "has_more": has_more,
+    }
+
+
+@router.get("/search", response_model=list[ContactSearchResult],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def search_contacts(q: str = Query(min_length=1, max_length=100),
+                          limit: int = Query(10, ge=10, le=500),
+                          offset: int = Query(0, ge=0),
+                          db: AsyncSession = Depends(get_db),
+                          user: User = Depends(auth_service.get_current_user)):
+    """
+    The search_contacts function searches the contacts by name, surname and email.
+    Misspelled words still match, the results are sorted by relevance and carry their score.
+    It is its own endpoint because its response adds the score to every contact, the list of
+    GET /api/contacts keeps its response and its name, surname and email filters.
+
+    :param q: str: The search query
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Specify the number of records to skip
+    :param db: AsyncSession: Get the database connection
+    :param user: User: Get the current user from the database
+    :return: A list of contacts with their score
+    :doc-author: Trelent
+    """
+    results = await repositories_contacts.search_contacts(q, limit, offset, db, user)
+    return [{**ContactResponse.model_validate(contact).model_dump(), "score": score} for contact, score in results]
+
+
+@router.get("/suggest", response_model=list[ContactSuggestion],
+            dependencies=[Depends(RateLimiter(times=10, seconds=1))])
+async def suggest_contacts(q: str = Query(min_length=1, max_length=50), limit: int = Query(10, ge=1, le=20),
+                           db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The suggest_contacts function is the type-ahead search of the contacts.
+    It returns the contacts whose name, surname, email or phone starts with q.
+    The rate limit allows a request per keystroke.
+
+    :param q: str: The prefix typed by the user
+    :param limit: int: Limit the number of suggestions
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: A list of suggestions
+    :doc-author: Trelent
+    """
+    contacts = await repositories_contacts.suggest_contacts(q, limit, db, user)
+    return contacts
+
+
+@router.get("/stats", response_model=ContactStatsResponse,
+            dependencies=[Depends(RateLimiter(times=10, seconds=20))])
+async def get_stats(domains: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db),
+                    user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_stats function returns the number of contacts, the birthdays this month and
+    the most common email domains. It reads the maintained counters instead of counting the contacts.
+
+    :param domains: int: Number of email domains returned
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: The contact statistics of the user
+    :doc-author: Trelent
+    """
+    return await repositories_stats.get_stats(db, user, date.today(), domains)
+
+
+@router.get("/duplicates", response_model=list[DuplicateGroupResponse],
+            dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def get_duplicates(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_duplicates function returns the groups of contacts that look like duplicates,
+    because they share the phone number, the email or a similarly sounding name and surname.
+
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: A list of groups of contacts with the reasons they were grouped
+    :doc-author: Trelent
+    """
+    groups = await repositories_duplicates.get_duplicates(db, user)
+    contact_ids = [contact_id for group in groups for contact_id in group["contact_ids"]]
+    contacts = {contact.id: contact
+                for contact in await repositories_contacts.get_contacts_by_ids(contact_ids, db, user)}
+    return [{"contacts": [contacts[contact_id] for contact_id in group["contact_ids"] if contact_id in contacts],
+             "reasons": group["reasons"]} for group in groups]
+
+
+@router.post("/merge", response_model=ContactResponse,
+             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+async def merge_contacts(body: ContactMergeSchema, db: AsyncSession = Depends(get_db),
+                         user: User = Depends(auth_service.get_current_user)):
+    """
+    The merge_contacts function merges duplicate contacts into the primary one.
+    The primary contact is kept unchanged and the duplicates are deleted, none of their fields are copied.
+    To keep a value of a duplicate, update the primary contact first.
+
+    :param body: ContactMergeSchema: The primary contact id and the ids of its duplicates
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: The primary contact
+    :doc-author: Trelent
+    """
+    contact = await repositories_contacts.merge_contacts(body.primary_id, body.duplicate_ids, db, user)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return contact
+
+
+@router.post("/batch-get", response_model=ContactBatchGetResponse,
+             dependencies=[Depends(RateLimiter(times=10, seconds=20))])
+async def batch_get_contacts(body: ContactBatchGetSchema,
+                             fields: str = Query(None, max_length=200, description=FIELDS_DESCRIPTION),
+                             db: AsyncSession = Depends(get_db),
+                             user: User = Depends(auth_service.get_current_user)):
+    """
+    The batch_get_contacts function returns the contacts with the given ids in one query.
+    The contacts follow the order of the ids, repeated ids are returned once; the ids of contacts
+    that do not exist, were deleted or belong to another user are reported as missing.
+
+    :param body: ContactBatchGetSchema: The ids of the contacts
+    :param fields: str: Return only these fields of the contacts
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: The contacts found and the missing ids
+    :doc-author: Trelent
+    """
+    ids = list(dict.fromkeys(body.ids))
+    selected = parse_fields(fields, ContactResponse)
+    contacts = {contact.id: contact
+                for contact in await repositories_contacts.get_contacts_by_ids(ids, db, user, selected)}
+    found = [contacts[contact_id] for contact_id in ids if contact_id in contacts]
+    missing = [contact_id for contact_id in ids if contact_id not in contacts]
+    if selected is not None:
+        return JSONResponse(content={"contacts": sparse_dump(found, ContactResponse, selected), "missing": missing})
+    return {"contacts": found, "missing": missing}
+
+
+@router.get("/by-phone/{number}", response_model=list[ContactBriefResponse],
+            dependencies=[Depends(RateLimiter(times=10, seconds=20))])
+async def get_contacts_by_phone(number: str = Path(min_length=7, max_length=64), db: AsyncSession = Depends(get_db),
+                                user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_contacts_by_phone function is the caller ID lookup: it returns the contacts with the given number.
+    The number has to be international, it may be written in any format.
+
+    :param number: str: The phone number
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: A list of contacts with their id, name and surname
+    :doc-author: Trelent
+    """
+    phone_e164 = normalize_phone(number)
+    if phone_e164 is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid phone number")
+    contacts = await repositories_contacts.get_contacts_by_phone(phone_e164, db, user)
     return contacts
 
 
 @router.get("/{contact_id}", response_model=ContactResponse,
             dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+async def get_contact(contact_id: int = Path(ge=1),
+                      fields: str = Query(None, max_length=200, description=FIELDS_DESCRIPTION),
+                      db: AsyncSession = Depends(get_db),
                       user: User = Depends(auth_service.get_current_user)):
     """
     The get_contact function is a GET request that returns the contact with the given ID.
     If no such contact exists, it will return a 404 NOT FOUND error.
 
     :param contact_id: int: Specify the id of the contact to be retrieved
+    :param fields: str: Return only these fields of the contact
     :param db: AsyncSession: Pass the database session to the repository
     :param user: User: Get the current user
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repositories_contacts.get_contact(contact_id, db, user)
+    selected = parse_fields(fields, ContactResponse)
+    contact = await repositories_contacts.get_contact(contact_id, db, user, selected)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
-    return contact
+    return sparse_response(contact, ContactResponse, selected)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
@@ -126,6 +333,22 @@ async def update_contact(body: ContactSchema, contact_id: int = Path(ge=1), db:
     return contact
 
 
+@router.delete("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED,
+               dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+async def delete_all_contacts(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The delete_all_contacts function deletes all contacts of the user in a background job and returns at once.
+    The contacts created after the request are kept.
+
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user from the auth_service
+    :return: The queued job
+    :doc-author: Trelent
+    """
+    up_to_id = await repositories_contacts.last_contact_id(db, user)
+    return await enqueue("delete_all_contacts", user.id, up_to_id)
+
+
 @router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(RateLimiter(times=1, seconds=20))])
 async def delete_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
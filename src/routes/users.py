@@ -5,18 +5,31 @@ from fastapi import (
     Depends,
     UploadFile,
     File,
+    Query,
+    HTTPException,
+    status,
+    Path,
 )
+from fastapi.responses import FileResponse
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.entity.models import User
+from src.jobs.queue import Job, job_queue, SUCCEEDED
+from src.jobs.worker import enqueue
+from src.schemas.job import JobResponse
 from src.schemas.user import UserResponse
 from src.services.auth import auth_service
+from src.services.avatars import avatar_store, verify_image
+from src.services.exports import export_path
+from src.services.fields import parse_fields, sparse_response
 from src.conf.config import config
 from src.repository import users as repositories_users
 
 router = APIRouter(prefix="/users", tags=["users"])
+# The jobs a user may poll, their first argument is the id of the user
+USER_JOBS = ("delete_all_contacts", "delete_account", "export_account")
 cloudinary.config(
     cloud_name=config.CLD_NAME,
     api_key=config.CLD_API_KEY,
@@ -30,17 +43,21 @@ cloudinary.config(
     response_model=UserResponse,
     dependencies=[Depends(RateLimiter(times=1, seconds=20))],
 )
-async def get_current_user(user: User = Depends(auth_service.get_current_user)):
+async def get_current_user(
+    fields: str = Query(None, max_length=200, description="Comma separated fields of the response to return"),
+    user: User = Depends(auth_service.get_current_user),
+):
     """
     The get_current_user function is a dependency that will be injected into the
     get_current_user endpoint. It uses the auth_service to retrieve the current user,
     and returns it if found.
 
+    :param fields: str: Return only these fields of the user
     :param user: User: Get the current user from the database
     :return: The user object
     :doc-author: Trelent
     """
-    return user
+    return sparse_response(user, UserResponse, parse_fields(fields, UserResponse))
 
 
 @router.patch(
@@ -63,6 +80,15 @@ async def get_current_user(
     :return: The current user,
     :doc-author: Trelent
     """
+    if config.AVATAR_BACKEND == "local":
+        data = await file.read(config.AVATAR_MAX_UPLOAD_BYTES + 1)
+        if len(data) > config.AVATAR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Avatar is too large")
+        if await verify_image(data) is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail="Avatar must be a PNG, JPEG, GIF or WebP image")
+        digest = await avatar_store.save(data)
+        return await repositories_users.update_avatar_url(user.email, avatar_store.url(digest), db)
     public_id = f"GoIT_FastAPI/{user.email}"
     res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
     print(res)
@@ -70,4 +96,108 @@ async def get_current_user(
         width=250, height=250, crop="fill", version=res.get("version")
     )
     user = await repositories_users.update_avatar_url(user.email, res_url, db)
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_user_job(job_id: str, user: User) -> Job:
+    """
+    The get_user_job function returns a job the user started, other users' jobs are reported as not found.
+
+    :param job_id: str: The id of the job
+    :param user: User: The current user
+    :return: The job
+    :doc-author: Trelent
+    """
+    job = await job_queue.get(job_id)
+    if job is None or job.name not in USER_JOBS or job.args[:1] != [user.id]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return job
+
+
+@router.delete(
+    "/me",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(RateLimiter(times=1, seconds=60))],
+)
+async def delete_current_user(
+    user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    The delete_current_user function deletes the account of the current user with all their contacts.
+    The account is disabled at once, its tokens are refused from now on, the deletion runs
+    in a background job whose progress is polled at /api/users/me/jobs/{job_id}.
+
+    :param user: User: Get the current user
+    :param db: AsyncSession: Get a database connection
+    :return: The queued job
+    :doc-author: Trelent
+    """
+    user_id = user.id
+    await repositories_users.mark_user_deleted(user, db)
+    return await enqueue("delete_account", user_id)
+
+
+@router.post(
+    "/me/export",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(RateLimiter(times=1, seconds=60))],
+)
+async def export_current_user(user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_current_user function exports the account and the contacts of the current user
+    to a ZIP archive in a background job. When the job succeeded the archive is downloaded
+    from /api/users/me/export/{job_id}.
+
+    :param user: User: Get the current user
+    :return: The queued job
+    :doc-author: Trelent
+    """
+    return await enqueue("export_account", user.id)
+
+
+@router.get(
+    "/me/jobs/{job_id}",
+    response_model=JobResponse,
+    dependencies=[Depends(RateLimiter(times=10, seconds=10))],
+)
+async def get_current_user_job(
+    job_id: str = Path(pattern="^[0-9a-f]{32}$"),
+    user: User = Depends(auth_service.get_current_account),
+):
+    """
+    The get_current_user_job function returns the status and the progress of a job of the current user.
+    It is also served while the account is being deleted, until the deletion job removes it.
+
+    :param job_id: str: The id returned when the job was queued
+    :param user: User: Get the current user
+    :return: The job
+    :doc-author: Trelent
+    """
+    return await get_user_job(job_id, user)
+
+
+@router.get(
+    "/me/export/{job_id}",
+    response_class=FileResponse,
+    dependencies=[Depends(RateLimiter(times=1, seconds=20))],
+)
+async def download_export(
+    job_id: str = Path(pattern="^[0-9a-f]{32}$"),
+    user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The download_export function returns the archive of a finished export of the current user.
+
+    :param job_id: str: The id of the export job
+    :param user: User: Get the current user
+    :return: The ZIP archive
+    :doc-author: Trelent
+    """
+    job = await get_user_job(job_id, user)
+    path = export_path(job.id)
+    if job.name != "export_account" or job.status != SUCCEEDED or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return FileResponse(path, media_type="application/zip", filename=f"contacts-export-{job.id}.zip")
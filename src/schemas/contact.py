@@ -1,14 +1,29 @@
 from datetime import date
 from pydantic import BaseModel, EmailStr, Field, PastDate, ConfigDict
+from pydantic_core import PydanticCustomError, core_schema
 from pydantic_extra_types.phone_numbers import PhoneNumber
 from src.schemas.user import UserResponse
+from src.services.phones import phone_formats
+
+
+class CachedPhoneNumber(PhoneNumber):
+    """
+    PhoneNumber validated through the cached phone_formats, stored in the RFC3966 format like PhoneNumber.
+    """
+
+    @classmethod
+    def _validate(cls, phone_number: str, _: core_schema.ValidationInfo) -> str:
+        formats = phone_formats(phone_number, cls.default_region_code)
+        if formats is None:
+            raise PydanticCustomError('value_error', 'value is not a valid phone number')
+        return formats[0]
 
 
 class ContactSchema(BaseModel):
     name: str = Field(min_length=3, max_length=50)
     surname: str = Field(min_length=3, max_length=50)
     email: EmailStr = Field(min_length=7, max_length=50)
-    phone: PhoneNumber
+    phone: CachedPhoneNumber
     birthday: date = Field(PastDate())
 
 
@@ -21,4 +36,58 @@ class ContactResponse(BaseModel):
     birthday: date
     user: UserResponse | None
 
-    model_config = ConfigDict(from_attributes=True)  # noqa
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)  # noqa
+
+
+class ContactBriefResponse(BaseModel):
+    id: int
+    name: str
+    surname: str
+
+    model_config = ConfigDict(from_attributes=True)  # noqa
+
+
+class ContactSearchResult(ContactResponse):
+    score: float
+
+
+class ContactMergeSchema(BaseModel):
+    primary_id: int = Field(ge=1)
+    duplicate_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class ContactBatchGetSchema(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=500)
+
+
+class ContactBatchGetResponse(BaseModel):
+    contacts: list[ContactResponse]
+    missing: list[int]
+
+
+class DuplicateGroupResponse(BaseModel):
+    contacts: list[ContactResponse]
+    reasons: list[str]
+
+
+class ContactChangesResponse(BaseModel):
+    upserted: list[ContactResponse]
+    deleted: list[int]
+    cursor: int
+    has_more: bool
+
+
+class ContactStatsResponse(BaseModel):
+    total: int
+    birthdays_this_month: int
+    domains: dict[str, int]
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    name: str
+    surname: str
+    email: str
+    phone: str
+
+    model_config = ConfigDict(from_attributes=True)  # noqa
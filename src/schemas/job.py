@@ -0,0 +1,13 @@
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
+
+
+class JobResponse(BaseModel):
+    id: str
+    name: str
+    status: str
+    progress: dict
+    result: Any = None
+    error: str | None = None
+    model_config = ConfigDict(from_attributes=True)  # noqa
@@ -43,6 +43,20 @@ class Auth:
         """
         return self.pwd_context.hash(password)
 
+    def warm_up(self):
+        """
+        The warm_up function loads the bcrypt backend and runs one JWT round trip,
+        so the first login after startup does not pay for the lazy initialization.
+        It is CPU bound and should be run in a thread.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.pwd_context.verify("warm-up", self.pwd_context.hash("warm-up"))
+        jwt.decode(jwt.encode({"sub": "warm-up"}, self.SECRET_KEY, algorithm=self.ALGORITHM), self.SECRET_KEY,
+                   algorithms=[self.ALGORITHM])
+
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -116,6 +130,27 @@ class Auth:
         The get_current_user function is a dependency that will be used in the
             protected endpoints. It takes a token as an argument and returns the user
             if it's valid, or raises an exception otherwise.
+            An account whose deletion has been accepted is refused at once.
+
+        :param self: Refer to the class itself
+        :param token: str: Get the token from the request header
+        :param db: AsyncSession: Get the database session from the dependency injection
+        :return: The user object
+        :doc-author: Trelent
+        """
+        user = await self.get_current_account(token, db)
+        if user.deleted_at is not None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return user
+
+    async def get_current_account(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        The get_current_account function is get_current_user that also accepts an account being deleted,
+        so its owner can follow the deletion job until the account is gone.
 
         :param self: Refer to the class itself
         :param token: str: Get the token from the request header
@@ -141,7 +176,7 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = await repository_users.get_user_by_email(email, db)
+        user = await repository_users.get_cached_user_by_email(email, db)
         if user is None:
             raise credentials_exception
         return user
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.conf.config import config
+
+IMAGE_TYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# The thumbnails are stored with the suffix of their format, so they are served without reading them
+THUMBNAIL_TYPES = {".jpg": "image/jpeg", ".png": "image/png"}
+
+# What Pillow raises for a file that is not a valid image, a truncated one or a decompression bomb
+DECODE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError)
+
+
+def image_type(head: bytes) -> str | None:
+    """
+    The image_type function recognizes an image by its first bytes, the name and the content type
+    sent by the client are not trusted.
+
+    :param head: bytes: At least the first 12 bytes of the file
+    :return: The media type or None if it is not a supported image
+    :doc-author: Trelent
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, media_type in IMAGE_TYPES:
+        if head.startswith(magic):
+            return media_type
+    return None
+
+
+def _verify(data: bytes) -> str | None:
+    """
+    The _verify function checks that the data is a whole image of the type its first bytes announce,
+    so an upload with a valid header and a broken body is refused instead of failing at every rendering.
+
+    :param data: bytes: The uploaded file
+    :return: The media type or None if it is not a valid supported image
+    :doc-author: Trelent
+    """
+    media_type = image_type(data[:12])
+    if media_type is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if Image.MIME.get(image.format) != media_type:
+                return None
+            image.verify()
+    except DECODE_ERRORS:
+        return None
+    return media_type
+
+
+async def verify_image(data: bytes) -> str | None:
+    """
+    The verify_image function checks an uploaded avatar in a thread, Pillow parses the whole file.
+
+    :param data: bytes: The uploaded file
+    :return: The media type or None if it is not a valid PNG, JPEG, GIF or WebP image
+    :doc-author: Trelent
+    """
+    return await asyncio.to_thread(_verify, data)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """
+    The _write_atomic function writes the file under a temporary name and renames it,
+    so a concurrent reader never sees a partially written file.
+
+    :param path: Path: The final path of the file
+    :param data: bytes: The content
+    :return: None
+    :doc-author: Trelent
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _render(original: Path, size: int) -> tuple[bytes, str] | None:
+    """
+    The _render function crops the center of the original to a square and scales it down to size,
+    as the crop="fill" transformation of Cloudinary did. Transparent images stay PNG, the rest become JPEG.
+
+    :param original: Path: The uploaded image
+    :param size: int: The width and the height of the thumbnail
+    :return: The encoded thumbnail and its suffix, or None if the original cannot be decoded
+    :doc-author: Trelent
+    """
+    try:
+        with Image.open(original) as image:
+            image = ImageOps.exif_transpose(image)
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    except DECODE_ERRORS:
+        return None
+    buffer = io.BytesIO()
+    if thumbnail.mode in ("RGBA", "LA", "P"):
+        thumbnail.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), ".png"
+    thumbnail.convert("RGB").save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue(), ".jpg"
+
+
+class AvatarStore:
+    """
+    Stores the uploaded avatars on the local disk under the SHA-256 of their content, so the same image
+    is stored once and its URL never changes meaning. Thumbnails are generated on the first request
+    and kept within a disk quota, the least recently used ones are removed first.
+    """
+
+    def __init__(self, root: Path, sizes: tuple[int, ...], quota_bytes: int, url_prefix: str = "/api/avatars"):
+        self.root = Path(root)
+        self.sizes = tuple(sorted(sizes))
+        self.quota_bytes = quota_bytes
+        self.url_prefix = url_prefix.rstrip("/")
+        self._usage: int | None = None
+        self._rendering: dict[tuple[str, int], asyncio.Future] = {}
+        self._evicting = asyncio.Lock()
+
+    def original_path(self, digest: str) -> Path:
+        return self.root / "originals" / digest[:2] / digest
+
+    def thumbnail_path(self, digest: str, size: int, suffix: str) -> Path:
+        return self.root / "thumbnails" / str(size) / digest[:2] / f"{digest}{suffix}"
+
+    def url(self, digest: str, size: int | None = None) -> str:
+        """
+        The url function returns the address of a thumbnail, by default of the largest size.
+
+        :param digest: str: The SHA-256 of the original
+        :param size: int | None: The size of the thumbnail
+        :return: The URL path of the thumbnail
+        :doc-author: Trelent
+        """
+        return f"{self.url_prefix}/{digest}/{size or self.sizes[-1]}"
+
+    async def save(self, data: bytes) -> str:
+        """
+        The save function stores an uploaded image. An image that is already stored is not written again.
+
+        :param data: bytes: The content of the image
+        :return: The SHA-256 of the content
+        :doc-author: Trelent
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.original_path(digest)
+        if not path.exists():
+            await asyncio.to_thread(_write_atomic, path, data)
+        return digest
+
+    async def thumbnail(self, digest: str, size: int) -> tuple[Path, str] | None:
+        """
+        The thumbnail function returns the thumbnail of the given size, rendering it in a thread on the first request.
+        Concurrent requests of the same missing thumbnail wait for a single rendering.
+
+        :param digest: str: The SHA-256 of the original
+        :param size: int: One of the configured sizes
+        :return: The path and the media type of the file to send or None if there is no such image or size
+        :doc-author: Trelent
+        """
+        if size not in self.sizes:
+            return None
+        for suffix, media_type in THUMBNAIL_TYPES.items():
+            path = self.thumbnail_path(digest, size, suffix)
+            try:
+                # The modification time orders the thumbnails for the eviction
+                os.utime(path)
+                return path, media_type
+            except FileNotFoundError:
+                pass
+        original = self.original_path(digest)
+        if not original.exists():
+            return None
+        key = (digest, size)
+        rendering = self._rendering.get(key)
+        if rendering is None:
+            rendering = asyncio.ensure_future(self._render(original, digest, size))
+            self._rendering[key] = rendering
+            rendering.add_done_callback(lambda _: self._rendering.pop(key, None))
+        suffix = await asyncio.shield(rendering)
+        if suffix is None:
+            return None
+        return self.thumbnail_path(digest, size, suffix), THUMBNAIL_TYPES[suffix]
+
+    async def _render(self, original: Path, digest: str, size: int) -> str | None:
+        rendered = await asyncio.to_thread(_render, original, size)
+        if rendered is None:
+            return None
+        data, suffix = rendered
+        await asyncio.to_thread(_write_atomic, self.thumbnail_path(digest, size, suffix), data)
+        if self._usage is None:
+            self._usage = await asyncio.to_thread(self._scan_usage)
+        else:
+            self._usage += len(data)
+        if self._usage > self.quota_bytes and not self._evicting.locked():
+            async with self._evicting:
+                self._usage = await asyncio.to_thread(self._evict)
+        return suffix
+
+    def _scan_usage(self) -> int:
+        return sum(path.stat().st_size for path in (self.root / "thumbnails").rglob("*") if path.is_file())
+
+    def _evict(self) -> int:
+        """
+        The _evict function removes the least recently used thumbnails until they take 90% of the quota,
+        so the next few renderings do not trigger another scan. The originals are never removed.
+
+        :return: The disk usage of the remaining thumbnails
+        :doc-author: Trelent
+        """
+        files = []
+        for path in (self.root / "thumbnails").rglob("*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                files.append((stat.st_mtime, stat.st_size, path))
+        usage = sum(size for _, size, _ in files)
+        target = self.quota_bytes * 0.9
+        for _, size, path in sorted(files):
+            if usage <= target:
+                break
+            path.unlink(missing_ok=True)
+            usage -= size
+        return usage
+
+
+avatar_store = AvatarStore(
+    root=Path(config.AVATAR_DIR),
+    sizes=tuple(int(size) for size in config.AVATAR_SIZES.split(",")),
+    quota_bytes=config.AVATAR_CACHE_QUOTA_MB * 1024 * 1024,
+)
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+
+import redis.asyncio as redis
+
+ALL = "*"
+
+
+class LocalCache:
+    """
+    The LocalCache keeps hot data in the memory of one worker process.
+    Entries are addressed by a namespace and a key, the least recently used ones are dropped
+    above maxsize and every entry expires after ttl seconds, which bounds the staleness
+    if an invalidation event is ever lost.
+    The generation changes on every eviction: a value loaded before an eviction is not stored,
+    it may be the old one.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, namespace: str, key: Any) -> Any:
+        entry = self._entries.get((namespace, str(key)))
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[(namespace, str(key))]
+            return None
+        self._entries.move_to_end((namespace, str(key)))
+        return value
+
+    def set(self, namespace: str, key: Any, value: Any, generation: int | None = None):
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[(namespace, str(key))] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end((namespace, str(key)))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def evict(self, namespace: str, key: Any):
+        self.generation += 1
+        if key == ALL:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == namespace]:
+                del self._entries[entry_key]
+        else:
+            self._entries.pop((namespace, str(key)), None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+
+class InvalidationBus:
+    """
+    The InvalidationBus keeps the local caches of all workers consistent.
+    A write publishes a compact namespace:key event on a Redis channel, every worker is subscribed
+    and evicts the entry from its LocalCache. Events published while a worker is disconnected are lost,
+    so the worker flushes its whole cache when the subscription is lost and bypasses it until it is back.
+    """
+
+    CHANNEL = "cache:invalidate"
+
+    def __init__(self, cache: LocalCache, channel: str = CHANNEL, reconnect_delay: float = 1):
+        self.cache = cache
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.client: redis.Redis | None = None
+        self.connected = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self, client: redis.Redis):
+        """
+        The start function subscribes to the invalidation channel in a background task.
+
+        :param self: Represent the instance of the class
+        :param client: redis.Redis: The shared Redis client
+        :return: None
+        :doc-author: Trelent
+        """
+        self.client = client
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task, self.client, self.connected = None, None, False
+        self.cache.clear()
+
+    async def publish(self, namespace: str, key: Any = ALL):
+        """
+        The publish function evicts an entry locally and tells the other workers to evict it.
+        It is called after the write is committed, otherwise a worker could reload the old value.
+
+        :param self: Represent the instance of the class
+        :param namespace: str: The cache namespace, e.g. user
+        :param key: Any: The key in the namespace, ALL evicts the whole namespace
+        :return: None
+        :doc-author: Trelent
+        """
+        self.cache.evict(namespace, key)
+        if self.client is None:
+            return
+        try:
+            await self.client.publish(self.channel, f"{namespace}:{key}")
+        except Exception as err:
+            print(f"Cannot publish the invalidation of {namespace}:{key}: {err!r}")
+
+    def apply(self, message: bytes | str):
+        """
+        The apply function evicts the entry named by an invalidation event.
+
+        :param self: Represent the instance of the class
+        :param message: bytes | str: The namespace:key event
+        :return: None
+        :doc-author: Trelent
+        """
+        if isinstance(message, bytes):
+            message = message.decode()
+        namespace, _, key = message.partition(":")
+        self.cache.evict(namespace, key)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.apply(message["data"])
+                        elif message["type"] == "subscribe":
+                            # The client resubscribes on its own after a reconnect, events may have been missed
+                            self.cache.clear()
+                            self.connected = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                print(f"Cache invalidation subscription lost: {err!r}")
+            self.connected = False
+            self.cache.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+local_cache = LocalCache()
+invalidation_bus = InvalidationBus(local_cache)
@@ -0,0 +1,91 @@
+from src.entity.models import Contact
+from src.services.phones import normalize_phone
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def soundex(word: str) -> str:
+    """
+    The soundex function returns the American Soundex code of a word, e.g. Robert and Rupert give R163.
+    Letters outside the latin alphabet are ignored.
+
+    :param word: str: The word to encode
+    :return: A four characters code or an empty string if the word has no latin letters
+    :doc-author: Trelent
+    """
+    letters = [char for char in word.lower() if "a" <= char <= "z"]
+    if not letters:
+        return ""
+    result = [letters[0].upper()]
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for char in letters[1:]:
+        code = _SOUNDEX_CODES.get(char, "")
+        if code and code != previous:
+            result.append(code)
+        if char not in "hw":
+            previous = code
+    return ("".join(result) + "000")[:4]
+
+
+def blocking_keys(contact: Contact) -> dict[str, str]:
+    """
+    The blocking_keys function computes the keys two duplicate contacts are likely to share:
+    the E.164 phone number, the lower-cased email and the Soundex codes of name and surname.
+    Only contacts sharing a key are compared, which keeps the detection near-linear.
+
+    :param contact: Contact: The contact
+    :return: A dictionary of key kind to key value
+    :doc-author: Trelent
+    """
+    keys = {}
+    phone = normalize_phone(contact.phone) if contact.phone else None
+    if phone:
+        keys["phone"] = phone
+    if contact.email:
+        keys["email"] = contact.email.strip().lower()
+    name, surname = soundex(contact.name or ""), soundex(contact.surname or "")
+    if name and surname:
+        keys["name"] = name + surname
+    return keys
+
+
+def group_duplicates(rows: list[tuple[int, str, str]]) -> list[dict]:
+    """
+    The group_duplicates function joins the contacts sharing a blocking key into groups.
+    Contacts are linked transitively: if A shares the phone with B and B the email with C,
+    all three end up in one group (union-find).
+
+    :param rows: list[tuple[int, str, str]]: (contact_id, kind, key) rows of shared keys
+    :return: A list of groups with the sorted contact ids and the kinds of keys they share
+    :doc-author: Trelent
+    """
+    parent: dict[int, int] = {}
+
+    def find(contact_id: int) -> int:
+        parent.setdefault(contact_id, contact_id)
+        while parent[contact_id] != contact_id:
+            parent[contact_id] = parent[parent[contact_id]]
+            contact_id = parent[contact_id]
+        return contact_id
+
+    first_by_key: dict[tuple[str, str], int] = {}
+    for contact_id, kind, key in rows:
+        find(contact_id)
+        first = first_by_key.setdefault((kind, key), contact_id)
+        parent[find(contact_id)] = find(first)
+
+    groups: dict[int, dict] = {}
+    for contact_id, kind, key in rows:
+        group = groups.setdefault(find(contact_id), {"contact_ids": set(), "reasons": set()})
+        group["contact_ids"].add(contact_id)
+        group["reasons"].add(kind)
+    return sorted(({"contact_ids": sorted(group["contact_ids"]), "reasons": sorted(group["reasons"])}
+                   for group in groups.values() if len(group["contact_ids"]) > 1),
+                  key=lambda group: group["contact_ids"][0])
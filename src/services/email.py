@@ -1,12 +1,19 @@
-from pathlib import Path
+import logging
+from datetime import date
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Awaitable, Callable
 
+import aiosmtplib
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
+from src.services.mail_templates import TEMPLATE_FOLDER, render, render_many
 from src.conf.config import config
 
+logger = logging.getLogger(__name__)
+
 conf = ConnectionConfig(
     MAIL_USERNAME=config.MAIL_USERNAME,
     MAIL_PASSWORD=config.MAIL_PASSWORD,
@@ -18,9 +25,13 @@ conf = ConnectionConfig(
     MAIL_SSL_TLS=True,
     USE_CREDENTIALS=True,
     VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    TEMPLATE_FOLDER=TEMPLATE_FOLDER,
 )
 
+# One client per process. Given a template_name, FastMail builds a new Environment and compiles the template
+# on every send_message, so the bodies are rendered with the shared environment of mail_templates instead
+mailer = FastMail(conf)
+
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
@@ -38,16 +49,109 @@ async def send_email(email: EmailStr, username: str, host: str):
     :return: A coroutine object
     :doc-author: Trelent
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    message = MessageSchema(
+        subject="Confirm your email ",
+        recipients=[email],
+        body=render("verify_email.html", host=host, username=username, token=token_verification),
+        subtype=MessageType.html
+    )
+
+    await mailer.send_message(message)
+
+
+def _birthday_in(birthday: date, year: int) -> date:
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fastmail = FastMail(conf)
-        await fastmail.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+        return birthday.replace(year=year)
+    except ValueError:  # February 29 outside a leap year
+        return date(year, 3, 1)
+
+
+def _days_until(birthday: date, today: date) -> int:
+    upcoming = _birthday_in(birthday, today.year)
+    if upcoming < today:
+        upcoming = _birthday_in(birthday, today.year + 1)
+    return (upcoming - today).days
+
+
+def birthday_digest_message(email: str, username: str, birthdays: list[dict], today: date) -> MessageSchema:
+    """
+    The birthday_digest_message function renders the birthday digest of a user.
+
+    :param email: str: The user's email address
+    :param username: str: Pass the username to the template
+    :param birthdays: list[dict]: Contacts with name, surname and the ISO birthday
+    :param today: date: The day the digest is sent
+    :return: A message ready to be sent
+    :doc-author: Trelent
+    """
+    return birthday_digest_messages([{"email": email, "username": username, "birthdays": birthdays}], today)[0]
+
+
+def birthday_digest_messages(digests: list[dict], today: date) -> list[MessageSchema]:
+    """
+    The birthday_digest_messages function renders the birthday digests of a batch of users.
+
+    :param digests: list[dict]: Digests with email, username and the birthdays as in birthday_digest_message
+    :param today: date: The day the digests are sent
+    :return: The messages ready to be sent, in the order of the digests
+    :doc-author: Trelent
+    """
+    contexts = []
+    for digest in digests:
+        upcoming = sorted(({**contact, "days": _days_until(date.fromisoformat(contact["birthday"]), today)}
+                           for contact in digest["birthdays"]),
+                          key=lambda contact: (contact["days"], contact["surname"]))
+        contexts.append({"username": digest["username"], "birthdays": upcoming})
+    bodies = render_many("birthday_digest.html", contexts)
+    return [MessageSchema(subject="Upcoming birthdays", recipients=[digest["email"]], body=body,
+                          subtype=MessageType.html) for digest, body in zip(digests, bodies)]
+
+
+def mime_message(message: MessageSchema, sender: str) -> EmailMessage:
+    """
+    The mime_message function builds the email of a message with the standard library,
+    the batches are sent with aiosmtplib directly and not through FastMail.
+
+    :param message: MessageSchema: The subject, the recipients and the body of the message
+    :param sender: str: The From header
+    :return: The email ready to be sent
+    :doc-author: Trelent
+    """
+    mail = EmailMessage()
+    mail["From"] = sender
+    mail["To"] = ", ".join(str(recipient) for recipient in message.recipients)
+    mail["Subject"] = message.subject
+    mail["Date"] = formatdate(localtime=True)
+    mail["Message-ID"] = make_msgid()
+    mail.set_content(message.body, subtype="html" if message.subtype == MessageType.html else "plain")
+    return mail
+
+
+async def send_messages(messages: list[MessageSchema], on_sent: Callable[[int], Awaitable] | None = None) -> int:
+    """
+    The send_messages function sends a batch of messages over a single SMTP connection.
+    A refused recipient is skipped, a connection failure is raised so the batch can be retried.
+
+    :param messages: list[MessageSchema]: The messages to send
+    :param on_sent: Callable[[int], Awaitable] | None: Called with the number of messages handled so far
+    :return: The number of messages sent
+    :doc-author: Trelent
+    """
+    sender = f"{conf.MAIL_FROM_NAME} <{conf.MAIL_FROM}>"
+    credentials = {"username": conf.MAIL_USERNAME, "password": conf.MAIL_PASSWORD} if conf.USE_CREDENTIALS else {}
+    sent = 0
+    async with aiosmtplib.SMTP(hostname=conf.MAIL_SERVER, port=conf.MAIL_PORT, use_tls=conf.MAIL_SSL_TLS,
+                               start_tls=conf.MAIL_STARTTLS, validate_certs=conf.VALIDATE_CERTS,
+                               timeout=conf.TIMEOUT, **credentials) as connection:
+        for handled, message in enumerate(messages, start=1):
+            try:
+                if not conf.SUPPRESS_SEND:
+                    await connection.send_message(mime_message(message, sender))
+                sent += 1
+            except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused) as err:
+                recipients = ", ".join(str(recipient) for recipient in message.recipients)
+                logger.warning("Message %r to %s refused: %r", message.subject, recipients, err)
+            if on_sent is not None:
+                await on_sent(handled)
+    return sent
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.conf.config import config
+
+# The columns of a ContactRow written to the archive
+CONTACT_FIELDS = ("id", "name", "surname", "email", "phone", "birthday")
+
+
+def export_path(job_id: str) -> Path:
+    """
+    The export_path function returns where the archive of an export job is stored.
+    The web workers read it from the same directory the job workers write it to.
+
+    :param job_id: str: The id of the export job
+    :return: The path of the archive
+    :doc-author: Trelent
+    """
+    return Path(config.EXPORTS_DIR) / f"{job_id}.zip"
+
+
+async def write_export(path: Path, account: dict, batches: AsyncIterator[list],
+                       on_written: Callable[[int], Awaitable] | None = None) -> int:
+    """
+    The write_export function writes the account and its contacts to a ZIP archive.
+    The contacts are stored as JSON Lines, every batch is compressed in a thread while the next one is read,
+    so the archive never has to fit in memory and the event loop is not blocked.
+    The archive is written under a temporary name and renamed when complete.
+
+    :param path: Path: The path of the archive
+    :param account: dict: The user's own data, stored as account.json
+    :param batches: AsyncIterator[list]: Batches of ContactRow, stored as contacts.jsonl
+    :param on_written: Callable[[int], Awaitable] | None: Called with the number of contacts written so far
+    :return: The number of contacts written
+    :doc-author: Trelent
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".zip")
+    os.close(fd)
+    written = 0
+    try:
+        with zipfile.ZipFile(temporary, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("account.json", json.dumps(account, default=str, indent=2))
+            with archive.open("contacts.jsonl", "w", force_zip64=True) as stream:
+                async for rows in batches:
+                    lines = "".join(json.dumps({field: getattr(row, field) for field in CONTACT_FIELDS}, default=str)
+                                    + "\n" for row in rows)
+                    await asyncio.to_thread(stream.write, lines.encode())
+                    written += len(rows)
+                    if on_written is not None:
+                        await on_written(written)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return written
+
+
+def remove_expired_exports(max_age: float, now: float) -> int:
+    """
+    The remove_expired_exports function removes the archives older than max_age seconds.
+
+    :param max_age: float: The age in seconds after which an archive is removed
+    :param now: float: The current time as a timestamp
+    :return: The number of archives removed
+    :doc-author: Trelent
+    """
+    removed = 0
+    directory = Path(config.EXPORTS_DIR)
+    if not directory.is_dir():
+        return 0
+    for path in directory.glob("*.zip"):
+        if path.stat().st_mtime < now - max_age:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
@@ -0,0 +1,73 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, create_model
+
+
+def parse_fields(fields: str | None, model: type[BaseModel]) -> frozenset[str] | None:
+    """
+    The parse_fields function reads the fields= query parameter, a comma separated list of
+    the fields of the response model the client needs. The id is always returned.
+
+    :param fields: str | None: The query parameter, None returns every field
+    :param model: type[BaseModel]: The full response model
+    :return: The selected fields or None for all of them
+    :doc-author: Trelent
+    """
+    if fields is None:
+        return None
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = selected - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return frozenset(selected | ({"id"} & set(model.model_fields)))
+
+
+@lru_cache(maxsize=None)
+def sparse_model(model: type[BaseModel], fields: frozenset[str]) -> type[BaseModel]:
+    """
+    The sparse_model function derives a response model with only the selected fields of model.
+    It reads only those attributes, so the columns the repository did not load are never touched.
+
+    :param model: type[BaseModel]: The full response model
+    :param fields: frozenset[str]: The selected fields
+    :return: The narrowed model, created once for every combination of fields
+    :doc-author: Trelent
+    """
+    definitions = {name: (info.annotation, info) for name, info in model.model_fields.items() if name in fields}
+    return create_model(f"Sparse{model.__name__}", __config__=ConfigDict(from_attributes=True), **definitions)
+
+
+def sparse_dump(content: Any, model: type[BaseModel], fields: frozenset[str]) -> Any:
+    """
+    The sparse_dump function converts an object or a list of objects to JSON data with the selected fields only.
+
+    :param content: Any: An object or a list of objects of the route
+    :param model: type[BaseModel]: The full response model
+    :param fields: frozenset[str]: The selected fields
+    :return: A dictionary or a list of dictionaries
+    :doc-author: Trelent
+    """
+    sparse = sparse_model(model, fields)
+    if isinstance(content, list):
+        return [sparse.model_validate(item).model_dump(mode="json") for item in content]
+    return sparse.model_validate(content).model_dump(mode="json")
+
+
+def sparse_response(content: Any, model: type[BaseModel], fields: frozenset[str] | None) -> Any:
+    """
+    The sparse_response function returns the content with the selected fields only.
+    Without fields= the content is returned as is and the route's response_model serializes it.
+
+    :param content: Any: An object or a list of objects of the route
+    :param model: type[BaseModel]: The full response model
+    :param fields: frozenset[str] | None: The selected fields
+    :return: The content or a JSONResponse with the narrowed objects
+    :doc-author: Trelent
+    """
+    if fields is None:
+        return content
+    return JSONResponse(content=sparse_dump(content, model, fields))
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+
+
+class HealthMonitor:
+    def __init__(self, interval: float, timeout: float, max_pool_saturation: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.max_pool_saturation = max_pool_saturation
+        self._checks: dict[str, tuple[Callable[[], Awaitable], bool, float | None]] = {}
+        self._due: dict[str, float] = {}
+        self.results: dict[str, dict] = {}
+        self.checked_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def register(self, name: str, check: Callable[[], Awaitable], critical: bool = True,
+                 interval: float | None = None):
+        """
+        The register function adds a dependency check.
+        A failing critical check makes the application not ready, a failing non critical check
+        is only reported. A check with its own interval runs less often than the others,
+        e.g. one that costs the dependency a connection.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the dependency in the report
+        :param check: Callable[[], Awaitable]: Coroutine function raising an exception when the dependency is down
+        :param critical: bool: Whether the application can serve requests without the dependency
+        :param interval: float | None: Seconds between two runs of the check, the monitor's interval by default
+        :return: None
+        :doc-author: Trelent
+        """
+        self._checks[name] = (check, critical, interval)
+
+    async def _run_check(self, name: str, check: Callable[[], Awaitable], critical: bool):
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(check(), self.timeout)
+            result = {"ok": True}
+            if isinstance(details, dict):
+                result.update(details)
+        except Exception as err:
+            result = {"ok": False, "error": repr(err)}
+        result["critical"] = critical
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.results[name] = result
+
+    async def run_checks(self):
+        """
+        The run_checks function runs the registered checks concurrently and caches their results.
+        A check registered with its own interval is skipped until that interval has elapsed.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        now = time.monotonic()
+        due = []
+        for name, (check, critical, interval) in self._checks.items():
+            if interval is not None:
+                if self._due.get(name, 0) > now:
+                    continue
+                self._due[name] = now + interval
+            due.append((name, check, critical))
+        await asyncio.gather(*(self._run_check(name, check, critical) for name, check, critical in due))
+        self.checked_at = time.time()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_checks()
+
+    async def start(self):
+        await self.run_checks()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def is_healthy(self, name: str) -> bool:
+        return self.results.get(name, {}).get("ok", False)
+
+    def readiness(self, warmed_up: bool) -> tuple[bool, dict]:
+        """
+        The readiness function builds the readiness report from the cached check results
+        and the current pool counters, without any I/O.
+
+        :param self: Represent the instance of the class
+        :param warmed_up: bool: Whether the startup warm-up has finished
+        :return: A tuple of the readiness flag and the report
+        :doc-author: Trelent
+        """
+        pool = sessionmanager.pool_status()
+        pool["saturated"] = pool["saturation"] >= self.max_pool_saturation
+        checks_ok = self.checked_at is not None and all(
+            result["ok"] for result in self.results.values() if result["critical"])
+        ready = warmed_up and checks_ok and not pool["saturated"]
+        return ready, {"ready": ready, "checked_at": self.checked_at, "checks": self.results, "pool": pool}
+
+
+async def check_smtp():
+    """
+    The check_smtp function checks that the mail server accepts TCP connections.
+    Every run opens a connection to the server, it is registered with HEALTH_CHECK_SMTP_INTERVAL.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    _, writer = await asyncio.open_connection(config.MAIL_SERVER, config.MAIL_PORT)
+    writer.close()
+    await writer.wait_closed()
+
+
+health_monitor = HealthMonitor(config.HEALTH_CHECK_INTERVAL, config.HEALTH_CHECK_TIMEOUT,
+                               config.READINESS_POOL_SATURATION)
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+
+import redis.asyncio as redis
+from fastapi import FastAPI
+from fastapi_limiter import FastAPILimiter
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.jobs import tasks  # noqa: F401 registers the jobs for the embedded worker
+from src.jobs.queue import job_queue
+from src.jobs.worker import Worker
+from src.services.auth import auth_service
+from src.services.cache import invalidation_bus
+from src.services.health import health_monitor, check_smtp
+from src.services.mail_templates import precompile
+
+
+class Lifecycle:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+
+    def start_draining(self):
+        """
+        The start_draining function is called when the worker receives SIGTERM or SIGINT, before uvicorn
+        stops accepting connections and waits for the in-flight requests. From then on the readiness probe
+        fails and a new request on a kept-alive connection gets 503, so the load balancer moves the traffic away.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.ready = False
+        self.draining = True
+
+
+lifecycle = Lifecycle()
+
+
+async def warm_up(redis_client: redis.Redis):
+    """
+    The warm_up function opens the database and Redis pool connections and preloads the
+    JWT and bcrypt contexts before the application reports itself ready.
+    A failing step is reported but does not stop the startup, the readiness checks cover it.
+
+    :param redis_client: redis.Redis: The shared Redis client
+    :return: None
+    :doc-author: Trelent
+    """
+    steps = {
+        "database": sessionmanager.warm_up(config.DB_POOL_WARMUP),
+        "redis": asyncio.gather(*(redis_client.ping() for _ in range(config.REDIS_POOL_WARMUP))),
+        "auth": asyncio.to_thread(auth_service.warm_up),
+    }
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    for name, result in zip(steps, results):
+        if isinstance(result, Exception):
+            print(f"Warm-up of {name} failed: {result!r}")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function manages the application resources.
+    On startup it creates the Redis client, initializes the rate limiter, warms up the pools, compiles the email templates,
+    subscribes to the cache invalidation bus and starts the background health checks, only then the application is marked as ready.
+    With the in-memory jobs backend the jobs run in an embedded worker, there is no separate worker process.
+    On shutdown it closes the Redis client, the job queue and the database engine. It runs once uvicorn has
+    waited for the in-flight requests, up to its timeout_graceful_shutdown.
+
+    :param app: FastAPI: The application
+    :return: An async context manager
+    :doc-author: Trelent
+    """
+    redis_client = await redis.Redis(
+        host=config.REDIS_DOMAIN,
+        port=config.REDIS_PORT,
+        db=0,
+        password=config.REDIS_PASSWORD,
+    )
+    app.state.redis = redis_client
+    await FastAPILimiter.init(redis_client)
+    await warm_up(redis_client)
+    precompile()
+    await invalidation_bus.start(redis_client)
+    health_monitor.register("database", sessionmanager.ping)
+    health_monitor.register("redis", redis_client.ping)
+    health_monitor.register("email", check_smtp, critical=False, interval=config.HEALTH_CHECK_SMTP_INTERVAL)
+    health_monitor.register("jobs", job_queue.stats, critical=False)
+    await health_monitor.start()
+    embedded_worker, embedded_task = None, None
+    if config.JOBS_BACKEND == "memory":
+        embedded_worker = Worker(job_queue, concurrency=config.JOBS_CONCURRENCY)
+        embedded_task = asyncio.create_task(embedded_worker.run())
+    lifecycle.ready = True
+    try:
+        yield
+    finally:
+        lifecycle.ready = False
+        await health_monitor.stop()
+        await invalidation_bus.stop()
+        if embedded_worker is not None:
+            embedded_worker.stop()
+            await embedded_task
+        await job_queue.close()
+        await redis_client.aclose()
+        await sessionmanager.close()
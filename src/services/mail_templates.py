@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import Iterable
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+
+from src.conf.config import config
+
+TEMPLATE_FOLDER = Path(__file__).parent / "templates"
+
+
+def create_environment(bytecode_cache_dir: str | None = None) -> Environment:
+    """
+    The create_environment function creates the Jinja environment of the email templates.
+    Templates are not checked for changes once loaded, and their compiled code is kept in a bytecode cache
+    on disk, so a new process loads them without parsing and compiling them again.
+
+    :param bytecode_cache_dir: str | None: Directory of the bytecode cache, the system temporary directory by default
+    :return: The environment
+    :doc-author: Trelent
+    """
+    bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else FileSystemBytecodeCache()
+    return Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(),
+                       auto_reload=False, bytecode_cache=bytecode_cache)
+
+
+template_env = create_environment(config.MAIL_TEMPLATE_CACHE_DIR)
+
+
+def precompile(env: Environment = template_env) -> int:
+    """
+    The precompile function loads every template at startup, so the first email does not pay for the compilation.
+
+    :param env: Environment: The environment to fill
+    :return: The number of templates loaded
+    :doc-author: Trelent
+    """
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def render(name: str, **context) -> str:
+    """
+    The render function renders a template of the shared environment.
+
+    :param name: str: The name of the template
+    :param context: The variables of the template
+    :return: The rendered template
+    :doc-author: Trelent
+    """
+    return template_env.get_template(name).render(**context)
+
+
+def render_many(name: str, contexts: Iterable[dict]) -> list[str]:
+    """
+    The render_many function renders a template once for every context of a batch.
+    The template is looked up once for the whole batch.
+
+    :param name: str: The name of the template
+    :param contexts: Iterable[dict]: The variables of every message
+    :return: The rendered templates in the order of the contexts
+    :doc-author: Trelent
+    """
+    template = template_env.get_template(name)
+    return [template.render(context) for context in contexts]
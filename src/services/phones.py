@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+import phonenumbers
+
+
+@lru_cache(maxsize=8192)
+def phone_formats(phone: str, region: str | None = None) -> tuple[str, str] | None:
+    """
+    The phone_formats function parses a phone number once and returns the formats the application stores.
+    Parsing with phonenumbers is expensive and the same numbers come again and again
+    (validation, normalization, duplicate detection), so the results are cached.
+
+    :param phone: str: The phone number as entered or as stored
+    :param region: str | None: Region used for numbers without the international prefix
+    :return: A tuple of the RFC3966 and E.164 formats, or None if the number is not valid
+    :doc-author: Trelent
+    """
+    try:
+        parsed = phonenumbers.parse(phone, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return (phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.RFC3966),
+            phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164))
+
+
+def normalize_phone(phone: str) -> str | None:
+    """
+    The normalize_phone function formats a phone number as E.164, e.g. tel:+380-67-111-1111 becomes +380671111111.
+
+    :param phone: str: The phone number in any international format
+    :return: The E.164 number or None if it is not valid
+    :doc-author: Trelent
+    """
+    formats = phone_formats(phone)
+    return formats[1] if formats else None
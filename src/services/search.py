@@ -0,0 +1,87 @@
+import re
+
+from src.entity.models import Contact
+
+# Used for pg_trgm.word_similarity_threshold too, its default of 0.6 misses one-letter typos in short names
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def words(text: str) -> list[str]:
+    """
+    The words function splits a text into lower-cased alphanumeric words, the same way
+    pg_trgm and the simple text search configuration do.
+
+    :param text: str: The text to split
+    :return: A list of words
+    :doc-author: Trelent
+    """
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    """
+    The trigrams function returns the trigrams of a word as pg_trgm builds them:
+    the word is padded with two spaces in front and one at the end.
+
+    :param word: str: A lower-cased word
+    :return: A set of trigrams
+    :doc-author: Trelent
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_similarity(query_word: str, word: str) -> float:
+    """
+    The word_similarity function is the share of the query word trigrams found in the word,
+    like pg_trgm's word_similarity() for a single word.
+
+    :param query_word: str: A lower-cased word of the query
+    :param word: str: A lower-cased word of the contact
+    :return: The similarity between 0 and 1
+    :doc-author: Trelent
+    """
+    query_trigrams = trigrams(query_word)
+    return len(query_trigrams & trigrams(word)) / len(query_trigrams)
+
+
+def score_contact(q: str, contact: Contact) -> float:
+    """
+    The score_contact function ranks a contact against a search query in memory.
+    Every query word is matched with the closest word of the name, surname and email,
+    an exact word counts 1, otherwise its trigram word similarity is used, so misspelled
+    words still match. The score is the average over the query words.
+
+    :param q: str: The search query
+    :param contact: Contact: The contact to rank
+    :return: The relevance between 0 and 1
+    :doc-author: Trelent
+    """
+    query_words = words(q)
+    contact_words = words(f"{contact.name} {contact.surname} {contact.email}")
+    if not query_words or not contact_words:
+        return 0.0
+    total = 0.0
+    for query_word in query_words:
+        total += max(1.0 if query_word == word else word_similarity(query_word, word) for word in contact_words)
+    return round(total / len(query_words), 4)
+
+
+def rank_contacts(q: str, contacts: list[Contact], limit: int, offset: int) -> list[tuple[Contact, float]]:
+    """
+    The rank_contacts function is the in-memory implementation of the contact search,
+    used when the database has no full-text search (SQLite in the tests).
+
+    :param q: str: The search query
+    :param contacts: list[Contact]: The contacts of the user
+    :param limit: int: Limit the number of results
+    :param offset: int: Specify the number of results to skip
+    :return: A list of (contact, score) tuples sorted by relevance
+    :doc-author: Trelent
+    """
+    scored = [(contact, score_contact(q, contact)) for contact in contacts]
+    scored = [item for item in scored if item[1] >= SIMILARITY_THRESHOLD]
+    scored.sort(key=lambda item: (-item[1], item[0].id))
+    return scored[offset:offset + limit]
@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, Callable, Hashable
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import Base
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+def _key_part(value: Any) -> Hashable:
+    """
+    The _key_part function turns an argument of a coalesced call into a hashable key part.
+    ORM objects are identified by their class and primary key, so two requests of the same
+    user produce the same key even though they loaded the user in different sessions.
+
+    :param value: Any: The argument value
+    :return: A hashable representation of the value
+    :doc-author: Trelent
+    """
+    if isinstance(value, Base):
+        primary_key = tuple(sa_inspect(value).mapper.primary_key_from_instance(value))
+        if None in primary_key:
+            return type(value).__name__, id(value)
+        return type(value).__name__, primary_key
+    return value
+
+
+def _adopt(result: Any, db: AsyncSession | None) -> Any:
+    """
+    The _adopt function attaches the leader's result to the session of a follower.
+    merge(load=False) copies the already loaded state without querying the database, so each
+    request keeps working with instances of its own session.
+
+    :param result: Any: The result of the leader's call
+    :param db: AsyncSession | None: The follower's session
+    :return: The result with ORM objects merged into the follower's session
+    :doc-author: Trelent
+    """
+    if not isinstance(db, AsyncSession):
+        return result
+    if isinstance(result, Base):
+        return db.sync_session.merge(result, load=False)
+    if isinstance(result, (list, tuple)):
+        return [db.sync_session.merge(item, load=False) if isinstance(item, Base) else item for item in result]
+    return result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, list[tuple[AsyncSession | None, asyncio.Future]]] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, db: AsyncSession | None, call: Callable):
+        """
+        The do function runs call once for all concurrent callers with the same key.
+        The first caller (the leader) runs the query, the others wait for its result. The result
+        is handed to the followers before the leader returns, while it is still unmodified.
+        If the leader is cancelled the followers run the query themselves.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Identify identical calls
+        :param db: AsyncSession | None: The caller's session
+        :param call: Callable: A coroutine function without arguments doing the actual work
+        :return: The result of call
+        :doc-author: Trelent
+        """
+        waiters = self._calls.get(key)
+        if waiters is not None:
+            future = asyncio.get_running_loop().create_future()
+            waiters.append((db, future))
+            try:
+                return await future
+            except _LeaderCancelled:
+                return await call()
+
+        waiters = self._calls[key] = []
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._release(key, waiters, error=_LeaderCancelled())
+            raise
+        except Exception as err:
+            self._release(key, waiters, error=err)
+            raise
+        self._release(key, waiters, result=result)
+        return result
+
+    def _release(self, key: Hashable, waiters: list, result: Any = None, error: BaseException | None = None):
+        del self._calls[key]
+        for db, future in waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                continue
+            try:
+                future.set_result(_adopt(result, db))
+            except Exception as err:
+                future.set_exception(err)
+
+
+single_flight_group = SingleFlight()
+
+
+def single_flight(func: Callable):
+    """
+    The single_flight decorator coalesces concurrent identical calls of a repository read function.
+    Calls are identical when all arguments except the db session are equal.
+
+    :param func: Callable: The repository coroutine function
+    :return: The wrapped function
+    :doc-author: Trelent
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        db = bound.arguments.get("db")
+        key = (func.__module__, func.__qualname__) + tuple(
+            (name, _key_part(value)) for name, value in bound.arguments.items() if name != "db"
+        )
+        return await single_flight_group.do(key, db, lambda: func(*args, **kwargs))
+
+    return wrapper
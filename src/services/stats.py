@@ -0,0 +1,14 @@
+TOTAL, MONTH, DOMAIN = "total", "month", "domain"
+
+
+def stat_keys(contact) -> list[tuple[str, str]]:
+    """
+    The stat_keys function lists the counters a live contact contributes to: the total,
+    the month of the birthday and the domain of the email.
+
+    :param contact: A contact or a row with email and birthday
+    :return: A list of (kind, key) pairs
+    :doc-author: Trelent
+    """
+    return [(TOTAL, ""), (MONTH, f"{contact.birthday.month:02d}"),
+            (DOMAIN, contact.email.rpartition("@")[2].lower())]
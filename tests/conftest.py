@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from main import app
 from src.entity.models import Base, User
 from src.database.db import get_db
+from src.database.profiler import query_profiler
 from src.services.auth import auth_service
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
@@ -17,6 +18,8 @@ engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
 
+query_profiler.instrument(engine)
+
 TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 test_user = {"username": "yulyan", "email": "yulyan@gmail.com", "password": "secret789123"}
@@ -57,6 +60,11 @@ def client():
     yield TestClient(app)
 
 
+@pytest.fixture()
+def max_queries():
+    return query_profiler.assert_max_queries
+
+
 @pytest_asyncio.fixture()
 async def get_token():
     token = await auth_service.create_access_token(data={"sub": test_user["email"]})
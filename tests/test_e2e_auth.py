@@ -1,4 +1,4 @@
-from unittest.mock import Mock
+from unittest.mock import AsyncMock
 
 import pytest
 from sqlalchemy import select
@@ -11,8 +11,8 @@ user_data = {"username": "yulyan7", "email": "yulyan7@gmail.com", "password": "7
 
 
 def test_signup(client, monkeypatch):
-    mock_send_email = Mock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    mock_enqueue = AsyncMock()
+    monkeypatch.setattr("src.routes.auth.enqueue", mock_enqueue)
     response = client.post("api/auth/signup", json=user_data)
     assert response.status_code == 201, response.text
     data = response.json()
@@ -20,11 +20,13 @@ def test_signup(client, monkeypatch):
     assert data["email"] == user_data["email"]
     assert "password" not in data
     assert "avatar" in data
+    mock_enqueue.assert_awaited_once()
+    assert mock_enqueue.await_args.args[:3] == ("send_email", user_data["email"], user_data["username"])
 
 
 def test_repeat_signup(client, monkeypatch):
-    mock_send_email = Mock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    mock_enqueue = AsyncMock()
+    monkeypatch.setattr("src.routes.auth.enqueue", mock_enqueue)
     response = client.post("api/auth/signup", json=user_data)
     assert response.status_code == 409, response.text
     data = response.json()
@@ -57,6 +59,13 @@ async def test_login(client):
     assert "token_type" in data
 
 
+def test_login_query_count(client, max_queries):
+    with max_queries(2):
+        response = client.post("api/auth/login",
+                               data={"username": user_data.get("email"), "password": user_data.get("password")})
+    assert response.status_code == 200, response.text
+
+
 def test_wrong_password_login(client):
     response = client.post("api/auth/login",
                            data={"username": user_data.get("email"), "password": "password"})
@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL import Image
+
+from src.services.avatars import avatar_store
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(avatar_store, "root", tmp_path)
+    return avatar_store
+
+
+def test_get_avatar(client, store):
+    digest = "0" * 64
+    response = client.get(f"/api/avatars/{digest}/{store.sizes[-1]}")
+    assert response.status_code == 404, response.text
+
+    path = store.original_path(digest)
+    path.parent.mkdir(parents=True)
+    Image.new("RGBA", (300, 400), "red").save(path, format="PNG")
+    response = client.get(f"/api/avatars/{digest}/{store.sizes[0]}")
+    assert response.status_code == 200, response.text
+    with Image.open(io.BytesIO(response.content)) as thumbnail:
+        assert thumbnail.size == (store.sizes[0], store.sizes[0])
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+    response = client.get(f"/api/avatars/{digest}/{store.sizes[0]}",
+                          headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304, response.text
+    assert response.headers["etag"] == f'"{digest}-{store.sizes[0]}"'
+
+
+def test_get_avatar_invalid(client, store):
+    assert client.get("/api/avatars/not-a-digest/64").status_code == 422
+    assert client.get(f"/api/avatars/{'a' * 64}/100").status_code == 404
+
+
+def test_get_avatar_not_modified_without_disk(client, store, monkeypatch):
+    def thumbnail(*args):
+        raise AssertionError("the thumbnail must not be looked up")
+
+    monkeypatch.setattr(store, "thumbnail", thumbnail)
+    digest = "f" * 64
+    response = client.get(f"/api/avatars/{digest}/{store.sizes[0]}",
+                          headers={"If-None-Match": f'"{digest}-{store.sizes[0]}"'})
+    assert response.status_code == 304, response.text
@@ -0,0 +1,60 @@
+import gzip
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.middleware.compression import CompressionMiddleware, negotiate_encoding
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+
+
+def test_negotiate_encoding_quality():
+    with patch("src.middleware.compression.brotli", object()):
+        assert negotiate_encoding("gzip, br") == "br"
+        assert negotiate_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
+        assert negotiate_encoding("gzip;q=0.2, *;q=0.9") == "br"
+        assert negotiate_encoding("gzip;q=0.5, identity") is None
+    with patch("src.middleware.compression.brotli", None):
+        assert negotiate_encoding("br;q=1, gzip;q=0.1") == "gzip"
+
+
+def test_compress_large_response(client):
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert "paths" in response.json()
+
+
+def test_skip_small_response(client):
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200, response.text
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_compress_streaming_response():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    chunks = [f"row {i}\n".encode() * 10 for i in range(20)]
+
+    @app.get("/export")
+    async def export():
+        async def rows():
+            for chunk in chunks:
+                yield chunk
+
+        return StreamingResponse(rows(), media_type="text/plain")
+
+    with TestClient(app).stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw) == b"".join(chunks)
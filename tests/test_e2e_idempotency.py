@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from src.middleware.idempotency import IdempotencyMiddleware
+from src.services.auth import auth_service
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode()
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture()
+def idempotent_app():
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, paths={"/contacts/"}, poll_interval=0.01, wait_timeout=2)
+    app.state.redis = FakeRedis()
+    app.state.calls = []
+
+    @app.post("/contacts/", status_code=201)
+    async def create(request: Request):
+        body = await request.json()
+        app.state.calls.append(body)
+        await asyncio.sleep(body.get("delay", 0))
+        if body.get("fail"):
+            return app.state.fail_response
+        return {"id": len(app.state.calls), "name": body["name"]}
+
+    return app
+
+
+@pytest.fixture()
+def headers():
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "yulyan@gmail.com"}))
+    return {"Authorization": f"Bearer {token}", "Idempotency-Key": "key-1"}
+
+
+def test_replay_is_served_from_store(idempotent_app, headers):
+    client = TestClient(idempotent_app)
+    first = client.post("/contacts/", json={"name": "test"}, headers=headers)
+    second = client.post("/contacts/", json={"name": "test"}, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json() == {"id": 1, "name": "test"}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert len(idempotent_app.state.calls) == 1
+
+
+def test_without_key_every_request_runs(idempotent_app, headers):
+    client = TestClient(idempotent_app)
+    del headers["Idempotency-Key"]
+    client.post("/contacts/", json={"name": "test"}, headers=headers)
+    client.post("/contacts/", json={"name": "test"}, headers=headers)
+    assert len(idempotent_app.state.calls) == 2
+
+
+def test_key_is_scoped_to_user(idempotent_app, headers):
+    client = TestClient(idempotent_app)
+    client.post("/contacts/", json={"name": "test"}, headers=headers)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "other@gmail.com"}))
+    response = client.post("/contacts/", json={"name": "test"},
+                           headers={**headers, "Authorization": f"Bearer {token}"})
+    assert response.json()["id"] == 2
+
+
+def test_key_reused_with_other_body(idempotent_app, headers):
+    client = TestClient(idempotent_app)
+    client.post("/contacts/", json={"name": "test"}, headers=headers)
+    response = client.post("/contacts/", json={"name": "other"}, headers=headers)
+    assert response.status_code == 422, response.text
+    assert len(idempotent_app.state.calls) == 1
+
+
+def test_concurrent_duplicate_waits_for_first(idempotent_app, headers):
+    async def run_both():
+        transport = httpx.ASGITransport(app=idempotent_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.post("/contacts/", json={"name": "test", "delay": 0.1}, headers=headers),
+                client.post("/contacts/", json={"name": "test", "delay": 0.1}, headers=headers))
+
+    first, second = asyncio.run(run_both())
+    assert first.json() == second.json()
+    assert len(idempotent_app.state.calls) == 1
+
+
+def test_server_error_is_not_stored(idempotent_app, headers):
+    idempotent_app.state.fail_response = JSONResponse(status_code=503, content={"detail": "busy"})
+    client = TestClient(idempotent_app)
+    assert client.post("/contacts/", json={"name": "test", "fail": True}, headers=headers).status_code == 503
+    assert client.post("/contacts/", json={"name": "test", "fail": True}, headers=headers).status_code == 503
+    assert len(idempotent_app.state.calls) == 2
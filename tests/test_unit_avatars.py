@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from src.services.avatars import AvatarStore, image_type, verify_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def encode(mode: str, size: tuple[int, int], image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class TestAvatarStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = AvatarStore(Path(self.directory.name), sizes=(250, 64), quota_bytes=300)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_image_type(self):
+        self.assertEqual(image_type(PNG[:12]), "image/png")
+        self.assertEqual(image_type(b"\xff\xd8\xff\xe0" + b"\x00" * 8), "image/jpeg")
+        self.assertEqual(image_type(b"RIFF\x00\x00\x00\x00WEBP"), "image/webp")
+        self.assertIsNone(image_type(b"<svg xmlns="))
+
+    async def test_save_is_content_addressed(self):
+        digest = await self.store.save(PNG)
+        self.assertEqual(await self.store.save(PNG), digest)
+        self.assertEqual(self.store.original_path(digest).read_bytes(), PNG)
+        self.assertEqual(self.store.url(digest), f"/api/avatars/{digest}/250")
+        self.assertEqual(len(list(Path(self.directory.name).rglob("*.tmp-*"))), 0)
+
+    async def test_thumbnail_of_unknown_image_or_size(self):
+        digest = await self.store.save(PNG)
+        self.assertIsNone(await self.store.thumbnail(digest, 100))
+        self.assertIsNone(await self.store.thumbnail("0" * 64, 64))
+
+    def test_evict_removes_least_recently_used(self):
+        paths = [self.store.thumbnail_path(f"{i:064x}", 64, ".jpg") for i in range(4)]
+        for i, path in enumerate(paths):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+        # The oldest file was used last
+        os.utime(paths[0], (2000, 2000))
+        self.assertEqual(self.store._evict(), 200)
+        self.assertEqual([path.exists() for path in paths], [True, False, False, True])
+
+    async def test_verify_image(self):
+        self.assertEqual(await verify_image(encode("RGB", (40, 30), "JPEG")), "image/jpeg")
+        self.assertEqual(await verify_image(encode("RGBA", (40, 30), "PNG")), "image/png")
+        self.assertEqual(await verify_image(encode("RGB", (40, 30), "WEBP")), "image/webp")
+        # A valid header followed by garbage, a truncated file and a PNG announced as a GIF
+        self.assertIsNone(await verify_image(PNG))
+        self.assertIsNone(await verify_image(encode("RGB", (40, 30), "PNG")[:40]))
+        self.assertIsNone(await verify_image(b"GIF89a" + encode("RGB", (40, 30), "PNG")[6:]))
+
+    async def test_render_thumbnails(self):
+        store = AvatarStore(Path(self.directory.name), sizes=(64,), quota_bytes=1024 * 1024)
+        photo = await store.save(encode("RGB", (400, 200), "JPEG"))
+        logo = await store.save(encode("RGBA", (100, 300), "PNG"))
+        for digest, image_format, suffix in ((photo, "JPEG", ".jpg"), (logo, "PNG", ".png")):
+            path, media_type = await store.thumbnail(digest, 64)
+            self.assertEqual(path, store.thumbnail_path(digest, 64, suffix))
+            self.assertEqual(media_type, Image.MIME[image_format])
+            self.assertEqual(await store.thumbnail(digest, 64), (path, media_type))
+            with Image.open(path) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), (image_format, (64, 64)))
+        self.assertEqual(len(list(Path(self.directory.name).rglob(".tmp-*"))), 0)
+
+    async def test_broken_original_is_not_found(self):
+        digest = await self.store.save(PNG)
+        self.assertIsNone(await self.store.thumbnail(digest, 64))
+        self.assertEqual(list(Path(self.directory.name, "thumbnails").rglob("*")), [])
+
+    async def test_rendering_evicts_over_quota(self):
+        store = AvatarStore(Path(self.directory.name), sizes=(64,), quota_bytes=2000)
+        digests = [await store.save(encode("RGB", (80, 80 + i), "PNG")) for i in range(20)]
+        for digest in digests:
+            self.assertIsNotNone(await store.thumbnail(digest, 64))
+        usage = store._scan_usage()
+        self.assertEqual(store._usage, usage)
+        self.assertLessEqual(usage, 2000)
+        self.assertTrue(store.thumbnail_path(digests[-1], 64, ".jpg").exists())
+        self.assertFalse(store.thumbnail_path(digests[0], 64, ".jpg").exists())
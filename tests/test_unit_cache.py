@@ -0,0 +1,219 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, User
+from src.repository.users import get_cached_user_by_email, update_token
+from src.services.cache import LocalCache, InvalidationBus, ALL, local_cache, invalidation_bus
+import worker
+
+
+class TestLocalCache(unittest.TestCase):
+
+    def test_lru_and_ttl(self):
+        cache = LocalCache(maxsize=2, ttl=60)
+        cache.set("user", "a", 1)
+        cache.set("user", "b", 2)
+        cache.get("user", "a")
+        cache.set("user", "c", 3)
+        self.assertEqual(cache.get("user", "a"), 1)
+        self.assertIsNone(cache.get("user", "b"))
+
+        cache = LocalCache(ttl=-1)
+        cache.set("user", "a", 1)
+        self.assertIsNone(cache.get("user", "a"))
+
+    def test_evict_key_and_namespace(self):
+        cache = LocalCache()
+        cache.set("contacts", 1, "one")
+        cache.set("contacts", 2, "two")
+        cache.set("user", "a", "user")
+        cache.evict("contacts", "1")
+        self.assertIsNone(cache.get("contacts", 1))
+        cache.evict("contacts", ALL)
+        self.assertEqual(len(cache), 1)
+
+    def test_value_loaded_before_eviction_is_not_stored(self):
+        cache = LocalCache()
+        generation = cache.generation
+        cache.evict("user", "a")
+        cache.set("user", "a", "old", generation)
+        self.assertIsNone(cache.get("user", "a"))
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for message in self.messages:
+            if isinstance(message, Exception):
+                raise message
+            yield message
+        await asyncio.sleep(10)
+
+
+class FakeBroker:
+    """
+    Delivers the published events to every subscription, like a Redis server shared by the processes.
+    """
+
+    def __init__(self):
+        self.subscriptions: list[asyncio.Queue] = []
+
+    def client(self):
+        client = AsyncMock()
+        client.publish = self.publish
+        client.pubsub = lambda: FakeSubscription(self)
+        return client
+
+    async def publish(self, channel, message):
+        for queue in self.subscriptions:
+            queue.put_nowait({"type": "message", "data": message.encode()})
+
+
+class FakeSubscription:
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.broker.subscriptions.remove(self.queue)
+        return False
+
+    async def subscribe(self, channel):
+        self.broker.subscriptions.append(self.queue)
+        self.queue.put_nowait({"type": "subscribe", "data": 1})
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+class TestInvalidationBus(unittest.IsolatedAsyncioTestCase):
+
+    async def test_publish_evicts_locally_and_sends_event(self):
+        cache = LocalCache()
+        bus = InvalidationBus(cache)
+        bus.client = AsyncMock()
+        cache.set("user", "a@ukr.net", {})
+        await bus.publish("user", "a@ukr.net")
+        self.assertIsNone(cache.get("user", "a@ukr.net"))
+        bus.client.publish.assert_awaited_once_with(InvalidationBus.CHANNEL, "user:a@ukr.net")
+
+    async def test_listener_evicts_and_flushes_on_reconnect(self):
+        cache = LocalCache()
+        bus = InvalidationBus(cache, reconnect_delay=10)
+        client = AsyncMock()
+        subscribed = {"type": "subscribe", "data": 1}
+        client.pubsub = lambda: FakePubSub([subscribed, {"type": "message", "data": b"user:a"},
+                                            ConnectionError("lost")])
+        cache.set("user", "a", 1)
+        cache.set("user", "b", 2)
+        await bus.start(client)
+        await asyncio.sleep(0.01)
+        self.assertFalse(bus.connected)
+        self.assertEqual(len(cache), 0)
+        await bus.stop()
+
+    async def test_event_evicts_only_its_key(self):
+        cache = LocalCache()
+        bus = InvalidationBus(cache)
+        client = AsyncMock()
+        client.pubsub = lambda: FakePubSub([{"type": "subscribe", "data": 1}])
+        await bus.start(client)
+        await asyncio.sleep(0.01)
+        self.assertTrue(bus.connected)
+        cache.set("user", "a", 1)
+        bus.apply("user:b")
+        self.assertEqual(cache.get("user", "a"), 1)
+        await bus.stop()
+
+
+class TestWorkerInvalidation(unittest.IsolatedAsyncioTestCase):
+
+    async def test_job_write_evicts_web_worker_cache(self):
+        broker = FakeBroker()
+        web_cache = LocalCache()
+        web_bus = InvalidationBus(web_cache)
+        await web_bus.start(broker.client())
+        await asyncio.sleep(0.01)
+        web_cache.set("user", "test_user@ukr.net", {"id": 1})
+
+        class JobWorker:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def stop(self):
+                pass
+
+            async def run(self):
+                # A job commits a write and publishes it, as the repository functions do
+                await invalidation_bus.publish("user", "test_user@ukr.net")
+                await asyncio.sleep(0.01)
+
+        with patch.object(worker.redis, "Redis", return_value=broker.client()), \
+                patch.object(worker, "Worker", JobWorker), \
+                patch.object(worker, "job_queue", MagicMock(close=AsyncMock())), \
+                patch.object(worker, "sessionmanager", MagicMock(close=AsyncMock())):
+            await worker.run(1)
+        self.assertIsNone(web_cache.get("user", "test_user@ukr.net"))
+        self.assertIsNone(invalidation_bus.client)
+        await web_bus.stop()
+
+
+class TestCachedUser(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_maker() as session:
+            session.add(User(username="test_user", email="test_user@ukr.net", password="test_password"))
+            await session.commit()
+        local_cache.clear()
+        patcher = patch.object(invalidation_bus, "connected", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        local_cache.clear()
+        await self.engine.dispose()
+
+    async def test_second_lookup_is_served_from_cache(self):
+        async with self.session_maker() as session:
+            user = await get_cached_user_by_email("test_user@ukr.net", session)
+        async with self.session_maker() as session:
+            with patch.object(session, "execute", wraps=session.execute) as execute:
+                cached = await get_cached_user_by_email("test_user@ukr.net", session)
+                execute.assert_not_called()
+            self.assertIn(cached, session)
+            self.assertEqual((cached.id, cached.username), (user.id, user.username))
+
+    async def test_write_evicts_user(self):
+        async with self.session_maker() as session:
+            user = await get_cached_user_by_email("test_user@ukr.net", session)
+            await update_token(user, "token", session)
+        self.assertIsNone(local_cache.get("user", "test_user@ukr.net"))
+        async with self.session_maker() as session:
+            user = await get_cached_user_by_email("test_user@ukr.net", session)
+            self.assertEqual(user.refresh_token, "token")
+
+
+if __name__ == '__main__':
+    unittest.main()
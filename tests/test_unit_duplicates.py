@@ -0,0 +1,90 @@
+import unittest
+from datetime import date, datetime
+from unittest.mock import MagicMock, AsyncMock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, Contact, ContactBlockingKey, User
+from src.repository.duplicates import get_duplicates, rebuild_blocking_keys
+from src.repository.scans import ContactRow, scan_contacts
+from src.services.duplicates import soundex, blocking_keys, group_duplicates
+from src.services.phones import normalize_phone
+
+
+class TestDuplicates(unittest.TestCase):
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('tel:+380-67-111-1111'), '+380671111111')
+        self.assertEqual(normalize_phone('+380 67 111 1111'), '+380671111111')
+        self.assertIsNone(normalize_phone('0671111111'))
+
+    def test_soundex(self):
+        self.assertEqual(soundex('Robert'), 'R163')
+        self.assertEqual(soundex('Rupert'), 'R163')
+        self.assertEqual(soundex('Ashcraft'), 'A261')
+        self.assertEqual(soundex('Lee'), 'L000')
+        self.assertEqual(soundex('Юлія'), '')
+
+    def test_blocking_keys(self):
+        contact = Contact(name='Robert', surname='Smith', email=' Rob@Ukr.net', phone='tel:+380-67-111-1111')
+        self.assertEqual(blocking_keys(contact), {'phone': '+380671111111', 'email': 'rob@ukr.net', 'name': 'R163S530'})
+
+    def test_group_duplicates(self):
+        rows = [(1, 'email', 'a@ukr.net'), (2, 'email', 'a@ukr.net'),
+                (2, 'phone', '+380671111111'), (3, 'phone', '+380671111111'),
+                (4, 'name', 'R163S530'), (5, 'name', 'R163S530')]
+        self.assertEqual(group_duplicates(rows), [{'contact_ids': [1, 2, 3], 'reasons': ['email', 'phone']},
+                                                  {'contact_ids': [4, 5], 'reasons': ['name']}])
+
+
+class TestAsyncDuplicates(unittest.IsolatedAsyncioTestCase):
+
+    async def test_get_duplicates(self):
+        session = AsyncMock(spec=AsyncSession)
+        mocked_rows = MagicMock()
+        mocked_rows.all.return_value = [(1, 'email', 'a@ukr.net'), (2, 'email', 'a@ukr.net')]
+        session.execute.return_value = mocked_rows
+        result = await get_duplicates(session, User(id=1))
+        self.assertEqual(result, [{'contact_ids': [1, 2], 'reasons': ['email']}])
+
+
+class TestRebuildBlockingKeys(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine)()
+        user = User(username='test_user', email='test_user@ukr.net', password='test_password')
+        self.session.add(user)
+        await self.session.flush()
+        self.user_id = user.id
+        for i in range(5):
+            self.session.add(Contact(name='Robert', surname='Rupert', email=f'Test_{i}@ukr.net',
+                                     phone='+380671111111', birthday=date(1985, 2, 1), user_id=user.id, seq=i + 1,
+                                     deleted_at=datetime(2024, 1, 1) if i == 2 else None))
+        await self.session.commit()
+        self.session.expunge_all()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_scan_contacts_returns_compact_rows(self):
+        batches = [rows async for rows in scan_contacts(self.session, Contact.user_id == self.user_id, batch_size=2)]
+        self.assertEqual([[row.id for row in rows] for rows in batches], [[1, 2], [4, 5]])
+        self.assertIsInstance(batches[0][0], ContactRow)
+        self.assertEqual(batches[0][0].email, 'Test_0@ukr.net')
+        self.assertEqual(len(self.session.identity_map), 0)
+
+    async def test_rebuild_blocking_keys(self):
+        self.assertEqual(await rebuild_blocking_keys(self.session, batch_size=3), 4)
+        keys = (await self.session.execute(select(ContactBlockingKey.contact_id, ContactBlockingKey.kind,
+                                                  ContactBlockingKey.key)
+                                           .order_by(ContactBlockingKey.contact_id, ContactBlockingKey.kind))).all()
+        self.assertEqual(sorted({row.contact_id for row in keys}), [1, 2, 4, 5])
+        self.assertEqual(keys[:3], [(1, 'email', 'test_0@ukr.net'), (1, 'name', 'R163R163'),
+                                    (1, 'phone', '+380671111111')])
+        self.assertEqual(await rebuild_blocking_keys(self.session), 4)
+        self.assertEqual(len((await self.session.execute(select(ContactBlockingKey))).all()), 12)
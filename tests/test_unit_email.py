@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+
+from src.services.email import birthday_digest_message, birthday_digest_messages, send_messages, send_email, \
+    mime_message, conf
+from src.services.mail_templates import create_environment, precompile
+
+
+class TestBirthdayDigest(unittest.TestCase):
+
+    def test_message_lists_birthdays_in_order(self):
+        birthdays = [{'name': 'Ann', 'surname': 'Lee', 'birthday': '1990-01-02'},
+                     {'name': 'Bob', 'surname': 'Ray', 'birthday': '1985-12-30'},
+                     {'name': 'Eve', 'surname': '<b>Doe</b>', 'birthday': '1970-12-29'}]
+        message = birthday_digest_message('user@ukr.net', 'user', birthdays, date(2024, 12, 29))
+        self.assertEqual(message.recipients, ['user@ukr.net'])
+        body = message.body
+        self.assertLess(body.index('Eve'), body.index('Bob'))
+        self.assertLess(body.index('Bob'), body.index('Ann'))
+        self.assertIn('today', body)
+        self.assertIn('tomorrow', body)
+        self.assertIn('in 4 days', body)
+        self.assertIn('&lt;b&gt;Doe&lt;/b&gt;', body)
+
+    def test_leap_day(self):
+        birthdays = [{'name': 'Ann', 'surname': 'Lee', 'birthday': '1992-02-29'}]
+        message = birthday_digest_message('user@ukr.net', 'user', birthdays, date(2023, 2, 27))
+        self.assertIn('in 2 days', message.body)
+
+
+class TestSendMessages(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.services.email.aiosmtplib.SMTP')
+    async def test_one_connection_per_batch(self, mock_smtp):
+        connection = MagicMock()
+        connection.send_message = AsyncMock(side_effect=[None, aiosmtplib.SMTPRecipientsRefused([]), None])
+        mock_smtp.return_value.__aenter__ = AsyncMock(return_value=connection)
+        mock_smtp.return_value.__aexit__ = AsyncMock(return_value=False)
+        birthdays = [{'name': 'Ann', 'surname': 'Lee', 'birthday': '1990-01-02'}]
+        messages = [birthday_digest_message(f'user{number}@ukr.net', 'user', birthdays, date(2024, 1, 1))
+                    for number in range(3)]
+        on_sent = AsyncMock()
+        with self.assertLogs('src.services.email', level='WARNING') as logs:
+            sent = await send_messages(messages, on_sent)
+        self.assertEqual(sent, 2)
+        self.assertIn('user1@ukr.net', logs.output[0])
+        mock_smtp.assert_called_once()
+        self.assertEqual(mock_smtp.call_args.kwargs["hostname"], conf.MAIL_SERVER)
+        self.assertTrue(mock_smtp.call_args.kwargs["use_tls"])
+        self.assertEqual(connection.send_message.await_count, 3)
+        mail = connection.send_message.await_args_list[1].args[0]
+        self.assertIsInstance(mail, EmailMessage)
+        self.assertEqual(mail["To"], 'user1@ukr.net')
+        self.assertEqual(mail["From"], f"{conf.MAIL_FROM_NAME} <{conf.MAIL_FROM}>")
+        self.assertEqual(mail["Subject"], 'Upcoming birthdays')
+        self.assertEqual([call.args[0] for call in on_sent.await_args_list], [1, 2, 3])
+
+    def test_mime_message(self):
+        birthdays = [{'name': 'Ann', 'surname': '<b>Lee</b>', 'birthday': '1990-01-02'}]
+        message = birthday_digest_message('user@ukr.net', 'user', birthdays, date(2024, 1, 1))
+        mail = mime_message(message, 'Sender <sender@ukr.net>')
+        self.assertEqual(mail.get_content_type(), 'text/html')
+        self.assertEqual(mail.get_content(), message.body + '\n')
+        self.assertIsNotNone(mail["Date"])
+        self.assertIsNotNone(mail["Message-ID"])
+
+
+class TestTemplates(unittest.IsolatedAsyncioTestCase):
+
+    def test_precompile_fills_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(precompile(create_environment(directory)), 2)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_batch_matches_single_messages(self):
+        birthdays = [{'name': 'Ann', 'surname': 'Lee', 'birthday': '1990-01-02'}]
+        digests = [{'email': f'user{number}@ukr.net', 'username': f'user{number}', 'birthdays': birthdays}
+                   for number in range(3)]
+        messages = birthday_digest_messages(digests, date(2024, 1, 1))
+        self.assertEqual([message.recipients for message in messages], [[digest['email']] for digest in digests])
+        self.assertEqual(messages[1].body,
+                         birthday_digest_message('user1@ukr.net', 'user1', birthdays, date(2024, 1, 1)).body)
+
+    @patch('src.services.email.mailer')
+    async def test_send_email_renders_with_shared_environment(self, mock_mailer):
+        mock_mailer.send_message = AsyncMock()
+        await send_email('user@ukr.net', '<user>', 'http://localhost:8000/')
+        message = mock_mailer.send_message.await_args.args[0]
+        self.assertEqual(mock_mailer.send_message.await_args.kwargs, {})
+        self.assertIn('Hi &lt;user&gt;,', message.body)
+        self.assertIn('href="http://localhost:8000/api/auth/confirmed_email/', message.body)
+
+
+if __name__ == '__main__':
+    unittest.main()
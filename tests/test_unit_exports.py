@@ -0,0 +1,74 @@
+import json
+import tempfile
+import unittest
+import zipfile
+from datetime import date, datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, Contact, User
+from src.jobs.queue import Job, InMemoryJobQueue
+from src.repository.contacts import iter_contact_batches
+from src.routes.users import get_user_job
+from src.services.exports import write_export
+
+
+class TestExport(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = User(username='test_user', email='test_user@ukr.net', password='test_password')
+        self.session.add(self.user)
+        await self.session.flush()
+        for i in range(5):
+            self.session.add(Contact(name=f'test_name_{i}', surname='test_surname', email=f'test_{i}@ukr.net',
+                                     phone='+380671111111', birthday=date(1985, 2, 1 + i), user_id=self.user.id,
+                                     seq=i + 1, deleted_at=datetime(2024, 1, 1) if i == 3 else None))
+        await self.session.commit()
+        self.directory = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_write_export(self):
+        path = Path(self.directory.name) / "export.zip"
+        on_written = AsyncMock()
+        batches = iter_contact_batches(self.user.id, self.session, batch_size=2)
+        written = await write_export(path, {"email": self.user.email}, batches, on_written)
+        self.assertEqual(written, 4)
+        self.assertEqual([call.args for call in on_written.await_args_list], [(2,), (4,)])
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(json.loads(archive.read("account.json")), {"email": "test_user@ukr.net"})
+            contacts = [json.loads(line) for line in archive.read("contacts.jsonl").splitlines()]
+        self.assertEqual([contact["name"] for contact in contacts],
+                         ['test_name_0', 'test_name_1', 'test_name_2', 'test_name_4'])
+        self.assertEqual(contacts[0]["birthday"], "1985-02-01")
+        self.assertEqual([p.name for p in Path(self.directory.name).iterdir()], ["export.zip"])
+
+
+class TestUserJobs(unittest.IsolatedAsyncioTestCase):
+
+    async def test_get_user_job_checks_owner(self):
+        queue = InMemoryJobQueue()
+        own = await queue.enqueue(Job(name="export_account", args=[1]))
+        other = await queue.enqueue(Job(name="export_account", args=[2]))
+        internal = await queue.enqueue(Job(name="send_email", args=[1]))
+        user = User(id=1, username='test_user', email='test_user@ukr.net', password='test_password')
+        with patch("src.routes.users.job_queue", queue):
+            self.assertEqual((await get_user_job(own.id, user)).id, own.id)
+            for job in (other, internal):
+                with self.assertRaises(HTTPException) as error:
+                    await get_user_job(job.id, user)
+                self.assertEqual(error.exception.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
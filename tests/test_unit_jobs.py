@@ -0,0 +1,230 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+
+from src.jobs import tasks
+from src.jobs.cron import CronSchedule
+from src.jobs.queue import JobQueue, InMemoryJobQueue, RedisJobQueue, Job, SUCCEEDED, FAILED, RETRYING
+from src.jobs.worker import Worker, job, enqueue, report_progress, registry
+
+
+class TestCronSchedule(unittest.TestCase):
+
+    def test_every_fifteen_minutes(self):
+        schedule = CronSchedule("*/15 * * * *")
+        self.assertEqual(schedule.next_after(datetime(2024, 1, 1, 10, 7, 30)), datetime(2024, 1, 1, 10, 15))
+        self.assertEqual(schedule.next_after(datetime(2024, 1, 1, 10, 45)), datetime(2024, 1, 1, 11, 0))
+
+    def test_daily_and_weekdays(self):
+        self.assertEqual(CronSchedule("30 3 * * *").next_after(datetime(2024, 1, 1, 4, 0)),
+                         datetime(2024, 1, 2, 3, 30))
+        # 2024-01-06 is a Saturday, the next weekday is Monday
+        self.assertEqual(CronSchedule("0 9 * * 1-5").next_after(datetime(2024, 1, 6, 12, 0)),
+                         datetime(2024, 1, 8, 9, 0))
+
+    def test_day_of_month_or_weekday(self):
+        # Like cron: the 1st of the month or any Sunday
+        schedule = CronSchedule("0 0 1 * 0")
+        self.assertEqual(schedule.next_after(datetime(2024, 1, 2)), datetime(2024, 1, 7))
+
+    def test_invalid_expression(self):
+        with self.assertRaises(ValueError):
+            CronSchedule("* * *")
+        with self.assertRaises(ValueError):
+            CronSchedule("61 * * * *")
+
+
+class TestInMemoryJobQueue(unittest.IsolatedAsyncioTestCase):
+
+    async def test_fifo_and_delay(self):
+        queue = InMemoryJobQueue()
+        first = await queue.enqueue(Job(name="a"))
+        await queue.enqueue(Job(name="b", run_at=time.time() + 60))
+        second = await queue.enqueue(Job(name="c"))
+        self.assertEqual((await queue.dequeue(0)).id, first.id)
+        self.assertEqual((await queue.dequeue(0)).id, second.id)
+        self.assertIsNone(await queue.dequeue(0))
+        self.assertEqual(await queue.stats(), {"ready": 0, "delayed": 1, "processing": 2})
+
+    async def test_requeue_expired(self):
+        queue = InMemoryJobQueue(visibility_timeout=0)
+        queued = await queue.enqueue(Job(name="a"))
+        await queue.dequeue(0)
+        self.assertEqual(await queue.requeue_expired(), 1)
+        self.assertEqual((await queue.dequeue(0)).id, queued.id)
+
+    async def test_schedule_slot_acquired_once(self):
+        queue = InMemoryJobQueue()
+        self.assertTrue(await queue.acquire_schedule("digest", 1, ttl=60))
+        self.assertFalse(await queue.acquire_schedule("digest", 1, ttl=60))
+        self.assertTrue(await queue.acquire_schedule("digest", 2, ttl=60))
+
+    def test_backend_must_implement_the_interface(self):
+        class IncompleteQueue(JobQueue):
+            async def enqueue(self, job: Job) -> Job:
+                return job
+
+        with self.assertRaises(TypeError):
+            IncompleteQueue()
+
+    def test_job_json_round_trip(self):
+        queued = Job(name="a", args=[1], kwargs={"b": 2}, progress={"done": 3})
+        self.assertEqual(Job.from_json(queued.to_json()), queued)
+
+
+class TestRedisJobQueue(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.queue = RedisJobQueue(self.client)
+
+    async def asyncTearDown(self):
+        await self.queue.close()
+
+    async def test_dequeue_claims_the_job(self):
+        first = await self.queue.enqueue(Job(name="a"))
+        second = await self.queue.enqueue(Job(name="b"))
+        self.assertEqual((await self.queue.dequeue(0)).id, first.id)
+        self.assertEqual(await self.client.lrange(RedisJobQueue.READY, 0, -1), [second.id])
+        self.assertIsNotNone(await self.client.zscore(RedisJobQueue.PROCESSING, first.id))
+        self.assertEqual((await self.queue.dequeue(0)).id, second.id)
+        self.assertIsNone(await self.queue.dequeue(0))
+        self.assertEqual(await self.queue.stats(), {"ready": 0, "delayed": 0, "processing": 2})
+
+    async def test_delayed_and_expired_jobs_are_requeued(self):
+        self.queue.visibility_timeout = 0
+        queued = await self.queue.enqueue(Job(name="a", run_at=time.time() - 1))
+        self.assertEqual((await self.queue.dequeue(0)).id, queued.id)
+        self.assertEqual(await self.queue.requeue_expired(), 1)
+        self.assertEqual(await self.queue.requeue_expired(), 0)
+        self.assertEqual((await self.queue.dequeue(0)).id, queued.id)
+
+
+class TestWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch.dict(registry, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = InMemoryJobQueue()
+
+    async def run_until(self, worker: Worker, condition, timeout: float = 2):
+        task = asyncio.create_task(worker.run())
+        deadline = time.monotonic() + timeout
+        while not await condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await task
+
+    async def test_success_and_progress(self):
+        @job("add")
+        async def add(a, b):
+            await report_progress(done=1, total=1)
+            return a + b
+
+        queued = await enqueue("add", 1, b=2, queue=self.queue)
+        worker = Worker(self.queue, poll_timeout=0.05)
+        await self.run_until(worker, lambda: self._finished(queued.id))
+        result = await self.queue.get(queued.id)
+        self.assertEqual(result.status, SUCCEEDED)
+        self.assertEqual(result.result, 3)
+        self.assertEqual(result.progress, {"done": 1, "total": 1})
+        self.assertEqual(await self.queue.stats(), {"ready": 0, "delayed": 0, "processing": 0})
+
+    async def test_retry_then_fail(self):
+        calls = []
+
+        @job("flaky", retries=2, backoff=0)
+        async def flaky():
+            calls.append(1)
+            raise ConnectionError("smtp down")
+
+        queued = await enqueue("flaky", queue=self.queue)
+        worker = Worker(self.queue, poll_timeout=0.05)
+        await self.run_until(worker, lambda: self._finished(queued.id))
+        result = await self.queue.get(queued.id)
+        self.assertEqual(result.status, FAILED)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(len(calls), 3)
+        self.assertIn("smtp down", result.error)
+
+    async def test_retry_is_delayed_with_backoff(self):
+        @job("flaky", retries=1, backoff=60)
+        async def flaky():
+            raise ConnectionError("smtp down")
+
+        queued = await enqueue("flaky", queue=self.queue)
+        worker = Worker(self.queue, poll_timeout=0.05)
+
+        async def retrying():
+            return (await self.queue.get(queued.id)).status == RETRYING
+
+        await self.run_until(worker, retrying)
+        self.assertEqual((await self.queue.stats())["delayed"], 1)
+        self.assertGreater((await self.queue.get(queued.id)).run_at, time.time() + 50)
+
+    async def test_timeout_and_unknown_job(self):
+        @job("slow", retries=0, timeout=0.01)
+        async def slow():
+            await asyncio.sleep(1)
+
+        slow_job = await enqueue("slow", queue=self.queue)
+        unknown_job = await enqueue("missing", queue=self.queue)
+        worker = Worker(self.queue, poll_timeout=0.05)
+
+        async def finished():
+            return await self._finished(slow_job.id) and await self._finished(unknown_job.id)
+
+        await self.run_until(worker, finished)
+        self.assertEqual((await self.queue.get(slow_job.id)).status, FAILED)
+        self.assertEqual((await self.queue.get(unknown_job.id)).error, "Unknown job")
+
+    async def test_job_concurrency_limit(self):
+        running, peak = 0, 0
+
+        @job("limited", concurrency=2)
+        async def limited():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        queued = [await enqueue("limited", queue=self.queue) for _ in range(6)]
+        worker = Worker(self.queue, concurrency=10, poll_timeout=0.05)
+
+        async def finished():
+            return all([await self._finished(item.id) for item in queued])
+
+        await self.run_until(worker, finished)
+        self.assertEqual(peak, 2)
+
+    async def _finished(self, job_id: str) -> bool:
+        return (await self.queue.get(job_id)).status in (SUCCEEDED, FAILED)
+
+
+class TestBirthdayDigestJob(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.jobs.tasks.sessionmanager')
+    @patch('src.jobs.tasks.enqueue', new_callable=AsyncMock)
+    @patch('src.jobs.tasks.repositories_contacts.stream_upcoming_birthdays')
+    async def test_digests_are_enqueued_in_batches(self, mock_stream, mock_enqueue, mock_sessionmanager):
+        async def stream(days_range, db):
+            for user_id in range(5):
+                yield {"user_id": user_id, "email": f"{user_id}@ukr.net", "username": "user", "birthdays": []}
+
+        mock_stream.side_effect = stream
+        mock_sessionmanager.session.return_value.__aenter__ = AsyncMock()
+        mock_sessionmanager.session.return_value.__aexit__ = AsyncMock(return_value=False)
+        with patch.object(tasks.config, 'BIRTHDAY_DIGEST_BATCH_SIZE', 2):
+            self.assertEqual(await tasks.birthday_digest(), 5)
+        self.assertEqual([len(call.args[1]) for call in mock_enqueue.await_args_list], [2, 2, 1])
+        self.assertTrue(all(call.args[0] == "send_birthday_digests" for call in mock_enqueue.await_args_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
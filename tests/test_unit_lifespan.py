@@ -0,0 +1,121 @@
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.database.db import DatabaseSessionManager
+from src.middleware.in_flight import InFlightMiddleware
+from src.services.health import HealthMonitor
+from src.services.lifespan import Lifecycle, lifespan
+
+
+class TestLifecycle(unittest.IsolatedAsyncioTestCase):
+
+    def test_start_draining(self):
+        lifecycle = Lifecycle()
+        lifecycle.ready = True
+        lifecycle.start_draining()
+        self.assertTrue(lifecycle.draining)
+        self.assertFalse(lifecycle.ready)
+
+    @patch('src.services.lifespan.invalidation_bus')
+    @patch('src.services.lifespan.job_queue')
+    @patch('src.services.lifespan.FastAPILimiter')
+    @patch('src.services.lifespan.sessionmanager')
+    @patch('src.services.lifespan.redis')
+    async def test_lifespan(self, mock_redis, mock_sessionmanager, mock_limiter, mock_job_queue, mock_bus):
+        redis_client = AsyncMock()
+        mock_redis.Redis = AsyncMock(return_value=redis_client)
+        mock_sessionmanager.warm_up = AsyncMock()
+        mock_sessionmanager.close = AsyncMock()
+        mock_limiter.init = AsyncMock()
+        mock_job_queue.close = AsyncMock()
+        mock_bus.start, mock_bus.stop = AsyncMock(), AsyncMock()
+        lifecycle = Lifecycle()
+        app = FastAPI()
+        with patch('src.services.lifespan.lifecycle', lifecycle):
+            async with lifespan(app):
+                self.assertTrue(lifecycle.ready)
+                mock_sessionmanager.warm_up.assert_awaited_once()
+                mock_limiter.init.assert_awaited_once_with(redis_client)
+            self.assertFalse(lifecycle.ready)
+        redis_client.aclose.assert_awaited_once()
+        mock_sessionmanager.close.assert_awaited_once()
+        mock_job_queue.close.assert_awaited_once()
+        mock_bus.start.assert_awaited_once_with(redis_client)
+        mock_bus.stop.assert_awaited_once()
+
+
+class TestInFlightMiddleware(unittest.TestCase):
+
+    def test_reject_while_draining(self):
+        lifecycle = Lifecycle()
+        app = FastAPI()
+        app.add_middleware(InFlightMiddleware, lifecycle=lifecycle)
+
+        @app.get("/")
+        def index():
+            return {"status": "ok"}
+
+        client = TestClient(app)
+        response = client.get("/")
+        self.assertEqual(response.json(), {"status": "ok"})
+
+        lifecycle.draining = True
+        response = client.get("/")
+        self.assertEqual(response.status_code, 503)
+
+
+class TestHealthMonitor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_readiness_from_cached_results(self):
+        monitor = HealthMonitor(interval=60, timeout=1, max_pool_saturation=0.9)
+        database = AsyncMock()
+        email = AsyncMock(side_effect=ConnectionRefusedError())
+        monitor.register("database", database)
+        monitor.register("email", email, critical=False)
+        ready, report = monitor.readiness(warmed_up=True)
+        self.assertFalse(ready)
+
+        await monitor.run_checks()
+        ready, report = monitor.readiness(warmed_up=True)
+        self.assertTrue(ready)
+        self.assertFalse(report["checks"]["email"]["ok"])
+        self.assertIn("saturation", report["pool"])
+
+        database.assert_awaited_once()
+        self.assertFalse(monitor.readiness(warmed_up=False)[0])
+
+        database.side_effect = OSError()
+        await monitor.run_checks()
+        self.assertFalse(monitor.readiness(warmed_up=True)[0])
+
+    async def test_check_with_longer_interval(self):
+        monitor = HealthMonitor(interval=5, timeout=1, max_pool_saturation=0.9)
+        database, email = AsyncMock(), AsyncMock()
+        monitor.register("database", database)
+        monitor.register("email", email, critical=False, interval=300)
+        with patch('src.services.health.time', wraps=time) as mock_time:
+            mock_time.monotonic.side_effect = [1000, 1005, 1010, 1300]
+            for _ in range(4):
+                await monitor.run_checks()
+        self.assertEqual(database.await_count, 4)
+        self.assertEqual(email.await_count, 2)
+
+
+class TestPoolStatus(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pool_status_counts_overflow(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{directory.name}/pool.db", pool_size=1, max_overflow=3)
+        try:
+            self.assertEqual(manager.pool_status(), {"size": 4, "checked_out": 0, "overflow": 0, "saturation": 0.0})
+            async with manager._engine.connect(), manager._engine.connect():
+                self.assertEqual(manager.pool_status(),
+                                 {"size": 4, "checked_out": 2, "overflow": 1, "saturation": 0.5})
+        finally:
+            await manager.close()
@@ -0,0 +1,77 @@
+import unittest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.profiler import QueryProfiler, normalize
+from src.entity.models import Base, User
+from src.repository.users import get_user_by_email
+
+
+class TestNormalize(unittest.TestCase):
+
+    def test_values_are_replaced(self):
+        self.assertEqual(normalize("SELECT * FROM users WHERE id = $1 AND email = 'a@ukr.net'"),
+                         "SELECT * FROM users WHERE id = ? AND email = ?")
+        self.assertEqual(normalize("SELECT id::text FROM contacts\n  WHERE id IN ($1, $2, $3) LIMIT 10"),
+                         "SELECT id::text FROM contacts WHERE id IN (...) LIMIT ?")
+
+
+class TestQueryProfiler(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.profiler = QueryProfiler(slow_query_ms=1000, n_plus_one_threshold=2)
+        self.profiler.instrument(self.engine)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_n_plus_one_is_reported_with_caller(self):
+        with self.assertLogs("src.database.profiler", level="WARNING") as logs:
+            with self.profiler.request("GET /api/users/me") as stats:
+                async with self.session_maker() as session:
+                    for email in ["a@ukr.net", "b@ukr.net", "c@ukr.net"]:
+                        await get_user_by_email(email, session)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("GET /api/users/me", logs.output[0])
+        self.assertIn("executed 3 times by src.repository.users.get_user_by_email", logs.output[0])
+
+    async def test_slow_query_is_logged(self):
+        self.profiler.slow_query_ms = 0
+        with self.assertLogs("src.database.profiler", level="WARNING") as logs:
+            async with self.session_maker() as session:
+                await get_user_by_email("a@ukr.net", session)
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("src.repository.users.get_user_by_email", logs.output[0])
+
+    async def test_assert_max_queries(self):
+        with self.profiler.assert_max_queries(1) as stats:
+            async with self.session_maker() as session:
+                await get_user_by_email("a@ukr.net", session)
+        self.assertEqual(stats.count, 1)
+        with self.assertRaises(AssertionError) as error:
+            with self.profiler.assert_max_queries(1):
+                async with self.session_maker() as session:
+                    session.add(User(username="test_user", email="a@ukr.net", password="test_password"))
+                    await session.commit()
+                    await get_user_by_email("a@ukr.net", session)
+        self.assertIn("Expected at most 1 queries", str(error.exception))
+
+    async def test_failed_statement_is_not_timed(self):
+        async with self.engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                await conn.execute(text("SELECT * FROM missing_table"))
+            self.assertEqual(conn.sync_connection.info["query_started"], [])
+            with self.profiler.assert_max_queries(1) as stats:
+                await conn.execute(text("SELECT 1"))
+        self.assertEqual(stats.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
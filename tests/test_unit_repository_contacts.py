@@ -1,11 +1,36 @@
+import json
 import unittest
-from unittest.mock import MagicMock, AsyncMock
+from collections import namedtuple
+from datetime import date, datetime
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from sqlalchemy import update, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
-from src.entity.models import Contact, User
-from src.schemas.contact import ContactSchema
-from src.repository.contacts import create_contact, get_contacts, get_contact, update_contact, delete_contact
+from src.entity.models import Base, Contact, ContactStat, User
+from src.database.profiler import query_profiler
+from src.schemas.contact import ContactSchema, ContactBatchGetSchema, ContactResponse
+from src.services.fields import parse_fields, sparse_response
+from src.routes.contacts import batch_get_contacts, get_changes as get_changes_route
+from src.services.cache import local_cache, invalidation_bus
+from src.repository.contacts import create_contact, get_contacts, get_contact, update_contact, delete_contact, \
+    get_changes, suggest_contacts, search_contacts, merge_contacts, get_contacts_by_phone, stream_upcoming_birthdays, \
+    birthday_window, last_contact_id, delete_all_contacts, purge_contacts, get_purged_seq
+
+BirthdayRow = namedtuple('BirthdayRow', 'id email username name surname birthday')
+
+
+class AsyncRows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield row
 
 
 class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
@@ -17,16 +42,20 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
             password='test_password',
             confirmed=True)
         self.session = AsyncMock(spec=AsyncSession)
+        # The writes reserve a change sequence with UPDATE ... RETURNING, the mocked session has no row to return
+        next_change_seq = patch('src.repository.contacts.next_change_seq', new_callable=AsyncMock, return_value=1)
+        next_change_seq.start()
+        self.addCleanup(next_change_seq.stop)
 
     async def test_get_contacts(self):
         limit = 10
         offset = 0
         contacts = [Contact(id=1, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
-                            phone='+380671111111', birthday='1985-02-01', user=self.user),
+                            phone='+380671111111', birthday=date(1985, 2, 1), user=self.user),
                     Contact(id=2, name='test_name_2', surname='test_surname_2', email='test_2@ukr.net',
-                            phone='+380672222222', birthday='1985-02-02', user=self.user),
+                            phone='+380672222222', birthday=date(1985, 2, 2), user=self.user),
                     Contact(id=3, name='test_name_3', surname='test_surname_3', email='test_3@ukr.net',
-                            phone='+380673333333', birthday='1985-02-03', user=self.user)]
+                            phone='+380673333333', birthday=date(1985, 2, 3), user=self.user)]
         mocked_contacts = MagicMock()
         mocked_contacts.scalars.return_value.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
@@ -50,7 +79,7 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contact(self):
         contact = Contact(id=1, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
-                          phone='+380671111111', birthday='1985-02-01', user=self.user)
+                          phone='+380671111111', birthday=date(1985, 2, 1), user=self.user)
         mocked_contact = MagicMock()
         mocked_contact.scalar_one_or_none.return_value = contact
         self.session.execute.return_value = mocked_contact
@@ -62,6 +91,7 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
                              phone='+380671111111', birthday='1985-02-01')
         result = await create_contact(body, self.session, self.user)
         self.assertIsInstance(result, Contact)
+        self.assertEqual(result.phone_e164, '+380671111111')
         self.assertEqual(result.name, body.name)
         self.assertEqual(result.surname, body.surname)
         self.assertEqual(result.email, body.email)
@@ -74,7 +104,7 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         mocked_contact = MagicMock()
         mocked_contact.scalar_one_or_none.return_value = Contact(id=1, name='test_name_1', surname='test_surname_1',
                                                                  email='test_1@ukr.net', phone='+380671111111',
-                                                                 birthday='1985-02-01', user=self.user)
+                                                                 birthday=date(1985, 2, 1), user=self.user)
         self.session.execute.return_value = mocked_contact
         result = await update_contact(1, body, self.session, self.user)
         self.assertIsInstance(result, Contact)
@@ -88,9 +118,236 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         mocked_contact = MagicMock()
         mocked_contact.scalar_one_or_none.return_value = Contact(id=1, name='test_name_1', surname='test_surname_1',
                                                                  email='test_1@ukr.net', phone='+380671111111',
-                                                                 birthday='1985-02-01', user=self.user)
+                                                                 birthday=date(1985, 2, 1), user=self.user)
         self.session.execute.return_value = mocked_contact
         result = await delete_contact(1, self.session, self.user)
-        self.session.delete.assert_called_once()
+        self.session.delete.assert_not_called()
         self.session.commit.assert_called_once()
-        self.assertIsInstance(result, Contact)
\ No newline at end of file
+        self.assertIsInstance(result, Contact)
+        self.assertIsNotNone(result.deleted_at)
+
+    async def test_get_changes(self):
+        contacts = [Contact(id=1, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
+                            phone='+380671111111', birthday=date(1985, 2, 1), user=self.user, seq=4),
+                    Contact(id=2, name='test_name_2', surname='test_surname_2', email='test_2@ukr.net',
+                            phone='+380672222222', birthday=date(1985, 2, 2), user=self.user, seq=5),
+                    Contact(id=3, name='test_name_3', surname='test_surname_3', email='test_3@ukr.net',
+                            phone='+380673333333', birthday=date(1985, 2, 3), user=self.user, seq=6)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result, has_more = await get_changes(3, 2, self.session, self.user)
+        self.assertEqual(result, contacts[:2])
+        self.assertTrue(has_more)
+
+        result, has_more = await get_changes(3, 3, self.session, self.user)
+        self.assertEqual(result, contacts)
+        self.assertFalse(has_more)
+
+    async def test_suggest_contacts(self):
+        rows = [(1, 'test_name_1', 'test_surname_1', 'test_1@ukr.net', 'tel:+380-67-111-1111')]
+        mocked_rows = MagicMock()
+        mocked_rows.all.return_value = rows
+        self.session.execute.return_value = mocked_rows
+        result = await suggest_contacts('test', 10, self.session, self.user)
+        self.assertEqual(result, rows)
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn('lower(contacts.name) LIKE', statement)
+        self.assertNotIn('replace', statement)
+
+        await suggest_contacts('+38067', 10, self.session, self.user)
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn('replace(replace(contacts.phone', statement)
+
+    async def test_search_contacts(self):
+        contacts = [Contact(id=1, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
+                            phone='+380671111111', birthday=date(1985, 2, 1), user=self.user),
+                    Contact(id=2, name='other_name', surname='other_surname', email='other@ukr.net',
+                            phone='+380672222222', birthday=date(1985, 2, 2), user=self.user)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        result = await search_contacts('test nme', 10, 0, self.session, self.user)
+        self.assertEqual([contact for contact, _ in result], [contacts[0]])
+        self.assertGreater(result[0][1], 0)
+
+    async def test_merge_contacts(self):
+        contacts = [Contact(id=1, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
+                            phone='+380671111111', birthday=date(1985, 2, 1), user=self.user),
+                    Contact(id=2, name='test_name_1', surname='test_surname_1', email='test_1@ukr.net',
+                            phone='+380671111111', birthday=date(1985, 2, 1), user=self.user)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result = await merge_contacts(1, [2], self.session, self.user)
+        self.assertEqual(result, contacts[0])
+        self.assertIsNone(contacts[0].deleted_at)
+        self.assertIsNotNone(contacts[1].deleted_at)
+        self.session.commit.assert_called_once()
+
+        result = await merge_contacts(1, [3], self.session, self.user)
+        self.assertIsNone(result)
+
+    async def test_get_contacts_by_phone(self):
+        rows = [(1, 'test_name_1', 'test_surname_1')]
+        mocked_rows = MagicMock()
+        mocked_rows.all.return_value = rows
+        self.session.execute.return_value = mocked_rows
+        result = await get_contacts_by_phone('+380671111111', self.session, self.user)
+        self.assertEqual(result, rows)
+        self.assertIn('contacts.phone_e164 =', str(self.session.execute.call_args.args[0]))
+
+    async def test_stream_upcoming_birthdays(self):
+        rows = [BirthdayRow(1, 'a@ukr.net', 'a', 'test_name_1', 'test_surname_1', date(1985, 2, 1)),
+                BirthdayRow(1, 'a@ukr.net', 'a', 'test_name_2', 'test_surname_2', date(1985, 2, 2)),
+                BirthdayRow(2, 'b@ukr.net', 'b', 'test_name_3', 'test_surname_3', date(1985, 2, 3))]
+        self.session.stream.return_value = AsyncRows(rows)
+        result = [digest async for digest in stream_upcoming_birthdays(7, self.session)]
+        self.assertEqual([(digest['user_id'], len(digest['birthdays'])) for digest in result], [(1, 2), (2, 1)])
+        self.assertEqual(result[0]['birthdays'][1],
+                         {'name': 'test_name_2', 'surname': 'test_surname_2', 'birthday': '1985-02-02'})
+        self.session.execute.assert_not_called()
+
+    def test_birthday_window_crosses_new_year(self):
+        self.assertIn('BETWEEN', str(birthday_window(7, date(2024, 6, 1))))
+        self.assertIn(' OR ', str(birthday_window(7, date(2024, 12, 28))))
+
+    async def test_get_contacts_by_phone_cached(self):
+        rows = [(1, 'test_name_1', 'test_surname_1')]
+        mocked_rows = MagicMock()
+        mocked_rows.all.return_value = rows
+        self.session.execute.return_value = mocked_rows
+        local_cache.clear()
+        with patch.object(invalidation_bus, 'connected', True):
+            await get_contacts_by_phone('+380671111111', self.session, self.user)
+            result = await get_contacts_by_phone('+380671111111', self.session, self.user)
+            self.assertEqual(result, rows)
+            self.assertEqual(self.session.execute.await_count, 1)
+
+            body = ContactSchema(name='test_name_2', surname='test_surname_2', email='test_2@ukr.net',
+                                 phone='+380672222222', birthday='1985-02-02')
+            await create_contact(body, self.session, self.user)
+            self.assertIsNone(local_cache.get('contacts', self.user.id))
+        local_cache.clear()
+
+
+class TestCachedStatements(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        query_profiler.instrument(self.engine)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.users = [User(username=f'user_{i}', email=f'user_{i}@ukr.net', password='test_password') for i in range(2)]
+        self.session.add_all(self.users)
+        await self.session.flush()
+        for i, user in enumerate(self.users * 2):
+            self.session.add(Contact(name=f'test_name_{i}', surname='test_surname', email=f'test_{i}@ukr.net',
+                                     phone='+380671111111', birthday=date(1985, 2, 1), user_id=user.id, seq=i + 1))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_cached_statements_bind_new_values(self):
+        first, second = self.users
+        self.assertEqual([contact.name for contact in await get_contacts(None, None, None, 10, 0, self.session, first)],
+                         ['test_name_0', 'test_name_2'])
+        self.assertEqual([contact.name for contact in await get_contacts(None, None, None, 1, 1, self.session, second)],
+                         ['test_name_3'])
+        self.assertEqual([contact.name for contact in await get_contacts('_1', None, None, 10, 0, self.session, second)],
+                         ['test_name_1'])
+        self.assertEqual(await get_contacts('_1', None, None, 10, 0, self.session, first), [])
+        contact = (await get_contacts(None, None, 'test_3', 10, 0, self.session, second))[0]
+        self.assertEqual(await get_contact(contact.id, self.session, second), contact)
+        self.assertIsNone(await get_contact(contact.id, self.session, first))
+
+    async def test_batch_get_keeps_order_and_reports_missing(self):
+        first, second = self.users
+        await self.session.execute(update(Contact).where(Contact.id == 3).values(deleted_at=datetime(2024, 1, 1)))
+        result = await batch_get_contacts(ContactBatchGetSchema(ids=[3, 2, 4, 99, 2, 1]), None, self.session, first)
+        self.assertEqual([contact.id for contact in result['contacts']], [1])
+        self.assertEqual(result['missing'], [3, 2, 4, 99])
+        result = await batch_get_contacts(ContactBatchGetSchema(ids=[4, 2]), None, self.session, second)
+        self.assertEqual([contact.id for contact in result['contacts']], [4, 2])
+        self.assertEqual(result['missing'], [])
+
+    async def test_sparse_fieldset_narrows_query_and_response(self):
+        first, _ = self.users
+        fields = parse_fields('name, surname', ContactResponse)
+        self.assertEqual(fields, {'id', 'name', 'surname'})
+        self.session.expunge_all()
+        with query_profiler.assert_max_queries(1) as stats:
+            contacts = await get_contacts(None, None, None, 10, 0, self.session, first, fields)
+        statement = next(iter(stats.statements))
+        self.assertNotIn('contacts.email', statement)
+        self.assertNotIn('JOIN users', statement)
+        self.assertEqual(inspect(contacts[0]).unloaded, {'email', 'phone', 'phone_e164', 'birthday', 'user_id', 'seq',
+                                                         'deleted_at'})
+        self.assertIsNone(contacts[0].user)
+        response = sparse_response(contacts, ContactResponse, fields)
+        self.assertEqual(json.loads(response.body),
+                         [{'id': 1, 'name': 'test_name_0', 'surname': 'test_surname'},
+                          {'id': 3, 'name': 'test_name_2', 'surname': 'test_surname'}])
+        with self.assertRaises(HTTPException):
+            parse_fields('name,password', ContactResponse)
+
+
+class TestDeleteAndPurge(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = User(username='test_user', email='test_user@ukr.net', password='test_password')
+        self.session.add(self.user)
+        await self.session.flush()
+        for i in range(5):
+            self.session.add(await create_contact(ContactSchema(
+                name=f'test_name_{i}', surname='test_surname', email=f'test_{i}@ukr.net', phone='+380671111111',
+                birthday=date(1985, 2, 1)), self.session, self.user))
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        local_cache.clear()
+
+    async def test_delete_all_contacts_in_batches(self):
+        up_to_id = await last_contact_id(self.session, self.user)
+        self.assertEqual(up_to_id, 5)
+        await delete_contact(2, self.session, self.user)
+        later = await create_contact(ContactSchema(name='later', surname='test_surname', email='later@ukr.net',
+                                                   phone='+380671111111', birthday=date(1985, 2, 1)),
+                                     self.session, self.user)
+        self.assertEqual(await delete_all_contacts(self.user.id, up_to_id, self.session, batch_size=2), 4)
+        contacts = (await self.session.execute(select(Contact).order_by(Contact.id))).scalars().all()
+        self.assertEqual([contact.id for contact in contacts if contact.deleted_at is None], [later.id])
+        # Every deletion got its own change sequence, after the ones before the request
+        self.assertEqual(sorted(contact.seq for contact in contacts), [6, 7, 8, 9, 10, 11])
+        stats = (await self.session.execute(select(ContactStat.kind, ContactStat.count)
+                                             .where(ContactStat.count != 0))).all()
+        self.assertEqual(sorted(stats), [('domain', 1), ('month', 1), ('total', 1)])
+
+    async def test_purge_contacts_keeps_watermark(self):
+        await delete_contact(1, self.session, self.user)
+        await delete_contact(4, self.session, self.user)
+        await self.session.execute(update(Contact).where(Contact.id == 4).values(deleted_at=datetime(2024, 1, 1)))
+        await self.session.commit()
+        self.assertEqual(await purge_contacts(datetime(2024, 2, 1), self.session, batch_size=1), 1)
+        self.assertEqual(await purge_contacts(datetime(2024, 2, 1), self.session), 0)
+        ids = (await self.session.execute(select(Contact.id).order_by(Contact.id))).scalars().all()
+        self.assertEqual(ids, [1, 2, 3, 5])
+        self.assertEqual(await get_purged_seq(self.session, self.user), 7)
+        with self.assertRaises(HTTPException) as error:
+            await get_changes_route(6, 100, self.session, self.user)
+        self.assertEqual(error.exception.status_code, 410)
+        result = await get_changes_route(7, 100, self.session, self.user)
+        self.assertEqual(result['cursor'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from datetime import date
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, ContactStat, User
+from src.repository.contacts import create_contact, update_contact, delete_contact, merge_contacts
+from src.repository.stats import get_stats, reconcile_stats
+from src.schemas.contact import ContactSchema
+
+
+def contact_body(name: str, email: str, birthday: date) -> ContactSchema:
+    return ContactSchema(name=name, surname='test_surname', email=email, phone='+380671111111', birthday=birthday)
+
+
+class TestContactStats(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = User(username='test_user', email='test_user@ukr.net', password='test_password')
+        self.session.add(self.user)
+        await self.session.commit()
+        self.today = date(2024, 2, 10)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_counters_follow_writes(self):
+        first = await create_contact(contact_body('test_name_1', 'test_1@ukr.net', date(1985, 2, 1)),
+                                     self.session, self.user)
+        second = await create_contact(contact_body('test_name_2', 'test_2@Gmail.com', date(1990, 2, 2)),
+                                      self.session, self.user)
+        third = await create_contact(contact_body('test_name_3', 'test_3@gmail.com', date(1990, 5, 3)),
+                                     self.session, self.user)
+        self.assertEqual(await get_stats(self.session, self.user, self.today),
+                         {'total': 3, 'birthdays_this_month': 2, 'domains': {'gmail.com': 2, 'ukr.net': 1}})
+
+        await update_contact(first.id, contact_body('test_name_1', 'test_1@gmail.com', date(1985, 7, 1)),
+                             self.session, self.user)
+        self.assertEqual(await get_stats(self.session, self.user, self.today),
+                         {'total': 3, 'birthdays_this_month': 1, 'domains': {'gmail.com': 3}})
+
+        await delete_contact(second.id, self.session, self.user)
+        await merge_contacts(first.id, [third.id], self.session, self.user)
+        self.assertEqual(await get_stats(self.session, self.user, self.today, domains=1),
+                         {'total': 1, 'birthdays_this_month': 0, 'domains': {'gmail.com': 1}})
+
+    async def test_reconcile_repairs_drift(self):
+        await create_contact(contact_body('test_name_1', 'test_1@ukr.net', date(1985, 2, 1)), self.session, self.user)
+        await self.session.execute(update(ContactStat).where(ContactStat.kind == 'total').values(count=7))
+        await self.session.commit()
+        self.assertEqual(await reconcile_stats(self.session), 1)
+        self.assertEqual((await get_stats(self.session, self.user, self.today))['total'], 1)
+        self.assertEqual(await reconcile_stats(self.session), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,16 @@
 import unittest
+from datetime import date
 from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
-from src.entity.models import User
+from src.entity.models import Base, Contact, ContactBlockingKey, ContactStat, User
 from src.schemas.user import UserSchema
-from src.repository.users import get_user_by_email, create_user, update_token, confirmed_email, update_avatar_url
+from src.repository.users import get_user_by_email, create_user, update_token, confirmed_email, update_avatar_url, \
+    delete_user, mark_user_deleted
+from src.services.auth import auth_service
 
 
 class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
@@ -58,3 +63,55 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         self.session.commit.assert_called_once()
         self.assertEqual(result, mock_get)
 
+
+class TestDeleteUser(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.users = [User(username=f'user_{i}', email=f'user_{i}@ukr.net', password='test_password') for i in range(2)]
+        self.session.add_all(self.users)
+        await self.session.flush()
+        for i, user in enumerate(self.users * 3):
+            contact = Contact(name=f'test_name_{i}', surname='test_surname', email=f'test_{i}@ukr.net',
+                              phone='+380671111111', birthday=date(1985, 2, 1), user_id=user.id, seq=i + 1)
+            self.session.add(contact)
+            await self.session.flush()
+            self.session.add(ContactBlockingKey(contact_id=contact.id, kind='email', key=contact.email,
+                                                user_id=user.id))
+            self.session.add(ContactStat(user_id=user.id, kind='domain', key=f'{i}.ukr.net', count=1))
+        await self.session.commit()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def count(self, model, user_id):
+        return (await self.session.execute(select(func.count()).select_from(model)
+                                           .where(model.user_id == user_id))).scalar()
+
+    async def test_delete_user_in_batches(self):
+        first, second = [user.id for user in self.users]
+        on_deleted = AsyncMock()
+        self.assertEqual(await delete_user(first, self.session, batch_size=2, on_deleted=on_deleted), 3)
+        self.assertEqual([call.args for call in on_deleted.await_args_list], [(2,)])
+        for model in (Contact, ContactBlockingKey, ContactStat):
+            self.assertEqual(await self.count(model, first), 0)
+            self.assertEqual(await self.count(model, second), 3)
+        self.assertIsNone(await self.session.get(User, first))
+        self.assertEqual(await delete_user(first, self.session), 0)
+
+    async def test_mark_user_deleted_refuses_authentication(self):
+        user = self.users[0]
+        user.refresh_token = 'refresh token'
+        token = await auth_service.create_access_token(data={"sub": user.email})
+        await mark_user_deleted(user, self.session)
+        self.assertIsNone(user.refresh_token)
+        with self.assertRaises(HTTPException) as raised:
+            await auth_service.get_current_user(token, self.session)
+        self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual((await auth_service.get_current_account(token, self.session)).id, user.id)
+        other = await auth_service.create_access_token(data={"sub": self.users[1].email})
+        self.assertEqual((await auth_service.get_current_user(other, self.session)).id, self.users[1].id)
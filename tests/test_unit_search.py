@@ -0,0 +1,34 @@
+import unittest
+
+from src.entity.models import Contact
+from src.services.search import words, word_similarity, score_contact, rank_contacts
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.contacts = [Contact(id=1, name='Alice', surname='Smith', email='alice@ukr.net'),
+                         Contact(id=2, name='Bob', surname='Smithson', email='bob@ukr.net'),
+                         Contact(id=3, name='Carol', surname='Jones', email='carol@ukr.net')]
+
+    def test_words(self):
+        self.assertEqual(words('Alice Smith alice_s@ukr.net'), ['alice', 'smith', 'alice', 's', 'ukr', 'net'])
+
+    def test_word_similarity(self):
+        self.assertEqual(word_similarity('alice', 'alice'), 1.0)
+        self.assertEqual(word_similarity('ali', 'alice'), 0.75)
+        self.assertEqual(word_similarity('xyz', 'alice'), 0.0)
+
+    def test_score_contact(self):
+        self.assertEqual(score_contact('alice smith', self.contacts[0]), 1.0)
+        self.assertGreater(score_contact('alise', self.contacts[0]), score_contact('alise', self.contacts[1]))
+
+    def test_rank_contacts(self):
+        result = rank_contacts('smiht', self.contacts, limit=10, offset=0)
+        self.assertEqual([contact.id for contact, _ in result], [1, 2])
+        self.assertGreaterEqual(result[0][1], result[1][1])
+
+        result = rank_contacts('smiht', self.contacts, limit=1, offset=1)
+        self.assertEqual([contact.id for contact, _ in result], [2])
+
+        self.assertEqual(rank_contacts('zzz', self.contacts, limit=10, offset=0), [])
@@ -0,0 +1,63 @@
+import os
+import signal
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import server
+from server import split_pool, event_loop_and_http, worker_count, DrainingServer, Supervisor
+
+
+class TestServer(unittest.TestCase):
+
+    def test_split_pool_stays_within_budget(self):
+        for budget, workers in [(80, 8), (80, 3), (10, 10), (97, 12)]:
+            pool_size, max_overflow = split_pool(budget, workers)
+            self.assertGreaterEqual(pool_size, 1)
+            self.assertLessEqual(workers * (pool_size + max_overflow), budget)
+        self.assertEqual(split_pool(80, 8), (5, 5))
+
+    def test_split_pool_too_many_workers(self):
+        with self.assertRaises(ValueError):
+            split_pool(4, 8)
+
+    def test_event_loop_and_http_fall_back(self):
+        with patch('server.importlib.util.find_spec', return_value=None):
+            self.assertEqual(event_loop_and_http(), ("asyncio", "h11"))
+        with patch('server.importlib.util.find_spec', return_value=object()):
+            self.assertEqual(event_loop_and_http(), ("uvloop", "httptools"))
+
+    def test_worker_count(self):
+        self.assertGreaterEqual(worker_count(), 1)
+
+    def test_max_requests_jitter(self):
+        supervisor = Supervisor("main:app", "127.0.0.1", 8000, 2, max_requests=100, max_requests_jitter=10)
+        limits = {supervisor._worker_config().limit_max_requests for _ in range(50)}
+        self.assertTrue(all(100 <= limit <= 110 for limit in limits))
+        self.assertGreater(len(limits), 1)
+        supervisor = Supervisor("main:app", "127.0.0.1", 8000, 2, max_requests=0, max_requests_jitter=10)
+        self.assertIsNone(supervisor._worker_config().limit_max_requests)
+
+    @patch('server.Supervisor')
+    @patch('server.database_max_connections', new_callable=AsyncMock, return_value=None)
+    def test_budget_reserves_job_workers(self, mock_max_connections, mock_supervisor):
+        with patch.object(server.config, "DB_CONNECTION_BUDGET", 80), \
+                patch.object(server.config, "DB_JOB_WORKER_PROCESSES", 2), \
+                patch.object(server.config, "DB_JOB_WORKER_CONNECTIONS", 10), \
+                patch('sys.argv', ['server.py', '--workers', '6']), \
+                patch.dict(os.environ):
+            server.main()
+            pool_size, max_overflow = int(os.environ["DB_POOL_SIZE"]), int(os.environ["DB_MAX_OVERFLOW"])
+        self.assertEqual((pool_size, max_overflow), (5, 5))
+        self.assertLessEqual(6 * (pool_size + max_overflow) + 2 * 10, 80)
+        mock_supervisor.return_value.run.assert_called_once()
+
+    @patch('src.services.lifespan.lifecycle')
+    def test_exit_signal_starts_draining(self, mock_lifecycle):
+        server_instance = DrainingServer(server.uvicorn.Config("main:app"))
+        server_instance.handle_exit(signal.SIGTERM, None)
+        mock_lifecycle.start_draining.assert_called_once()
+        self.assertTrue(server_instance.should_exit)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, User
+from src.repository.users import get_user_by_email
+from src.services.singleflight import SingleFlight, single_flight, single_flight_group
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        @single_flight
+        async def fetch(value: int, db=None):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        results = await asyncio.gather(fetch(1), fetch(1), fetch(1), fetch(2))
+        self.assertEqual(results, [2, 2, 2, 4])
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(single_flight_group.in_flight(), 0)
+
+    async def test_error_is_shared(self):
+        group = SingleFlight()
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(group.do("key", None, fail), group.do("key", None, fail),
+                                       return_exceptions=True)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_followers_run_when_leader_cancelled(self):
+        group = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(group.do("key", None, slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.do("key", None, slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await follower, "done")
+
+    async def test_followers_get_objects_of_their_session(self):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as session:
+            session.add(User(username="test_user", email="test_user@ukr.net", password="test_password"))
+            await session.commit()
+
+        async with session_maker() as first, session_maker() as second:
+            first_user, second_user = await asyncio.gather(get_user_by_email("test_user@ukr.net", first),
+                                                           get_user_by_email("test_user@ukr.net", second))
+            self.assertIn(first_user, first)
+            self.assertIn(second_user, second)
+            self.assertEqual(first_user.id, second_user.id)
+        await engine.dispose()
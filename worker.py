@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+from dataclasses import asdict
+
+import redis.asyncio as redis
+
+from server import split_pool
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.jobs import tasks  # noqa: F401 registers the jobs
+from src.jobs.queue import job_queue
+from src.jobs.worker import Worker, enqueue, registry
+from src.services.cache import invalidation_bus
+from src.services.mail_templates import precompile
+
+
+async def run(concurrency: int):
+    """
+    The run function runs a worker until SIGTERM or SIGINT, then lets the running jobs finish.
+    The email templates are compiled before the first job, and the worker joins the cache invalidation bus,
+    so the writes of the jobs evict the cached entries of the web workers too.
+    The database pool is sized from DB_JOB_WORKER_CONNECTIONS, the share of DB_CONNECTION_BUDGET
+    that server.py leaves to every job worker process.
+
+    :param concurrency: int: Maximum number of jobs running at once
+    :return: None
+    :doc-author: Trelent
+    """
+    sessionmanager.resize(*split_pool(config.DB_JOB_WORKER_CONNECTIONS, 1))
+    precompile()
+    redis_client = redis.Redis(
+        host=config.REDIS_DOMAIN,
+        port=config.REDIS_PORT,
+        db=0,
+        password=config.REDIS_PASSWORD,
+    )
+    await invalidation_bus.start(redis_client)
+    worker = Worker(job_queue, concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await invalidation_bus.stop()
+        await redis_client.aclose()
+        await job_queue.close()
+        await sessionmanager.close()
+
+
+async def status(job_id: str | None):
+    """
+    The status function prints a job, or the queue sizes and the registered jobs without a job id.
+
+    :param job_id: str | None: The id of the job
+    :return: None
+    :doc-author: Trelent
+    """
+    try:
+        if job_id is None:
+            print(json.dumps({"queue": await job_queue.stats(), "jobs": sorted(registry)}, indent=2))
+            return
+        found = await job_queue.get(job_id)
+        print(json.dumps(asdict(found), indent=2, default=str) if found else "NOT FOUND")
+    finally:
+        await job_queue.close()
+
+
+async def submit(name: str):
+    """
+    The submit function enqueues a registered job without arguments, e.g. a backfill.
+
+    :param name: str: The name of the job
+    :return: None
+    :doc-author: Trelent
+    """
+    try:
+        if name not in registry:
+            raise SystemExit(f"Unknown job {name}, jobs: {', '.join(sorted(registry))}")
+        print((await enqueue(name)).id)
+    finally:
+        await job_queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background jobs worker")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="Run the worker (default)")
+    run_parser.add_argument("--concurrency", type=int, default=config.JOBS_CONCURRENCY)
+    status_parser = commands.add_parser("status", help="Show the queue or a job")
+    status_parser.add_argument("job_id", nargs="?")
+    submit_parser = commands.add_parser("submit", help="Enqueue a job")
+    submit_parser.add_argument("name")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if arguments.command == "status":
+        asyncio.run(status(arguments.job_id))
+    elif arguments.command == "submit":
+        asyncio.run(submit(arguments.name))
+    else:
+        asyncio.run(run(getattr(arguments, "concurrency", config.JOBS_CONCURRENCY)))